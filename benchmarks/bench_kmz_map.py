@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Build time and HTML size of the flight map for each KMZParser renderer (one folium object per row
+vs one GeoJSON FeatureCollection per layer), on the synthetic KMZ of bench_kmz_parser.
+
+Usage: python benchmarks/bench_kmz_map.py [placemarks per folder]
+"""
+
+import sys
+import os
+import time
+import json
+import tempfile
+from bench_kmz_parser import write_synthetic_kmz
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+
+
+if __name__ == "__main__":
+    n_placemarks = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+
+    with tempfile.TemporaryDirectory() as folder:
+        # plot_map reads the science plot manifest written by SFMCGliderData from htmls/ under the
+        # working directory
+        os.chdir(folder)
+        os.makedirs("htmls")
+        with open("htmls/glider_sci_data_timeseries.json", "w") as file:
+            json.dump({"file_name": "glider_sci_data_timeseries.0000000000000000.html",
+                        "data_hash": "0000000000000000"}, file)
+        with open("htmls/glider_sci_data_timeseries.0000000000000000.html", "w") as file:
+            file.write("<div>science plot</div>")
+
+        write_synthetic_kmz(folder=folder, n_placemarks=n_placemarks)
+        k = KMZParser(folder_path=folder, build_map=False)
+
+        results = {}
+        for renderer, canvas in [("markers", False), ("geojson", False), ("geojson", True)]:
+            start = time.perf_counter()
+            interactive_map = k.plot_map(surfacings_data=k.surfacings_coords_df,
+                                        surface_movements_data=k.surface_movements_coords_df,
+                                        glider_tracks_data=k.glider_track_coords_df,
+                                        depth_avg_currents_data=k.depth_current_avg_coords_df,
+                                        renderer=renderer,
+                                        canvas=canvas)
+            html_file = f"map_{renderer}_{canvas}.html"
+            interactive_map.save(html_file)
+            results[f"{renderer}{' (canvas)' if canvas else ''}"] = (time.perf_counter() - start, os.path.getsize(html_file))
+        os.chdir("/")
+
+    print(f"\n{n_placemarks} placemarks per folder")
+    print(f"{'renderer':>18} {'build (s)':>10} {'html (MB)':>10}")
+    for renderer, (elapsed, size) in results.items():
+        print(f"{renderer:>18} {elapsed:>10.2f} {size / 1e6:>10.2f}")
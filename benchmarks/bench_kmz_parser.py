@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Parse time and peak memory of the KMZParser KML backends (BeautifulSoup html.parser vs lxml
+iterparse) on a synthetic SFMC-like KMZ. Each backend runs in its own process so the peak RSS
+is not shared between them.
+
+Usage: python benchmarks/bench_kmz_parser.py [placemarks per folder]
+"""
+
+import sys
+import os
+import time
+import resource
+import zipfile
+import tempfile
+from multiprocessing import get_context
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+
+
+def synthetic_kml(n_placemarks:int):
+    def point(prefix, i, description):
+        return (f"<Placemark><name>{prefix}{i}</name><description><![CDATA[{description}]]></description>"
+                f"<Point><coordinates>{-43 + i * 1e-4:.5f},{-23 + i * 1e-4:.5f},0</coordinates></Point></Placemark>")
+
+    def line(prefix, i, description):
+        return (f"<Placemark><name>{prefix}{i}</name><description>{description}</description><LineString>"
+                f"<coordinates>{-43 + i * 1e-4:.5f},-23.00000,0 {-42.995 + i * 1e-4:.5f},-23.00500,0</coordinates>"
+                f"</LineString></Placemark>")
+
+    def gps_time(i):
+        return f"Time of GPS Position: 2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}:00"
+
+    folders = {
+        "Surfacings": [point("s", i, gps_time(i)) for i in range(n_placemarks)],
+        "Surface Movements": [point("m", i, gps_time(i)) for i in range(n_placemarks)],
+        "Glider Tracks": [line("t", i, f"Range: {i * 10.5:.1f}m Time: 1h Speed: 0.{i % 9 + 1}m/s @ {i % 10}deg")
+                          for i in range(n_placemarks)],
+        "Depth Averaged Current Vectors": [line("c", i, f"Speed: 0.{i % 9 + 1}m/s @ {i % 10}deg") for i in range(n_placemarks)],
+        "Planned Waypoints": [point("w", i, "Waypoint") for i in range(5)],
+    }
+    body = "".join(f"<Folder><name>{name}</name>{''.join(placemarks)}</Folder>" for name, placemarks in folders.items())
+    return ('<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+            f"<name>unit_000</name>{body}</Document></kml>")
+
+
+def write_synthetic_kmz(folder:str, n_placemarks:int):
+    file_path = os.path.join(folder, "synthetic.kmz")
+    with zipfile.ZipFile(file_path, "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+        kmz.writestr("doc.kml", synthetic_kml(n_placemarks=n_placemarks))
+    return file_path
+
+
+def run_backend(folder:str, backend:str):
+    start = time.perf_counter()
+    k = KMZParser(folder_path=folder, backend=backend, build_map=False)
+    elapsed = time.perf_counter() - start
+    rows = len(k.surfacings_coords_df) + len(k.surface_movements_coords_df) \
+        + len(k.glider_track_coords_df) + len(k.depth_current_avg_coords_df)
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, rows
+
+
+if __name__ == "__main__":
+    n_placemarks = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+
+    with tempfile.TemporaryDirectory() as folder:
+        kmz_size = os.path.getsize(write_synthetic_kmz(folder=folder, n_placemarks=n_placemarks))
+        results = {}
+        for backend in ["soup", "lxml"]:
+            with get_context("spawn").Pool(1) as pool:
+                results[backend] = pool.apply(run_backend, (folder, backend))
+
+    print(f"\n{n_placemarks} placemarks per folder, kmz {kmz_size / 1e6:.1f} MB")
+    print(f"{'backend':>8} {'time (s)':>10} {'peak RSS (MB)':>14} {'rows':>8}")
+    for backend, (elapsed, peak, rows) in results.items():
+        print(f"{backend:>8} {elapsed:>10.2f} {peak:>14.1f} {rows:>8}")
+    print(f"speedup: {results['soup'][0] / results['lxml'][0]:.1f}x")
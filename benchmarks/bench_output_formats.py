@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Size and write/read time of the narrow decoder output for each GliderDataToCSV output backend
+(CSV, partitioned Parquet, Feather), on a synthetic mission.
+
+Usage: python benchmarks/bench_output_formats.py [rows]
+"""
+
+import sys
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from pnboiaGliderBinary.writers import WRITERS
+
+
+def synthetic_narrow_dataframe(n_rows:int, n_parameters:int=40, seed:int=0):
+    rng = np.random.default_rng(seed)
+    time_stamps = np.sort(1.6e9 + rng.uniform(0, 60 * 86400, size=n_rows))
+    parameters = np.array([f"sci_param_{i:02d}" if i % 2 else f"m_param_{i:02d}" for i in range(n_parameters)])
+    variable = parameters[rng.integers(0, n_parameters, size=n_rows)]
+    data = pd.DataFrame({"time": time_stamps,
+                        "data_type": np.where(np.char.startswith(variable, "sci"), "science", "engineering"),
+                        "variable": pd.Categorical(variable),
+                        "value": rng.normal(size=n_rows).round(4)})
+    data["date_time"] = pd.to_datetime(data["time"], unit="s")
+    return data.set_index("date_time")
+
+
+def path_size(path:str):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+if __name__ == "__main__":
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    data = synthetic_narrow_dataframe(n_rows=n_rows)
+
+    print(f"{n_rows} narrow rows")
+    print(f"{'format':>8} {'size (MB)':>10} {'write (s)':>10} {'read (s)':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        for output_format, writer_class in WRITERS.items():
+            writer = writer_class()
+            file_path = os.path.join(folder, f"narrow.{writer.extension}")
+
+            start = time.perf_counter()
+            writer.write(data=data, file_path=file_path)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            writer.read(file_path)
+            read_time = time.perf_counter() - start
+
+            print(f"{output_format:>8} {path_size(file_path) / 1e6:>10.1f} {write_time:>10.2f} {read_time:>10.2f}")
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compares the pd.merge chain previously used by GliderDataToCSV.generate_wide_dataframe
+with the single-pass builder in pnboiaGliderBinary.frames, as the number of parameters grows.
+
+Usage: python benchmarks/bench_wide_dataframe.py [samples_per_parameter]
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pnboiaGliderBinary.frames import build_wide_dataframe
+
+
+def synthetic_parameters(n_parameters:int, n_samples:int, seed:int=0):
+    rng = np.random.default_rng(seed)
+    base_time = 1.6e9 + np.cumsum(rng.uniform(0.5, 4.0, size=n_samples * 4))
+    names, times, values = [], [], []
+    for i in range(n_parameters):
+        time = np.sort(rng.choice(base_time, size=n_samples, replace=False))
+        names.append(f"param_{i:04d}")
+        times.append(time)
+        values.append(rng.normal(size=n_samples))
+    return names, times, values
+
+
+def merge_chain(names:list, times:list, values:list):
+    data = pd.DataFrame([])
+    for name, time, value in zip(names, times, values):
+        df = pd.DataFrame({"time":time, name:value})
+        if data.empty:
+            data = df
+        else:
+            data = pd.merge(left=data, right=df, on="time", how="outer")
+    return data
+
+
+def timeit(function, *args, repeat:int=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print(f"{'parameters':>10} {'merge (s)':>12} {'builder (s)':>12} {'speedup':>9}")
+    for n_parameters in [10, 50, 100, 200, 400]:
+        arrays = synthetic_parameters(n_parameters=n_parameters, n_samples=n_samples)
+        merge_time = timeit(merge_chain, *arrays)
+        builder_time = timeit(build_wide_dataframe, *arrays)
+        print(f"{n_parameters:>10} {merge_time:>12.4f} {builder_time:>12.4f} {merge_time / builder_time:>8.1f}x")
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of the decoder, ETL, SFMC ascii loader, KMZ parser and DB post, on synthetic
+missions of a fixed size (see synthetic.py). Every benchmark is timed repeat times after a warm-up
+run, and the medians are compared with the stored baseline of the same size: a benchmark more than
+tolerance slower than its baseline is flagged as a regression and the suite exits with status 1.
+
+GetData.post runs against an in-memory SQLite stand-in: COPY goes through a DBAPI connection whose
+copy_expert inserts the CSV rows, "insert" through pandas to_sql.
+
+Usage: python benchmarks/suite.py [small|medium|large] [--repeat=<n>] [--tolerance=<fraction>]
+                                  [--only=<name>[,<name>]] [--output=<file.json>] [--save-baseline]
+"""
+
+import sys
+import os
+import io
+import re
+import csv
+import json
+import time
+import sqlite3
+import platform
+import tempfile
+from contextlib import redirect_stdout
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from synthetic import SyntheticMultiDBD, write_sfmc_export, synthetic_narrow_post, ENG_PARAMETERS, SCI_PARAMETERS
+from bench_kmz_parser import write_synthetic_kmz
+from pnboiaGliderBinary.csv import GliderDataToCSV
+from pnboiaGliderBinary.etl import PNBOIAGlider
+from pnboiaGliderSFMCASCII.sci_data_processer import SFMCGliderData
+from pnboiaGliderSFMCASCII.cache import ParsedFileCache
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+from pnboiaGliderDataBase.db import GetData
+
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+SIZES = {
+    # samples per eng parameter, eng/sci parameters, SFMC files x rows, KMZ placemarks per folder, posted rows
+    "small": {"samples": 5_000, "eng_parameters": 40, "sci_parameters": 20,
+                "sfmc_files": 10, "sfmc_rows": 5_000, "placemarks": 2_000, "post_rows": 50_000},
+    "medium": {"samples": 50_000, "eng_parameters": 80, "sci_parameters": 30,
+                "sfmc_files": 30, "sfmc_rows": 20_000, "placemarks": 10_000, "post_rows": 500_000},
+    "large": {"samples": 200_000, "eng_parameters": 150, "sci_parameters": 40,
+                "sfmc_files": 60, "sfmc_rows": 50_000, "placemarks": 50_000, "post_rows": 2_000_000},
+}
+
+
+class CopyCursor():
+    """
+    copy_expert of a psycopg2 cursor, replayed as an executemany INSERT on SQLite.
+    """
+
+    def __init__(self, connection:sqlite3.Connection):
+        self.cursor = connection.cursor()
+
+    def copy_expert(self, statement:str, buffer):
+        table, columns = re.match(r"COPY (\S+) \((.*)\) FROM STDIN", statement).groups()
+        placeholders = ", ".join("?" * len(columns.split(",")))
+        self.cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", csv.reader(buffer))
+
+    def execute(self, statement:str, params=()):
+        self.cursor.execute(statement, params)
+
+    def close(self):
+        self.cursor.close()
+
+
+class CopyConnection():
+
+    def __init__(self, connection:sqlite3.Connection):
+        self.connection = connection
+
+    def cursor(self):
+        return CopyCursor(self.connection)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        # the in-memory database lives as long as its connection
+        pass
+
+
+class StandInDatabase(GetData):
+    """
+    GetData on an in-memory SQLite database with a 'data' schema holding data.data.
+    """
+
+    def __init__(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", lambda connection, _: connection.execute("ATTACH DATABASE ':memory:' AS data"))
+        super().__init__(conn=engine, use_cache=False)
+        self.raw = engine.raw_connection()
+        self.raw.execute("CREATE TABLE data.data (parameter_id INTEGER, value REAL, date_time TEXT, mission_id INTEGER)")
+        self.raw.commit()
+
+    def raw_connection(self):
+        return CopyConnection(self.raw.driver_connection)
+
+    def truncate(self):
+        self.raw.execute("DELETE FROM data.data")
+        self.raw.commit()
+
+
+def create_decoder(bd:SyntheticMultiDBD):
+    # GliderDataToCSV without its constructor, which decodes real binary files
+    g = GliderDataToCSV.__new__(GliderDataToCSV)
+    g.bd = bd
+    g.profiler = None
+    g.decoded_cache = None
+    g.eng_params_selection = ENG_PARAMETERS
+    g.sci_params_selection = SCI_PARAMETERS
+    return g
+
+
+def create_etl(bd:SyntheticMultiDBD):
+    g = PNBOIAGlider.__new__(PNBOIAGlider)
+    g.bd = bd
+    g.profiler = None
+    g.decoded_cache = None
+    return g
+
+
+def create_sfmc_loader(cache_dir:str=None):
+    gd = SFMCGliderData.__new__(SFMCGliderData)
+    gd.workers = 4
+    gd.profiler = None
+    gd.cache = ParsedFileCache(cache_dir=cache_dir) if cache_dir else None
+    return gd
+
+
+def create_kmz_parser():
+    k = KMZParser.__new__(KMZParser)
+    k.backend = "lxml"
+    k.profiler = None
+    return k
+
+
+def build_benchmarks(folder:str, size:dict):
+    """
+    {name: (function, setup)}: setup runs before every timed call and is not timed.
+    """
+    bd = SyntheticMultiDBD(n_samples=size["samples"], n_eng_parameters=size["eng_parameters"],
+                            n_sci_parameters=size["sci_parameters"])
+    decoder = create_decoder(bd=bd)
+    etl = create_etl(bd=bd)
+    etl_parameters = pd.DataFrame({"id": np.arange(1, len(bd.parameterNames["sci"]) + 1), "name": bd.parameterNames["sci"]})
+    all_data = decoder.generate_all_data(extension=".[st]bd")
+
+    sfmc_folder = os.path.join(folder, "sfmc")
+    os.makedirs(sfmc_folder)
+    write_sfmc_export(folder=sfmc_folder, n_files=size["sfmc_files"], n_rows=size["sfmc_rows"])
+    sfmc_cold = create_sfmc_loader()
+    sfmc_cached = create_sfmc_loader(cache_dir=os.path.join(folder, "sfmc_cache"))
+
+    kmz_file = write_synthetic_kmz(folder=folder, n_placemarks=size["placemarks"])
+    kmz = create_kmz_parser()
+    kml = kmz.convert_to_kml(filepath=kmz_file)
+
+    db = StandInDatabase()
+    post_data = synthetic_narrow_post(n_rows=size["post_rows"])
+
+    return {
+        "decoder.generate_wide_dataframe[eng]": (lambda: decoder.generate_wide_dataframe(parameters_type="eng"), None),
+        "decoder.generate_wide_dataframe[sci]": (lambda: decoder.generate_wide_dataframe(parameters_type="sci"), None),
+        "decoder.generate_narrow_dataframe[eng]": (lambda: decoder.generate_narrow_dataframe(extension=".[st]bd",
+                                                                                            parameters_type="eng"), None),
+        "decoder.generate_all_data": (lambda: decoder.generate_all_data(extension=".[st]bd"), None),
+        "decoder.pivot_data": (lambda: decoder.pivot_data(data=all_data), None),
+        "etl.generate_narrow_dataframe[sci]": (lambda: etl.generate_narrow_dataframe(parameters=etl_parameters), None),
+        "sfmc.load_all_files": (lambda: sfmc_cold.load_all_files(folder_path=sfmc_folder), None),
+        "sfmc.load_all_files[cached]": (lambda: sfmc_cached.load_all_files(folder_path=sfmc_folder), None),
+        "kmz.convert_to_kml": (lambda: kmz.convert_to_kml(filepath=kmz_file), None),
+        "kmz.parse_layers": (lambda: kmz.parse_layers(kml=kml), None),
+        "db.post[copy]": (lambda: db.post(schema="data", table="data", data=post_data, method="copy"), db.truncate),
+        "db.post[insert]": (lambda: db.post(schema="data", table="data", data=post_data, method="insert"), db.truncate),
+    }
+
+
+def time_benchmark(function, setup=None, repeat:int=5):
+    """
+    Timings of repeat calls after one warm-up call (which also fills the caches of the cached
+    benchmarks). The library progress prints are discarded.
+    """
+    timings = []
+    with redirect_stdout(io.StringIO()):
+        for run in range(repeat + 1):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            if run > 0:
+                timings.append(elapsed)
+    return {"median": float(np.median(timings)), "min": float(np.min(timings)), "max": float(np.max(timings)),
+            "repeat": repeat}
+
+
+def describe_environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count()}
+
+
+def compose_baseline_path(size_name:str):
+    return os.path.join(BASELINES_PATH, f"{size_name}.json")
+
+
+def load_baseline(size_name:str):
+    baseline_path = compose_baseline_path(size_name=size_name)
+    if not os.path.exists(baseline_path):
+        return None
+    with open(baseline_path, "r") as file:
+        return json.load(file)
+
+
+def save_results(results:dict, file_path:str):
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def compare_with_baseline(results:dict, baseline:dict, tolerance:float=0.25, noise_floor:float=0.005):
+    """
+    Status of every benchmark against its baseline median: 'regression' when more than tolerance
+    slower, 'faster' when more than tolerance faster, otherwise 'ok'. Differences under noise_floor
+    seconds are never flagged.
+    """
+    statuses = {}
+    for name, timing in results["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name) if baseline else None
+        if reference is None:
+            statuses[name] = ("new", None)
+            continue
+        ratio = timing["median"] / reference["median"]
+        difference = timing["median"] - reference["median"]
+        if ratio > 1 + tolerance and difference > noise_floor:
+            statuses[name] = ("regression", ratio)
+        elif ratio < 1 - tolerance and -difference > noise_floor:
+            statuses[name] = ("faster", ratio)
+        else:
+            statuses[name] = ("ok", ratio)
+    return statuses
+
+
+def print_results(results:dict, statuses:dict):
+    print(f"\n{'benchmark':<42} {'median (s)':>11} {'min (s)':>9} {'vs baseline':>12}  status")
+    for name, timing in results["benchmarks"].items():
+        status, ratio = statuses[name]
+        ratio = f"{ratio:.2f}x" if ratio is not None else ""
+        print(f"{name:<42} {timing['median']:>11.4f} {timing['min']:>9.4f} {ratio:>12}  {status}")
+
+
+if __name__ == "__main__":
+    options = sys.argv[1:]
+    size_name = "small"
+    repeat, tolerance, only, output_path = 5, 0.25, None, None
+    save_baseline = False
+    for option in options:
+        if option in SIZES:
+            size_name = option
+        elif option.startswith("--repeat="):
+            repeat = int(option.split("=")[1])
+        elif option.startswith("--tolerance="):
+            tolerance = float(option.split("=")[1])
+        elif option.startswith("--only="):
+            only = option.split("=")[1].split(",")
+        elif option.startswith("--output="):
+            output_path = option.split("=")[1]
+        elif option == "--save-baseline":
+            save_baseline = True
+        else:
+            print(__doc__)
+            sys.exit(1)
+
+    size = SIZES[size_name]
+    print(f"Benchmark suite, size '{size_name}': {size}")
+
+    results = {"size": size_name, "parameters": size, "environment": describe_environment(),
+                "created_at": pd.Timestamp.now(tz="UTC").isoformat(), "benchmarks": {}}
+    with tempfile.TemporaryDirectory() as folder:
+        print("Generating the synthetic mission...")
+        with redirect_stdout(io.StringIO()):
+            benchmarks = build_benchmarks(folder=folder, size=size)
+
+        for name, (function, setup) in benchmarks.items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            print(f"- {name}")
+            results["benchmarks"][name] = time_benchmark(function=function, setup=setup, repeat=repeat)
+
+    baseline = load_baseline(size_name=size_name)
+    if baseline and baseline["environment"] != results["environment"]:
+        print(f"\nBaseline recorded on a different environment ({baseline['environment']}), "
+                "timings may not be comparable.")
+    statuses = compare_with_baseline(results=results, baseline=baseline, tolerance=tolerance)
+    print_results(results=results, statuses=statuses)
+
+    if output_path:
+        print(f"\nSaving results as {output_path}")
+        save_results(results=results, file_path=output_path)
+
+    if save_baseline:
+        if baseline and only:
+            # a partial run only replaces the benchmarks it ran
+            results["benchmarks"] = dict(baseline["benchmarks"], **results["benchmarks"])
+        baseline_path = compose_baseline_path(size_name=size_name)
+        print(f"\nSaving baseline as {baseline_path}")
+        save_results(results=results, file_path=baseline_path)
+        sys.exit(0)
+
+    regressions = [name for name, (status, _) in statuses.items() if status == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} regressions over {tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    if baseline is None:
+        print(f"\nNo baseline for size '{size_name}' yet. Record one with --save-baseline.")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Synthetic glider missions for the benchmark suite, all generated from a fixed seed so every run
+sees the same data:
+
+- SyntheticMultiDBD: a MultiDBD stand-in serving per-parameter (time, value) arrays
+- write_sfmc_export: a multi-file SFMC *.txt export
+- synthetic_narrow_post: narrow rows shaped like the data.data rows posted by glider-etl
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+
+ENG_PARAMETERS = ["m_depth", "m_lat", "m_lon"]
+SCI_PARAMETERS = ["sci_rbrctd_temperature_00", "sci_oxy4_oxygen", "sci_rbrctd_salinity_00",
+                    "sci_seaowl_chl_scaled", "sci_seaowl_fdom_scaled", "sci_seaowl_bb_scaled"]
+
+
+class SyntheticMultiDBD():
+    """
+    What the decoder and the ETL read from dbdreader.MultiDBD: parameterNames and get(*names), one
+    (time, values) pair of arrays per parameter with the NaN samples already dropped. Engineering
+    parameters share a ~4 s time base and science ones a ~2 s base, each parameter keeping a random
+    subset of it, as sensors are not sampled every cycle.
+    """
+
+    def __init__(self, n_samples:int, n_eng_parameters:int=40, n_sci_parameters:int=20, seed:int=0):
+        rng = np.random.default_rng(seed)
+        start = 1.7e9
+        eng_time = start + np.cumsum(rng.uniform(3.0, 5.0, size=n_samples))
+        sci_time = start + np.cumsum(rng.uniform(1.5, 2.5, size=n_samples * 2))
+
+        self.parameterNames = {
+            "eng": ENG_PARAMETERS + [f"m_param_{i:03d}" for i in range(n_eng_parameters - len(ENG_PARAMETERS))],
+            "sci": SCI_PARAMETERS + [f"sci_param_{i:03d}" for i in range(n_sci_parameters - len(SCI_PARAMETERS))],
+        }
+
+        self.arrays = {}
+        for parameter_type, time_base in [("eng", eng_time), ("sci", sci_time)]:
+            for name in self.parameterNames[parameter_type]:
+                keep = rng.random(time_base.size) < rng.uniform(0.3, 1.0)
+                self.arrays[name] = (time_base[keep], rng.normal(10, 3, size=int(keep.sum())))
+
+    def get(self, *names):
+        result = [self.arrays[name] for name in names]
+        return result[0] if len(names) == 1 else result
+
+    def close(self):
+        pass
+
+
+def write_sfmc_export(folder:str, n_files:int, n_rows:int, seed:int=0):
+    """
+    n_files SFMC ascii files of n_rows each (names line, units line, then space separated rows ending
+    with a space), consecutive files overlapping by 10% of their rows as the SFMC exports do.
+    """
+    rng = np.random.default_rng(seed)
+    names = ["time", "m_depth", "sci_rbrctd_temperature_00", "sci_rbrctd_salinity_00", "sci_oxy4_oxygen",
+                "sci_seaowl_chl_sig", "sci_seaowl_fdom_scaled"]
+    units = ["timestamp", "m", "degc", "psu", "um", "nodim", "ppb"]
+
+    file_paths = []
+    start = 1_700_000_000
+    for i in range(n_files):
+        time = start + np.arange(n_rows) * 2
+        values = rng.normal(10, 3, size=(n_rows, len(names) - 1)).round(4)
+        values[rng.random(values.shape) < 0.05] = np.nan
+        body = pd.DataFrame(values).astype(str).replace("nan", "NaN")
+        body.insert(0, "time", time)
+
+        file_path = os.path.join(folder, f"sfmc_export_{i:03d}.txt")
+        with open(file_path, "w") as file:
+            file.write(" ".join(names) + " \n" + " ".join(units) + " \n")
+            body.to_csv(file, sep=" ", header=False, index=False, lineterminator=" \n")
+        file_paths.append(file_path)
+        start = int(time[-1]) - n_rows // 10 * 2
+    return file_paths
+
+
+def synthetic_narrow_post(n_rows:int, mission_id:int=1, seed:int=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "parameter_id": rng.integers(1, 60, size=n_rows),
+        "value": rng.normal(10, 3, size=n_rows).round(4),
+        "date_time": pd.to_datetime(1.7e9 + np.sort(rng.uniform(0, 30 * 86400, size=n_rows)), unit="s").round("S"),
+        "mission_id": mission_id,
+    })
@@ -28,5 +28,7 @@ setup(
     python_requires = ">=3.6",
     install_requires=requirements,
     scripts=['scripts/pnboia-glider-decoder',
-                'scripts/glider-etl']
+                'scripts/glider-etl',
+                'scripts/glider-etl-orchestrator',
+                'scripts/glider-db-maintenance']
 )
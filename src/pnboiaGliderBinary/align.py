@@ -0,0 +1,111 @@
+"""
+PNBoia Glider Binary Data Processor - eng/sci time alignment
+Author: Thiago Caminha
+version: 0.0.1
+
+Interpolates engineering parameters (position and depth) onto the science timestamps, so every
+science sample gets the m_lat/m_lon/m_depth of the glider when it was taken instead of the mostly
+empty rows of an outer join on time.
+
+Samples are only interpolated between two engineering samples of the same segment (dive) and no
+further apart than max_gap seconds; science samples outside those brackets get NaN.
+"""
+
+from dbdreader import DbdError
+import pandas as pd
+import numpy as np
+from pnboiaGliderBinary.fetch import ParameterBatch
+
+
+POSITION_PARAMETERS = ["m_lat", "m_lon", "m_depth"]
+
+
+def get_segment_boundaries(bd, cache=None):
+    """
+    First engineering timestamp of every segment after the first one. The file open times of the
+    headers are not used, as they can be later than the first samples of the file.
+    """
+    starts = []
+    for dbd in bd.dbds["eng"]:
+        try:
+            if cache is not None:
+                arrays = cache.get_file(dbd, parameters=[dbd.timeVariable])
+                time = arrays[0][0] if arrays else np.array([])
+            else:
+                time, _ = dbd.get(dbd.timeVariable)
+        except DbdError:
+            # files without data do not start a segment
+            continue
+        if len(time):
+            starts.append(float(np.min(time)))
+    if cache is not None:
+        cache.save()
+    return np.sort(starts)[1:]
+
+
+def interpolate_onto(target_time:np.ndarray, time:np.ndarray, values:np.ndarray, max_gap:float=None,
+                        boundaries:np.ndarray=None):
+    """
+    Linear interpolation of (time, values) at target_time, NaN where the two bracketing samples are
+    more than max_gap seconds apart or on both sides of a segment boundary, and outside the samples.
+    Samples at exactly a target time are taken as they are.
+    """
+    target_time = np.asarray(target_time, dtype=float)
+    time = np.asarray(time, dtype=float)
+    values = np.asarray(values, dtype=float)
+    result = np.full(target_time.size, np.nan)
+    if time.size == 0:
+        return result
+
+    if not np.all(time[1:] > time[:-1]):
+        # files overlapping in time: sort and keep the last sample of every timestamp
+        order = np.argsort(time, kind="stable")
+        time, values = time[order], values[order]
+        keep = np.r_[time[1:] != time[:-1], True]
+        time, values = time[keep], values[keep]
+
+    position = np.searchsorted(time, target_time, side="left")
+    exact = position < time.size
+    exact[exact] = time[position[exact]] == target_time[exact]
+    result[exact] = values[position[exact]]
+
+    inside = (position > 0) & (position < time.size) & ~exact
+    left, right = position[inside] - 1, position[inside]
+    t0, t1 = time[left], time[right]
+
+    valid = np.ones(left.size, dtype=bool)
+    if max_gap is not None:
+        valid &= (t1 - t0) <= max_gap
+    if boundaries is not None and len(boundaries):
+        valid &= np.searchsorted(boundaries, t0, side="right") == np.searchsorted(boundaries, t1, side="right")
+
+    weight = (target_time[inside] - t0) / (t1 - t0)
+    interpolated = values[left] + weight * (values[right] - values[left])
+    result[np.flatnonzero(inside)[valid]] = interpolated[valid]
+    return result
+
+
+def align_to_time_base(target_time:np.ndarray, batch:ParameterBatch, max_gap:float=None,
+                        boundaries:np.ndarray=None):
+    """
+    DataFrame with a column per parameter of batch, interpolated at target_time.
+    """
+    return pd.DataFrame({name: interpolate_onto(target_time=target_time, time=time, values=values,
+                                                max_gap=max_gap, boundaries=boundaries)
+                        for name, time, values in batch})
+
+
+def align_eng_to_sci(batch:ParameterBatch, science_parameters:list, engineering_parameters:list=POSITION_PARAMETERS,
+                        max_gap:float=600, boundaries:np.ndarray=None):
+    """
+    Wide science frame (time + one column per science parameter, on the union of their timestamps)
+    with the engineering parameters interpolated at every science timestamp.
+    """
+    science = batch.select(science_parameters).to_wide_dataframe()
+    if science.empty:
+        return pd.DataFrame(columns=["time"] + list(science_parameters) + list(engineering_parameters))
+
+    engineering = align_to_time_base(target_time=science["time"].to_numpy(),
+                                        batch=batch.select(engineering_parameters),
+                                        max_gap=max_gap, boundaries=boundaries)
+    return pd.concat([science, engineering], axis=1)
@@ -17,15 +17,26 @@ import os
 from glob import glob
 import re
 import sys
+from pandas.api.types import union_categoricals
+from pnboiaGliderBinary.fetch import fetch_parameters
+from pnboiaGliderBinary.frames import pivot_narrow_dataframe
+from pnboiaGliderBinary.align import POSITION_PARAMETERS, align_eng_to_sci, get_segment_boundaries
+from pnboiaGliderBinary.decoded_cache import DecodedParameterCache
+from pnboiaGliderBinary.writers import get_writer
+from pnboiaGliderProfiling.profiler import StageProfiler, profiled_stage
 
 class GliderDataToCSV():
 
-    def __init__(self, binary_files_path:str, cache_dir:str, extension:str=".[st]bd"):
+    def __init__(self, binary_files_path:str, cache_dir:str, extension:str=".[st]bd", output_format:str="csv",
+                    profiler:StageProfiler=None, use_decoded_cache:bool=True, decoded_cache_dir:str=None):
 
         self.binary_files_path = binary_files_path
         self.extension = "*" + extension
         self.pattern = os.path.join(binary_files_path,self.extension)
         self.cache_dir = cache_dir
+        self.writer = get_writer(output_format=output_format)
+        self.profiler = profiler
+        self.decoded_cache = DecodedParameterCache(cache_dir=decoded_cache_dir) if use_decoded_cache else None
 
         self.data_file_names = glob(os.path.join(binary_files_path,"*bd"))
         self.cache_file_names = glob(os.path.join(cache_dir,"*.cac"))
@@ -49,25 +60,22 @@ class GliderDataToCSV():
         self.sci_params_selection = ['sci_rbrctd_temperature_00', 'sci_oxy4_oxygen','sci_rbrctd_salinity_00',
                                     'sci_seaowl_chl_scaled', 'sci_seaowl_fdom_scaled','sci_seaowl_bb_scaled']
 
+        self.bd = self.decode_binary_data(pattern=self.pattern)
+
+    @profiled_stage("decode")
+    def decode_binary_data(self, pattern:str=None, filenames:list=None):
         print("Decoding binary data with dbdreader...")
-        self.bd = MultiDBD(pattern=self.pattern, cacheDir=self.cache_dir)
+        return MultiDBD(filenames=filenames, pattern=pattern, cacheDir=self.cache_dir)
 
 
     # WIDE CSV METHODS
     def generate_wide_dataframe(self, parameters_type:str="eng"):
         print(f"Generating {parameters_type} dataframe...")
 
-        data = pd.DataFrame([])
-
         if hasattr(self,"bd"):
-            for parameter in self.bd.parameterNames[parameters_type]:
-                tm, param = self.bd.get(parameter)
-                df = pd.DataFrame({"time":tm, parameter:param})
-                # print(parameter, "shape:", param.shape)
-                if data.empty:
-                    data = df
-                else:
-                    data = pd.merge(left=data, right=df, on="time", how="outer")
+            batch = fetch_parameters(bd=self.bd, parameters=self.bd.parameterNames[parameters_type],
+                                        cache=self.decoded_cache)
+            data = batch.to_wide_dataframe()
         else:
             raise AttributeError("No binary data attribute was created. Please, review your instantiation using the MultiDBD tool.")
 
@@ -80,6 +88,7 @@ class GliderDataToCSV():
         print(f"Merging eng and sci data to a single dataframe...")
         return pd.merge(science_data, engineering_data, on="time", how="outer")
 
+    @profiled_stage("datetime")
     def convert_to_datetime(self, time:np.array):
         print("Converting timestamp to datetime...")
         date_time = pd.to_datetime(time, unit="s")
@@ -96,9 +105,9 @@ class GliderDataToCSV():
 
         return match.group(0)
 
-    def compose_data_file_name(self, file_type:str="narrow"):
+    def compose_data_file_name(self, file_type:str="narrow", file_extension:str="csv"):
         print("Composing filename...")
-        return f"{self.glider_unit_name}_{self.mission_params_first}_to_{self.mission_params_last}_{self.extension}_{file_type}.csv"
+        return f"{self.glider_unit_name}_{self.mission_params_first}_to_{self.mission_params_last}_{self.extension}_{file_type}.{file_extension}"
 
     def check_output_folder(self, output_path:str):
         path_to_check = os.path.join(output_path, "processed")
@@ -115,11 +124,20 @@ class GliderDataToCSV():
         file_path = os.path.join(output_path, file_name)
         data.to_csv(file_path)
 
-    # NARROW CSV METHODS
-    def generate_narrow_dataframe(self, extension:str, parameters_type:str="eng"):
+    @profiled_stage("save")
+    def save_data_file(self, data:pd.DataFrame, output_path:str, file_type:str="narrow", part:int=0):
 
-        data = pd.DataFrame(columns=["time", "variable", "value"])
+        self.check_output_folder(output_path=output_path)
+
+        file_name = self.compose_data_file_name(file_type=file_type, file_extension=self.writer.extension)
+        print(f"Saving {file_type} data file as {file_name}...")
+        output_path = os.path.join(self.binary_files_path,"processed")
+        file_path = os.path.join(output_path, file_name)
+        self.writer.write(data=data, file_path=file_path, part=part)
 
+    # NARROW CSV METHODS
+    @profiled_stage("narrow")
+    def generate_narrow_dataframe(self, extension:str, parameters_type:str="eng"):
 
         if extension == ".[st]bd":
             selected_parameters = self.bd.parameterNames[parameters_type]
@@ -131,32 +149,36 @@ class GliderDataToCSV():
 
         if hasattr(self,"bd"):
             # for parameter in self.bd.parameterNames[parameters_type]:
-            for parameter in selected_parameters:
-                time, values = self.bd.get(parameter)
-                single_param_data = pd.DataFrame({"time":time, "variable":parameter, "value":values})
-                if data.empty:
-                    data = single_param_data
-                else:
-                    data = pd.concat([data, single_param_data], axis=0)
+            batch = fetch_parameters(bd=self.bd, parameters=selected_parameters, cache=self.decoded_cache)
+            data = batch.to_narrow_dataframe(label_column="variable")
 
         else:
             raise AttributeError("No binary data attribute was created. Please, review your instantiation using the MultiDBD tool.")
 
         return data
 
-    def round_values(self, data:pd.DataFrame, round_number:int=4):
+    @profiled_stage("round_values")
+    def round_values(self, data:pd.DataFrame, round_number:int=4, columns:list=["value"]):
         print(f"Rouding values by {round_number}...")
-        data["value"] = data["value"].round(round_number)
+        data[columns] = data[columns].round(round_number)
         return data
 
+    @profiled_stage("data_type_column")
     def create_data_type_column(self, data:pd.DataFrame, data_type:str="engineering"):
         print(f"Creating data_type ({data_type}) column...")
         data.insert(1,"data_type", data_type)
         return data
 
+    @profiled_stage("concat")
     def concat_sci_eng(self, science_data:pd.DataFrame, engineering_data:pd.DataFrame):
-        return pd.concat([science_data, engineering_data], axis=0)
+        data = pd.concat([science_data, engineering_data], axis=0)
+        # keep the variable column categorical instead of falling back to object
+        data["variable"] = union_categoricals([science_data["variable"].astype("category"),
+                                                engineering_data["variable"].astype("category")],
+                                                sort_categories=True)
+        return data
 
+    @profiled_stage("drop_redundant")
     def drop_redundant_parameters(self, science_data:pd.DataFrame, engineering_data:pd.DataFrame):
         test = np.isin(engineering_data["variable"].unique(), science_data["variable"].unique())
         idxs = [idx for idx, t in enumerate(test) if t]
@@ -167,9 +189,117 @@ class GliderDataToCSV():
             redundant_parameters = self.engineering_data["variable"].unique()[idxs]
             return science_data[~science_data.variable.isin(redundant_parameters)]
 
-    def pivot_data(self, data:pd.DataFrame):
-        data = data.reset_index()
-        return data.pivot(index="date_time", columns="variable", values="value")
+    @profiled_stage("pivot")
+    def pivot_data(self, data:pd.DataFrame, duplicates:str="last", resample:str=None):
+        print(f"Pivoting narrow data (duplicates: {duplicates}{f', resample: {resample}' if resample else ''})...")
+        return pivot_narrow_dataframe(data=data, duplicates=duplicates, resample=resample)
+
+    # ALIGNED METHODS
+    @profiled_stage("align")
+    def generate_aligned_dataframe(self, extension:str, max_gap:float=600):
+        """
+        Science samples with m_lat/m_lon/m_depth interpolated at their timestamps, within a segment
+        and between eng samples at most max_gap seconds apart.
+        """
+        print("Aligning eng positions to the sci timestamps...")
+        if extension == ".[st]bd":
+            science_parameters = self.bd.parameterNames["sci"]
+        elif extension == ".[de]bd":
+            science_parameters = self.sci_params_selection
+
+        engineering_parameters = [parameter for parameter in POSITION_PARAMETERS
+                                    if parameter in self.bd.parameterNames["eng"]]
+        science_parameters = [parameter for parameter in science_parameters if parameter not in engineering_parameters]
+
+        batch = fetch_parameters(bd=self.bd, parameters=science_parameters + engineering_parameters,
+                                    cache=self.decoded_cache)
+        boundaries = get_segment_boundaries(bd=self.bd, cache=self.decoded_cache)
+        data = align_eng_to_sci(batch=batch, science_parameters=science_parameters,
+                                engineering_parameters=engineering_parameters, max_gap=max_gap, boundaries=boundaries)
+        data = self.round_values(data=data, round_number=4, columns=science_parameters + engineering_parameters)
+
+        data["date_time"] = self.convert_to_datetime(time=data["time"])
+        return data.set_index("date_time")
+
+    # ALL DATA METHODS
+    @profiled_stage("all_data")
+    def generate_all_data(self, extension:str):
+        self.engineering_data = self.generate_narrow_dataframe(parameters_type="eng", extension=extension)
+        self.engineering_data = self.create_data_type_column(data=self.engineering_data, data_type="engineering")
+
+        self.science_data = self.generate_narrow_dataframe(parameters_type="sci", extension=extension)
+        self.science_data = self.create_data_type_column(data=self.science_data, data_type="science")
+
+        if extension == ".[de]bd":
+            self.science_data = self.drop_redundant_parameters(engineering_data=self.engineering_data,
+                                                                science_data=self.science_data)
+
+        all_data = self.concat_sci_eng(science_data=self.science_data, engineering_data=self.engineering_data)
+        all_data = self.round_values(data=all_data, round_number=4)
+
+        all_data["date_time"] = self.convert_to_datetime(time=all_data["time"])
+        # stable, so the "last" duplicates policy keeps the input order between equal timestamps
+        return all_data.set_index("date_time").sort_index(kind="stable")
+
+    # STREAMING METHODS
+    def group_files_in_windows(self, window_size:int=10):
+        """
+        Split the binary files in time-ordered windows of window_size segments, keeping the
+        eng and sci files of a segment (e.g. .sbd and .tbd) in the same window.
+        """
+        segments = {}
+        for dbd in self.bd.dbds["eng"] + self.bd.dbds["sci"]:
+            segment = os.path.splitext(dbd.filename)[0]
+            files, open_time = segments.get(segment, ([], dbd.get_fileopen_time()))
+            segments[segment] = (files + [dbd.filename], min(open_time, dbd.get_fileopen_time()))
+
+        segments = sorted(segments.values(), key=lambda segment: segment[1])
+        return [[file for files, _ in segments[start:start + window_size] for file in files]
+                for start in range(0, len(segments), window_size)]
+
+    def compose_wide_columns(self, extension:str):
+        if extension == ".[st]bd":
+            parameters = self.bd.parameterNames["eng"] + self.bd.parameterNames["sci"]
+        elif extension == ".[de]bd":
+            parameters = self.eng_params_selection + self.sci_params_selection
+        return sorted(set(parameters))
+
+    def save_data_files_in_windows(self, output_path:str, extension:str, window_size:int=10,
+                                    duplicates:str="last", resample:str=None, aligned:bool=False, max_gap:float=600):
+        """
+        Decode, process and save window_size segments at a time, appending each window to the narrow
+        and wide outputs, so peak memory depends on the window and not on the mission length.
+        """
+        if not self.writer.appendable:
+            raise ValueError(f"The {self.writer.extension} output cannot be appended to. "
+                                "Use the csv or parquet output for windowed runs.")
+
+        windows = self.group_files_in_windows(window_size=window_size)
+        wide_columns = self.compose_wide_columns(extension=extension)
+        mission_bd = self.bd
+
+        try:
+            for part, filenames in enumerate(windows):
+                print(f"\nProcessing window {part + 1}/{len(windows)} ({len(filenames)} files)...")
+                self.bd = self.decode_binary_data(filenames=filenames)
+                try:
+                    all_data = self.generate_all_data(extension=extension)
+                    self.save_data_file(data=all_data, file_type="narrow", output_path=output_path, part=part)
+
+                    all_data_wide = self.pivot_data(data=all_data, duplicates=duplicates, resample=resample)
+                    all_data_wide.columns = all_data_wide.columns.astype(str)
+                    all_data_wide = all_data_wide.reindex(columns=wide_columns)
+                    self.save_data_file(data=all_data_wide, file_type="wide", output_path=output_path, part=part)
+
+                    if aligned:
+                        # windows hold whole segments, so no interpolation is lost at their edges
+                        all_data_aligned = self.generate_aligned_dataframe(extension=extension, max_gap=max_gap)
+                        self.save_data_file(data=all_data_aligned, file_type="aligned", output_path=output_path,
+                                            part=part)
+                finally:
+                    self.bd.close()
+        finally:
+            self.bd = mission_bd
 
 # if __name__ == "__main__":
 #     print("="*30)
@@ -0,0 +1,285 @@
+"""
+PNBoia Glider Binary Data Processor - decoded parameters cache
+Author: Thiago Caminha
+version: 0.0.1
+
+On-disk cache of the (time, values) arrays dbdreader decodes from every binary file, so a new run on
+the same mission only decodes the segments added since the last one and memory-maps the others.
+
+Credits:
+Lucas Merckelbach (https://github.com/smerckel), author of the dbdreder package.
+"""
+
+from dbdreader import DbdError
+import dbdreader
+import numpy as np
+import hashlib
+import shutil
+import json
+import time
+import os
+
+
+class DecodedParameterCache():
+    """
+    One folder per binary file, named after the hash of its content and its .cac cache id, holding
+    a <parameter>.f8 per parameter read from it: the raw float64 time and values arrays, one after
+    the other, so no header has to be parsed when reading them back. Folders are evicted
+    least recently used first once the cache grows over max_size bytes
+    (PNBOIA_GLIDER_DECODED_CACHE_MB, 2048 MB by default), from an index of their sizes and last
+    uses, so eviction does not have to scan the cache.
+    """
+
+    hashes_file_name = "file_hashes.json"
+    entries_file_name = "entries.json"
+    # smaller arrays are read instead of memory-mapped
+    mmap_threshold = 1024 ** 2
+
+    def __init__(self, cache_dir:str=None, max_size:int=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getenv("PNBOIA_GLIDER_CACHE_DIR",
+                                                os.path.join(os.path.expanduser("~"), ".cache", "pnboia_glider")),
+                                    "decoded")
+        if max_size is None:
+            max_size = int(os.getenv("PNBOIA_GLIDER_DECODED_CACHE_MB", 2048)) * 1024 ** 2
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.written = False
+        self.file_hashes = self.load_file_hashes()
+        self.entries = self.load_entries()
+        # entries this process used and evicted since the index was last saved (all of them when the
+        # index was just built from a scan)
+        self.touched = set() if os.path.exists(self.compose_entries_path()) else set(self.entries)
+        self.evicted = set()
+
+    # FILE KEYS
+    def compose_hashes_path(self):
+        return os.path.join(self.cache_dir, self.hashes_file_name)
+
+    def load_file_hashes(self):
+        hashes_path = self.compose_hashes_path()
+        if not os.path.exists(hashes_path):
+            return {}
+        with open(hashes_path, "r") as file:
+            return json.load(file)
+
+    def save_json(self, data:dict, json_path:str):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = f"{json_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary_path, json_path)
+
+    def save_file_hashes(self):
+        self.save_json(data=self.file_hashes, json_path=self.compose_hashes_path())
+
+    def hash_file(self, filepath:str):
+        """
+        sha1 of the file content. Files keeping the size and mtime they had when hashed are not read again.
+        """
+        filepath = os.path.abspath(filepath)
+        stat = os.stat(filepath)
+        signature = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        entry = self.file_hashes.get(filepath)
+        if entry and entry["signature"] == signature:
+            return entry["hash"]
+
+        digest = hashlib.sha1()
+        with open(filepath, "rb") as file:
+            for block in iter(lambda: file.read(1024 ** 2), b""):
+                digest.update(block)
+        self.file_hashes[filepath] = {"signature": signature, "hash": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def compose_entry_name(self, dbd):
+        return f"{self.hash_file(dbd.filename)}_{dbd.cacheID}"
+
+    # ENTRIES INDEX
+    def compose_entries_path(self):
+        return os.path.join(self.cache_dir, self.entries_file_name)
+
+    def load_entries(self):
+        """
+        {entry name: {"size": bytes, "last_used": time}}. Caches written before the index existed
+        are scanned once to build it.
+        """
+        entries_path = self.compose_entries_path()
+        if os.path.exists(entries_path):
+            with open(entries_path, "r") as file:
+                return json.load(file)
+        if not os.path.isdir(self.cache_dir):
+            return {}
+        return {entry.name: {"size": sum(array.stat().st_size for array in os.scandir(entry.path)),
+                                "last_used": entry.stat().st_mtime}
+                for entry in os.scandir(self.cache_dir) if entry.is_dir()}
+
+    def save_entries(self):
+        """
+        Merge the entries this process used or evicted into the index on disk, as other processes
+        may have updated it since it was loaded.
+        """
+        entries_path = self.compose_entries_path()
+        entries = {}
+        if os.path.exists(entries_path):
+            with open(entries_path, "r") as file:
+                entries = json.load(file)
+        for entry_name in self.touched - self.evicted:
+            entry = self.entries[entry_name]
+            if entry_name not in entries or entries[entry_name]["last_used"] <= entry["last_used"]:
+                entries[entry_name] = entry
+        for entry_name in self.evicted:
+            entries.pop(entry_name, None)
+        self.entries = entries
+        self.touched = set()
+        self.evicted = set()
+        self.save_json(data=self.entries, json_path=entries_path)
+
+    def use_entry(self, entry_name:str, added_size:int=0, new:bool=False):
+        entry = self.entries.get(entry_name, {"size": 0}) if not new else {"size": 0}
+        self.entries[entry_name] = {"size": entry["size"] + added_size, "last_used": time.time()}
+        self.touched.add(entry_name)
+        self.evicted.discard(entry_name)
+
+    # ARRAYS
+    def load_array(self, array_path:str):
+        size = os.path.getsize(array_path)
+        if size >= self.mmap_threshold:
+            return np.memmap(array_path, dtype=np.float64, mode="r", shape=(2, size // 16))
+        return np.fromfile(array_path, dtype=np.float64).reshape(2, -1)
+
+    def save_array(self, array_path:str, time:np.ndarray, values:np.ndarray):
+        temporary_path = f"{array_path}.{os.getpid()}.tmp"
+        np.vstack([np.asarray(time, dtype=np.float64), np.asarray(values, dtype=np.float64)]).tofile(temporary_path)
+        os.replace(temporary_path, array_path)
+
+    def decode(self, dbd, parameters:list):
+        """
+        What MultiDBD.get reads from one file: lat/lon in decimal degrees without the bogus values,
+        and empty arrays for the parameters the file does not have.
+        """
+        try:
+            result = dbd.get(*parameters, decimalLatLon=True, discardBadLatLon=True,
+                                check_for_invalid_parameters=False)
+        except DbdError as error:
+            # (nearly) empty files are skipped by MultiDBD as well
+            if error.value == dbdreader.DBD_ERROR_NO_DATA_TO_INTERPOLATE_TO:
+                return None
+            raise
+        return [result] if len(parameters) == 1 else result
+
+    def decode_entry(self, dbd, entry_name:str, parameters:list, new:bool=False):
+        """
+        Decode the parameters of one binary file and write them to its entry. Returns
+        {parameter: (time, values)}, or None for files without data.
+        """
+        decoded = self.decode(dbd, parameters=parameters)
+        if decoded is None:
+            return None
+
+        entry_path = os.path.join(self.cache_dir, entry_name)
+        os.makedirs(entry_path, exist_ok=True)
+        arrays = {}
+        for parameter, (time, values) in zip(parameters, decoded):
+            self.save_array(array_path=os.path.join(entry_path, f"{parameter}.f8"), time=time, values=values)
+            arrays[parameter] = (time, values)
+        self.use_entry(entry_name, added_size=sum(16 * len(time) for time, _ in decoded), new=new)
+        self.written = True
+        return arrays
+
+    def get_file(self, dbd, parameters:list):
+        """
+        [(time, values), ...] of the parameters in one binary file, decoding only the ones not cached
+        yet. Returns None for files without data.
+        """
+        entry_name = self.compose_entry_name(dbd)
+        array_paths = {parameter: os.path.join(self.cache_dir, entry_name, f"{parameter}.f8")
+                        for parameter in parameters}
+        missing = [parameter for parameter in parameters if not os.path.exists(array_paths[parameter])]
+
+        arrays = {}
+        if missing:
+            arrays = self.decode_entry(dbd, entry_name=entry_name, parameters=missing)
+            if arrays is None:
+                return None
+
+        try:
+            for parameter in parameters:
+                if parameter not in arrays:
+                    array = self.load_array(array_paths[parameter])
+                    arrays[parameter] = (array[0], array[1])
+        except FileNotFoundError:
+            # evicted by another process since the check above: a cache miss
+            arrays = self.decode_entry(dbd, entry_name=entry_name, parameters=parameters, new=True)
+            if arrays is None:
+                return None
+
+        if not missing:
+            # last use, for the LRU eviction
+            self.use_entry(entry_name)
+        return [arrays[parameter] for parameter in parameters]
+
+    def get(self, bd, parameters:list):
+        """
+        Drop-in for MultiDBD.get(*parameters) that always returns a list of (time, values), one per
+        parameter, with the arrays of every file of bd concatenated in time order.
+        """
+        all_parameters = set(bd.parameterNames["eng"]) | set(bd.parameterNames["sci"])
+        if not set(parameters) <= all_parameters:
+            # unknown sensor names: let dbdreader raise its own error
+            result = bd.get(*parameters)
+            return [result] if len(parameters) == 1 else result
+
+        if not hasattr(bd, "_ignore_cache"):
+            # files MultiDBD leaves out of its time limits are listed in this private attribute
+            print("dbdreader.MultiDBD has no _ignore_cache, reading without the decoded parameters cache")
+            result = bd.get(*parameters)
+            return [result] if len(parameters) == 1 else result
+
+        ignored = bd._ignore_cache
+        arrays = {}
+        # parameters in both file types are read from the science files, as MultiDBD does
+        file_types = {parameter: "sci" if parameter in bd.parameterNames["sci"] else "eng"
+                        for parameter in parameters}
+        for file_type in ["eng", "sci"]:
+            file_parameters = [parameter for parameter in file_types if file_types[parameter] == file_type]
+            if not file_parameters:
+                continue
+
+            chunks = {parameter: [] for parameter in file_parameters}
+            for dbd in bd.dbds[file_type]:
+                if dbd in ignored:
+                    continue
+                result = self.get_file(dbd, parameters=file_parameters)
+                for parameter, (time, values) in zip(file_parameters, result or []):
+                    chunks[parameter].append((time, values))
+
+            for parameter, pairs in chunks.items():
+                arrays[parameter] = (np.hstack([time for time, _ in pairs]) if pairs else np.array([]),
+                                        np.hstack([values for _, values in pairs]) if pairs else np.array([]))
+
+        self.save()
+        return [arrays[parameter] for parameter in parameters]
+
+    def save(self):
+        """
+        Persist the file hashes and the entries index, evicting entries first when something was
+        written. get() calls it, callers of get_file() call it once done.
+        """
+        self.save_file_hashes()
+        if self.written:
+            self.evict()
+            self.written = False
+        self.save_entries()
+
+    # EVICTION
+    def evict(self):
+        entries = sorted(self.entries.items(), key=lambda item: item[1]["last_used"])
+        total_size = sum(entry["size"] for _, entry in entries)
+        for entry_name, entry in entries:
+            if total_size <= self.max_size:
+                break
+            print(f"Evicting decoded parameters cache entry {entry_name}")
+            shutil.rmtree(os.path.join(self.cache_dir, entry_name), ignore_errors=True)
+            del self.entries[entry_name]
+            self.evicted.add(entry_name)
+            total_size -= entry["size"]
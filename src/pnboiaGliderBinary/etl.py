@@ -17,25 +17,33 @@ import os
 from glob import glob
 import re
 import sys
+import json
 from pnboiaGliderDataBase.db import GetData
+from pnboiaGliderBinary.fetch import fetch_parameters
+from pnboiaGliderBinary.decoded_cache import DecodedParameterCache
+from pnboiaGliderProfiling.profiler import StageProfiler, profiled_stage
 
 
 class PNBOIAGlider():
 
-    def __init__(self, mission_id:int=None, mission_name:str=None, conn=None):
+    def __init__(self, mission_id:int=None, mission_name:str=None, conn=None, profiler:StageProfiler=None,
+                    use_decoded_cache:bool=True, decoded_cache_dir:str=None):
 
         if not any([mission_id,mission_name]):
             raise AttributeError("Please provide either a mission id or mission name.")
         self.mission_id = mission_id
         self.mission_name = mission_name
+        self.profiler = profiler
+        self.decoded_cache = DecodedParameterCache(cache_dir=decoded_cache_dir) if use_decoded_cache else None
 
         if conn:
-            self.db = GetData(conn=conn)
+            self.db = GetData(conn=conn, use_cache=True)
         else:
             self.db = GetData(host=os.getenv('PNBOIA_GLIDER_HOST'),
                                 database=os.getenv('PNBOIA_GLIDER_DB'),
                                 user=os.getenv('PNBOIA_GLIDER_USER'),
-                                password=os.getenv('PNBOIA_GLIDER_PSW'))
+                                password=os.getenv('PNBOIA_GLIDER_PSW'),
+                                use_cache=True)
 
     def get_mission_info(self, mission_id):
         print(f"Grabbing mission (mission_id = {mission_id}) information...")
@@ -47,8 +55,116 @@ class PNBOIAGlider():
         extension = "*" + extension
         return os.path.join(binary_files_path, extension)
 
-    def decode_binary_data(self, pattern:str, cache_dir:str):
-        return MultiDBD(pattern=pattern, cacheDir=cache_dir)
+    @profiled_stage("decode")
+    def decode_binary_data(self, cache_dir:str, pattern:str=None, filenames:list=None):
+        return MultiDBD(filenames=filenames, pattern=pattern, cacheDir=cache_dir)
+
+    # INCREMENTAL METHODS
+    def compose_manifest_path(self, binary_files_path:str, extension:str):
+        extension = extension.replace("[", "").replace("]", "").strip(".")
+        return os.path.join(binary_files_path, f".pnboia_glider_mission_{self.mission_id}_{extension}_manifest.json")
+
+    def load_manifest(self, manifest_path:str):
+        if not os.path.exists(manifest_path):
+            return {"files": {}}
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+
+    def save_manifest(self, manifest:dict, manifest_path:str):
+        print(f"Saving processed files manifest ({manifest_path})")
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    def select_new_binary_files(self, binary_files_path:str, extension:str, manifest:dict):
+        """
+        Return the files of every segment (e.g. both the .sbd and the .tbd) that has at least one file
+        missing from the manifest or whose size/mtime changed since it was processed.
+        """
+        files = sorted(glob(self.compose_multidbd_pattern(binary_files_path=binary_files_path, extension=extension)))
+
+        changed_segments = set()
+        for file in files:
+            stat = os.stat(file)
+            entry = manifest["files"].get(os.path.basename(file))
+            if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+                changed_segments.add(os.path.splitext(file)[0])
+
+        new_files = [file for file in files if os.path.splitext(file)[0] in changed_segments]
+        print(f"{len(new_files)} new or changed binary files out of {len(files)}")
+        return new_files
+
+    def update_manifest(self, manifest:dict, bd:MultiDBD):
+        for dbd in bd.dbds["eng"] + bd.dbds["sci"]:
+            stat = os.stat(dbd.filename)
+            if self.decoded_cache:
+                arrays = self.decoded_cache.get_file(dbd, parameters=[dbd.timeVariable])
+                time = arrays[0][0] if arrays else np.array([])
+            else:
+                time, _ = dbd.get(dbd.timeVariable)
+            manifest["files"][os.path.basename(dbd.filename)] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "last_timestamp": float(time.max()) if time.size else None,
+            }
+        if self.decoded_cache:
+            self.decoded_cache.save()
+        last_timestamps = [entry["last_timestamp"] for entry in manifest["files"].values()
+                            if entry["last_timestamp"] is not None]
+        manifest["last_timestamp"] = max(last_timestamps) if last_timestamps else None
+        return manifest
+
+    def run_etl(self, binary_files_path:str, extension:str, post:bool=False, incremental:bool=False):
+        """
+        Decode -> narrow -> post pipeline for this mission. Returns the number of rows posted.
+        """
+        mission_info = self.get_mission_info(mission_id=self.mission_id)
+
+        if incremental:
+            manifest_path = self.compose_manifest_path(binary_files_path=binary_files_path, extension=extension)
+            manifest = self.load_manifest(manifest_path=manifest_path)
+            new_files = self.select_new_binary_files(binary_files_path=binary_files_path, extension=extension, manifest=manifest)
+            if not new_files:
+                print("No new binary files for this mission.")
+                return 0
+            self.bd = self.decode_binary_data(filenames=new_files, cache_dir=binary_files_path)
+        else:
+            pattern = self.compose_multidbd_pattern(binary_files_path=binary_files_path, extension=extension)
+            self.bd = self.decode_binary_data(pattern=pattern, cache_dir=binary_files_path)
+
+        eng_params = self.get_parameters(parameter_type="ENG")
+        eng_data = self.generate_narrow_dataframe(parameters=eng_params)
+
+        sci_params = self.get_parameters(parameter_type="SCI")
+        sci_data = self.generate_narrow_dataframe(parameters=sci_params)
+
+        all_data = self.concat_sci_eng(science_data=sci_data, engineering_data=eng_data)
+        all_data = self.convert_to_datetime(data=all_data)
+        all_data = self.round_datetime(data=all_data, frequency="S")
+        all_data = self.round_values(data=all_data, round_number=4)
+        all_data = self.insert_mission_id(data=all_data, mission_id=mission_info.mission_id.values[0])
+
+        rows = 0
+        if post:
+            last_datetime = self.get_last_datetime_in_db(mission_id=self.mission_id)
+            if not last_datetime.empty:
+                all_data = all_data[all_data.date_time > last_datetime.values[0]]
+
+            if not all_data.empty:
+                rows = self.post_data(data=all_data)
+            else:
+                print(f"No new data for this mission.")
+
+            if incremental:
+                manifest = self.update_manifest(manifest=manifest, bd=self.bd)
+                self.save_manifest(manifest=manifest, manifest_path=manifest_path)
+
+        return rows
+
+    @profiled_stage("post")
+    def post_data(self, data:pd.DataFrame):
+        print(f"\nPosting data in {os.getenv('PNBOIA_GLIDER_DB')}...")
+        self.db.post(schema='data', table='data', data=data)
+        return data.shape[0]
 
     def get_parameters(self, parameter_type:str):
         print(f"\nGrabing {parameter_type} parameters")
@@ -57,30 +173,24 @@ class PNBOIAGlider():
                 .sort_values("id")
                 )
 
+    @profiled_stage("narrow")
     def generate_narrow_dataframe(self, parameters:pd.DataFrame):
 
-        data = pd.DataFrame(columns=["time", "parameter_id", "value"])
-
         if hasattr(self,"bd"):
-            for idx, row in parameters[['id','name']].iterrows():
-                print(f"Grabing {row['name']} (parameter_id = {row.id})")
-                time, values = self.bd.get(row['name'])
-                single_param_data = pd.DataFrame({"time":time,
-                                                    "parameter_id": row.id,
-                                                    "value":values})
-                if data.empty:
-                    data = single_param_data
-                else:
-                    data = pd.concat([data, single_param_data], axis=0)
+            print(f"Grabing {len(parameters)} parameters")
+            batch = fetch_parameters(bd=self.bd, parameters=parameters['name'].tolist(), cache=self.decoded_cache)
+            data = batch.to_narrow_dataframe(labels=parameters['id'].to_numpy(), label_column="parameter_id")
 
         else:
             raise AttributeError("No binary data attribute was created. Please, review your instantiation using the MultiDBD tool.")
 
         return data
 
+    @profiled_stage("concat")
     def concat_sci_eng(self, science_data:pd.DataFrame, engineering_data:pd.DataFrame):
         return pd.concat([science_data, engineering_data], axis=0)
 
+    @profiled_stage("datetime")
     def convert_to_datetime(self, data:pd.DataFrame):
         print("Converting timestamp to datetime")
         date_time = pd.to_datetime(data['time'] , unit="s")
@@ -88,16 +198,19 @@ class PNBOIAGlider():
         data = data.drop(columns="time")
         return data
 
+    @profiled_stage("round_values")
     def round_values(self, data:pd.DataFrame, round_number:int=4):
         print(f"Rouding values by {round_number}")
         data["value"] = data["value"].round(round_number)
         return data
 
+    @profiled_stage("insert_mission_id")
     def insert_mission_id(self, data:pd.DataFrame, mission_id:int):
         print(f"Inserting mission_id ({mission_id})")
         data["mission_id"] = mission_id
         return data
 
+    @profiled_stage("last_datetime")
     def get_last_datetime_in_db(self, mission_id:int):
         print("Filtering old data")
         return (self.db
@@ -106,6 +219,7 @@ class PNBOIAGlider():
                         )
 
 
+    @profiled_stage("round_datetime")
     def round_datetime(self, data:pd.DataFrame, frequency:str):
         print("Rounding datetime")
         date_time = data['date_time'].dt.round(freq="S")
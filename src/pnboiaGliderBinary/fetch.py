@@ -0,0 +1,73 @@
+"""
+PNBoia Glider Binary Data Processor - batched parameter fetch
+Author: Thiago Caminha
+version: 0.0.1
+
+Reads every requested parameter from a dbdreader MultiDBD in a single call, so each binary file
+is walked once per run instead of once per parameter.
+"""
+
+from pnboiaGliderBinary.frames import build_narrow_dataframe, build_wide_dataframe
+
+
+class ParameterBatch():
+    """
+    Columnar result of a batched read: one (time, values) pair of arrays per parameter name.
+    """
+
+    def __init__(self, names:list, times:list, values:list):
+        self.names = list(names)
+        self.times = list(times)
+        self.values = list(values)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(zip(self.names, self.times, self.values))
+
+    def get(self, name:str):
+        index = self.names.index(name)
+        return self.times[index], self.values[index]
+
+    def select(self, names:list):
+        indexes = [self.names.index(name) for name in names]
+        return ParameterBatch(names=[self.names[i] for i in indexes],
+                                times=[self.times[i] for i in indexes],
+                                values=[self.values[i] for i in indexes])
+
+    def to_wide_dataframe(self):
+        return build_wide_dataframe(names=self.names, times=self.times, values=self.values)
+
+    def to_narrow_dataframe(self, labels:list=None, label_column:str="variable"):
+        if labels is None:
+            labels = self.names
+        return build_narrow_dataframe(times=self.times, values=self.values, labels=labels,
+                                        label_column=label_column)
+
+
+def fetch_parameters(bd, parameters:list, cache=None):
+    """
+    Read all parameters (eng and sci alike) with one MultiDBD.get(*parameters) call.
+
+    dbdreader splits the request by file type, so every .dbd/.ebd file is read once. With a
+    DecodedParameterCache, only the files (and parameters) not cached yet are decoded.
+    """
+    names = list(dict.fromkeys(parameters))
+    print(f"Reading {len(names)} parameters from the binary files...")
+
+    if len(names) == 0:
+        return ParameterBatch(names=[], times=[], values=[])
+
+    if cache is not None:
+        result = cache.get(bd, parameters=names)
+    else:
+        result = bd.get(*names)
+        if len(names) == 1:
+            result = [result]
+
+    arrays = dict(zip(names, result))
+    return ParameterBatch(names=parameters,
+                            times=[arrays[name][0] for name in parameters],
+                            values=[arrays[name][1] for name in parameters])
+
@@ -0,0 +1,147 @@
+"""
+PNBoia Glider Binary Data Processor - dataframe builders
+Author: Thiago Caminha
+version: 0.0.1
+
+Builders that assemble the wide and narrow dataframes straight from the (time, values) arrays
+returned by dbdreader, instead of growing a DataFrame one parameter at a time.
+"""
+
+import pandas as pd
+import numpy as np
+
+
+def build_wide_dataframe(names:list, times:list, values:list):
+    """
+    Scatter every parameter into a single float matrix indexed by the union of all timestamps.
+
+    Equivalent to chaining pd.merge(..., on="time", how="outer") over the parameters, but each
+    array is copied only once. Repeated timestamps inside a parameter keep the last value.
+    """
+    if len(names) == 0:
+        return pd.DataFrame([])
+
+    union_time = np.unique(np.concatenate([np.asarray(time, dtype=float) for time in times]))
+
+    # column-major so that every parameter is written to a contiguous block
+    matrix = np.full((union_time.size, len(names)), np.nan, order="F")
+    for column, (time, value) in enumerate(zip(times, values)):
+        rows = np.searchsorted(union_time, time)
+        matrix[rows, column] = value
+
+    data = pd.DataFrame(matrix, columns=list(names), copy=False)
+    data.insert(0, "time", union_time)
+    return data
+
+
+def build_narrow_dataframe(times:list, values:list, labels:list, label_column:str="variable"):
+    """
+    Stack every parameter into contiguous time/label/value columns allocated once.
+
+    String labels (parameter names) are stored as a categorical column and integer labels
+    (parameter ids) as the smallest integer dtype that holds them.
+    """
+    if len(labels) == 0:
+        return pd.DataFrame(columns=["time", label_column, "value"])
+
+    lengths = np.fromiter((len(time) for time in times), dtype=np.int64, count=len(times))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    time_column = np.empty(offsets[-1], dtype=float)
+    value_column = np.empty(offsets[-1], dtype=float)
+    for start, stop, time, value in zip(offsets[:-1], offsets[1:], times, values):
+        time_column[start:stop] = time
+        value_column[start:stop] = value
+
+    categories, codes = np.unique(np.asarray(labels), return_inverse=True)
+    codes = np.repeat(codes.astype(np.min_scalar_type(-len(categories))), lengths)
+
+    if np.issubdtype(categories.dtype, np.integer):
+        label = pd.to_numeric(categories, downcast="integer")[codes]
+    else:
+        label = pd.Categorical.from_codes(codes, categories=categories)
+
+    return pd.DataFrame({"time":time_column, label_column:label, "value":value_column}, copy=False)
+
+
+DUPLICATE_POLICIES = ("last", "mean", "prefer_science")
+
+
+def pivot_narrow_dataframe(data:pd.DataFrame, duplicates:str="last", resample:str=None,
+                            label_column:str="variable"):
+    """
+    Wide dataframe (date_time x parameter) of a narrow one, built by scattering the values into a
+    single float matrix from integer row (time bucket) and column (parameter) codes.
+
+    Several values falling in the same cell, repeated timestamps or samples of the same resample
+    bucket, are resolved by duplicates:
+    - "last": the sample with the latest timestamp (input order between equal timestamps)
+    - "mean": the mean of the samples
+    - "prefer_science": the latest science sample, or the latest one when the cell has none
+      (needs the data_type column)
+
+    resample (e.g. "10s", "1min") floors the timestamps to fixed epoch-aligned buckets, so the
+    number of rows is bounded by the time span over the interval.
+    """
+    duplicates = duplicates.replace("-", "_")
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Unknown duplicates policy '{duplicates}'. Use 'last', 'mean' or 'prefer_science'.")
+    if duplicates == "prefer_science" and "data_type" not in data.columns:
+        raise ValueError("The 'prefer_science' policy needs a data_type column.")
+
+    date_time = data.index if data.index.name == "date_time" else pd.DatetimeIndex(data["date_time"])
+    timestamps = np.asarray(date_time, dtype="datetime64[ns]").view(np.int64)
+    # samples are ranked on their own timestamps, not on the floored ones
+    time_sorted = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+    nanoseconds = timestamps
+    if resample:
+        step = pd.to_timedelta(resample).value
+        nanoseconds = timestamps // step * step
+
+    if time_sorted:
+        # narrow frames come sorted by date_time, no need to sort again to find the rows
+        new_row = np.r_[True, nanoseconds[1:] != nanoseconds[:-1]]
+        rows_time, rows = nanoseconds[new_row], np.cumsum(new_row) - 1
+    else:
+        rows_time, rows = np.unique(nanoseconds, return_inverse=True)
+
+    labels = data[label_column]
+    if isinstance(labels.dtype, pd.CategoricalDtype):
+        # only the observed parameters become columns
+        labels = labels.cat.remove_unused_categories()
+        columns, codes = labels.cat.categories, labels.cat.codes.to_numpy()
+        columns = pd.CategoricalIndex(columns, categories=columns, name=label_column)
+    else:
+        columns, codes = np.unique(labels.to_numpy(), return_inverse=True)
+        columns = pd.Index(columns, name=label_column)
+
+    n_rows, n_columns = rows_time.size, len(columns)
+    # column-major cells, so every parameter is a contiguous block of the frame
+    cells = codes.astype(np.int64) * n_rows + rows
+    values = data["value"].to_numpy(dtype=float)
+
+    counts = np.bincount(cells, minlength=n_rows * n_columns)
+    if counts.max(initial=0) <= 1:
+        # one sample per cell: nothing to resolve
+        flat = np.full(n_rows * n_columns, np.nan)
+        flat[cells] = values
+    elif duplicates == "mean":
+        sums = np.bincount(cells, weights=values, minlength=n_rows * n_columns)
+        with np.errstate(invalid="ignore"):
+            flat = sums / counts
+    else:
+        # the sample of highest priority of every cell is the last one of its group once sorted
+        priority = np.arange(cells.size)
+        if not time_sorted:
+            priority = np.argsort(np.argsort(timestamps, kind="stable"), kind="stable")
+        if duplicates == "prefer_science":
+            priority = priority + (data["data_type"].to_numpy() == "science") * cells.size
+        order = np.lexsort((priority, cells))
+        last = order[np.r_[cells[order][1:] != cells[order][:-1], True]]
+
+        flat = np.full(n_rows * n_columns, np.nan)
+        flat[cells[last]] = values[last]
+
+    matrix = flat.reshape(n_columns, n_rows).T
+    return pd.DataFrame(matrix, columns=columns, copy=False,
+                        index=pd.DatetimeIndex(rows_time.view("datetime64[ns]"), name="date_time"))
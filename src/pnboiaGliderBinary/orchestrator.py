@@ -0,0 +1,99 @@
+"""
+PNBoia Glider Binary Data Processor - multi-mission ETL orchestrator
+Author: Thiago Caminha
+version: 0.0.1
+
+Runs the PNBOIAGlider decode -> narrow -> post pipeline for every active mission in glider.missions,
+one mission per worker process.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+import os
+import time
+import traceback
+from pnboiaGliderDataBase.db import GetData
+from pnboiaGliderBinary.etl import PNBOIAGlider
+
+
+SUMMARY_COLUMNS = ["mission_id", "name", "binary_files_path", "status", "rows", "wall_time", "error"]
+
+
+def create_database(pool_size:int=1):
+    """
+    One engine per worker process with a fixed pool, so the orchestrator never holds more than
+    workers x pool_size connections. glider.missions is always read from the server, so a newly
+    activated mission is picked up by the next run.
+    """
+    return GetData(host=os.getenv('PNBOIA_GLIDER_HOST'),
+                    database=os.getenv('PNBOIA_GLIDER_DB'),
+                    user=os.getenv('PNBOIA_GLIDER_USER'),
+                    password=os.getenv('PNBOIA_GLIDER_PSW'),
+                    use_cache=False, engine_options={"pool_size": pool_size, "max_overflow": 0})
+
+
+def get_active_missions(db:GetData, data_root:str):
+    """
+    Missions flagged as active (an 'active' column, or no 'end_date' yet) with the folder holding
+    their binary files: the 'binary_files_path' column when present, otherwise <data_root>/<name>.
+    """
+    missions = db.get(table="glider.missions")
+
+    if "active" in missions.columns:
+        missions = missions[missions["active"].fillna(False).astype(bool)]
+    elif "end_date" in missions.columns:
+        missions = missions[missions["end_date"].isna()]
+
+    if "binary_files_path" in missions.columns:
+        folders = missions["binary_files_path"]
+    else:
+        folders = missions["name"].map(lambda name: os.path.join(data_root, str(name)))
+
+    return [{"mission_id": int(mission_id), "name": name, "binary_files_path": folder}
+            for mission_id, name, folder in zip(missions["mission_id"], missions["name"], folders)]
+
+
+def run_mission(mission:dict, extension:str, post:bool=False, incremental:bool=False):
+    """
+    Worker entry point. Every failure is caught and reported in the summary so one broken mission
+    does not stop the others.
+    """
+    summary = dict(mission, status="ok", rows=0, wall_time=0.0, error=None)
+    start = time.perf_counter()
+
+    db = None
+    try:
+        if not os.path.isdir(mission["binary_files_path"]):
+            raise FileNotFoundError(f"Binary files folder {mission['binary_files_path']} not found.")
+        db = create_database()
+        g = PNBOIAGlider(mission_id=mission["mission_id"], conn=db.conn)
+        summary["rows"] = g.run_etl(binary_files_path=mission["binary_files_path"], extension=extension,
+                                    post=post, incremental=incremental)
+    except Exception:
+        summary["status"] = "error"
+        summary["error"] = traceback.format_exc()
+    finally:
+        if db is not None:
+            db.conn.dispose()
+
+    summary["wall_time"] = time.perf_counter() - start
+    return summary
+
+
+def run_missions(missions:list, extension:str, post:bool=False, incremental:bool=False, workers:int=4):
+    print(f"Running {len(missions)} missions on {workers} workers...")
+    start = time.perf_counter()
+    summaries = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_mission, mission, extension, post, incremental) for mission in missions]
+        for future in as_completed(futures):
+            summary = future.result()
+            print(f"Mission '{summary['name']}' (mission_id = {summary['mission_id']}) finished: "
+                    f"{summary['status']}, {summary['rows']} rows in {summary['wall_time']:.1f}s")
+            summaries.append(summary)
+
+    # explicit columns, so a run without active missions still gives a (empty) summary
+    summaries = pd.DataFrame(summaries, columns=SUMMARY_COLUMNS).sort_values("mission_id")
+    print(f"\nAll missions finished in {time.perf_counter() - start:.1f}s")
+    return summaries
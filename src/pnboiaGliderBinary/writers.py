@@ -0,0 +1,108 @@
+"""
+PNBoia Glider Binary Data Processor - output backends
+Author: Thiago Caminha
+version: 0.0.1
+
+Writers used by GliderDataToCSV to save the narrow and wide dataframes as CSV, Parquet or Arrow IPC (Feather).
+pyarrow is only needed by the Parquet and Feather backends.
+"""
+
+import pandas as pd
+import os
+import shutil
+
+
+class CSVWriter():
+
+    extension = "csv"
+    appendable = True
+
+    def write(self, data:pd.DataFrame, file_path:str, part:int=0):
+        # parts after the first are appended without header
+        data.to_csv(file_path, mode="w" if part == 0 else "a", header=part == 0)
+
+    def read(self, file_path:str):
+        return pd.read_csv(file_path)
+
+
+class ParquetWriter():
+    """
+    Parquet dataset partitioned by day (and by data_type, when the frame has it). Parameter names
+    are written as dictionary-encoded columns.
+    """
+
+    extension = "parquet"
+    appendable = True
+
+    def __init__(self, compression:str="zstd"):
+        self.compression = compression
+
+    def prepare(self, data:pd.DataFrame):
+        data = data.reset_index()
+        data.columns = [str(column) for column in data.columns]
+        for column in ["variable", "data_type"]:
+            if column in data.columns:
+                data[column] = data[column].astype("category")
+        data["date"] = (data["date_time"].dt.normalize().astype("category")
+                        .cat.rename_categories(lambda day: day.strftime("%Y-%m-%d")))
+        return data
+
+    def write(self, data:pd.DataFrame, file_path:str, part:int=0):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        data = self.prepare(data)
+        partition_cols = ["date"] + (["data_type"] if "data_type" in data.columns else [])
+
+        # the first part of a run replaces the previous partitions, later parts are added next to it
+        if part == 0 and os.path.isdir(file_path):
+            shutil.rmtree(file_path)
+
+        # hive layout (date=.../data_type=.../part-<n>.parquet), readable back with pd.read_parquet
+        for keys, partition in data.groupby(partition_cols, observed=True):
+            keys = keys if isinstance(keys, tuple) else (keys,)
+            partition_path = os.path.join(file_path, *[f"{column}={key}" for column, key in zip(partition_cols, keys)])
+            os.makedirs(partition_path, exist_ok=True)
+            table = pa.Table.from_pandas(partition.drop(columns=partition_cols), preserve_index=False)
+            pq.write_table(table, os.path.join(partition_path, f"part-{part}.parquet"), compression=self.compression)
+
+    def read(self, file_path:str):
+        return pd.read_parquet(file_path)
+
+
+class FeatherWriter():
+    """
+    Single Arrow IPC file, fastest to read back whole.
+    """
+
+    extension = "feather"
+    appendable = False
+
+    def __init__(self, compression:str="zstd"):
+        self.compression = compression
+
+    def write(self, data:pd.DataFrame, file_path:str, part:int=0):
+        if part > 0:
+            raise ValueError("Feather files cannot be appended to. Use the csv or parquet output for windowed runs.")
+        data = data.reset_index()
+        data.columns = [str(column) for column in data.columns]
+        for column in ["variable", "data_type"]:
+            if column in data.columns:
+                data[column] = data[column].astype("category")
+        data.to_feather(file_path, compression=self.compression)
+
+    def read(self, file_path:str):
+        return pd.read_feather(file_path)
+
+
+WRITERS = {
+    "csv": CSVWriter,
+    "parquet": ParquetWriter,
+    "feather": FeatherWriter,
+}
+
+
+def get_writer(output_format:str="csv"):
+    if output_format not in WRITERS:
+        raise ValueError(f"Unknown output format '{output_format}'. Use one of {list(WRITERS)}.")
+    return WRITERS[output_format]()
@@ -1,80 +1,189 @@
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import pandas as pd
 from dotenv import load_dotenv
 from urllib.parse import quote
+import io
+import time
+import warnings
+from pnboiaGliderDataBase.query import QueryBuilder, ReferenceCache
 
 class GetData():
 
     load_dotenv()
 
-    def __init__(self, host=None, database=None, user=None, password=None, conn=None):
+    def __init__(self, host=None, database=None, user=None, password=None, conn=None,
+                    use_cache=False, cache_dir=None, cache_ttl=None, engine_options=None):
 
         self._host = host
         self._db = database
         self._user = user
         self._psw = password
+        self._engine_options = engine_options or {}
 
         if conn:
             self.conn = conn
         else:
             self.conn = self.engine_create()
 
+        self.queries = QueryBuilder()
+        self.reference_cache = ReferenceCache(cache_dir=cache_dir, ttl=cache_ttl) if use_cache else None
+
     def get(self, table=None, limit=None, join="", start_date=None, end_date=None, last=None, query=None, **kwargs):
 
-        if not query:
-            query = f"SELECT * FROM {table}{join} WHERE true"
+        if query:
+            return pd.read_sql(query, self.conn)
 
-            if start_date:
-                query += f" AND date_time >= '{start_date}'"
-            if end_date:
-                query += f" AND date_time <= '{end_date}'"
-            if kwargs:
-                query = self.create_query(query, kwargs)
-            if limit:
-                query += f" LIMIT {limit}"
-            if last:
-                query += " ORDER BY date_time DESC LIMIT 1"
+        statement, params = self.queries.select(table=table, join=join, start_date=start_date, end_date=end_date,
+                                                limit=limit, last=last, filters=kwargs)
+        print(statement, params)
 
-            print(query)
+        if self.reference_cache and table in self.reference_cache.tables:
+            return self.reference_cache.read(conn=self.conn, table=table, statement=statement, params=params)
 
-        df = pd.read_sql(query, self.conn)
+        df = pd.read_sql(statement, self.conn, params=params)
 
         return df
 
-    def post(self, table, schema, data, overwrite=False,**kwargs):
-        if kwargs:
-            query = ""
-            query = self.create_query(query, kwargs)
-            if overwrite:
-                self.delete(table=table, schema=schema, query=query)
+    def stream(self, table=None, chunksize=50000, output="pandas", join="", start_date=None, end_date=None,
+                limit=None, query=None, **kwargs):
+        """
+        Same filters as get(), but the rows are read through a server-side cursor and yielded as
+        DataFrames (output="pandas") or Arrow record batches (output="arrow") of chunksize rows,
+        so memory use does not grow with the size of the result.
+        """
+        if output not in ("pandas", "arrow"):
+            raise ValueError(f"Unknown output '{output}'. Use 'pandas' or 'arrow'.")
+        if output == "arrow":
+            import pyarrow as pa
+
+        if query:
+            statement, params = text(query), {}
+        else:
+            statement, params = self.queries.select(table=table, join=join, start_date=start_date, end_date=end_date,
+                                                    limit=limit, filters=kwargs)
+        print(statement, params)
+
+        owned = hasattr(self.conn, "raw_connection")
+        connection = self.conn.connect() if owned else self.conn
+        try:
+            connection = connection.execution_options(stream_results=True)
+            for chunk in pd.read_sql(statement, connection, params=params, chunksize=chunksize):
+                if output == "arrow":
+                    yield pa.RecordBatch.from_pandas(chunk, preserve_index=False)
+                else:
+                    yield chunk
+        finally:
+            if owned:
+                connection.close()
+
+    def post(self, table, schema, data, overwrite=False, method="copy", chunksize=100000, **kwargs):
+        if method not in ("copy", "insert"):
+            raise ValueError(f"Unknown post method '{method}'. Use 'copy' or 'insert'.")
+
+        delete = None
+        if kwargs and overwrite:
+            delete = self.queries.delete(table=table, schema=schema, filters=kwargs)
+
+        if method == "copy":
+            # the DELETE runs in the COPY transaction, so a failed COPY keeps the old rows
+            self.copy(table=table, schema=schema, data=data, chunksize=chunksize, delete=delete)
+        elif self.owns_connection():
+            with self.conn.begin() as connection:
+                if delete:
+                    connection.execute(*delete)
+                data.to_sql(con=connection, name=table, schema=schema, if_exists='append', index=False)
+        else:
+            if delete:
+                self.conn.execute(*delete)
+            data.to_sql(con=self.conn, name=table, schema=schema, if_exists='append', index=False)
 
-        data.to_sql(con=self.conn, name=table, schema=schema, if_exists='append', index=False)
         print(f'{data.shape[0]} rows inserted in table {schema}.{table}')
         print(f'({str(data.date_time.iloc[0])} to {str(data.date_time.iloc[-1])})')
 
-    def delete(self, table, schema, query):
-
-        query = f"DELETE FROM {schema}.{table} WHERE true {query}"
-        self.conn.execute(query)
-        print(f"deleted data using query {query}")
-
-    def create_query(self, query, kwargs):
-        for key, value in kwargs.items():
-            if type(value[1]) == list:
-                if len(value[1]) == 1:
-                    query += f" AND {key} {value[0]} ('{value[1][0]}')"
-                else:
-                    query += f" AND {key} {value[0]} {tuple(value[1])}"
-            else:
-                query += f" AND {key} {value[0]} '{value[1]}'"
-
-        return query
+    def copy(self, table, schema, data, chunksize=100000, connection=None, delete=None):
+        """
+        Stream the dataframe into the table with COPY ... FROM STDIN, one CSV buffer per chunk,
+        inside a single transaction, after the optional delete (statement, params) from
+        QueryBuilder.delete. Any DBAPI connection whose cursors implement copy_expert
+        (psycopg2 or a stand-in) can be passed as connection.
+        """
+        columns = ", ".join(f'"{column}"' for column in data.columns)
+        statement = f"COPY {schema}.{table} ({columns}) FROM STDIN WITH (FORMAT csv)"
+
+        # only connections opened here from an engine are closed, never the caller's own
+        owned = connection is None and self.owns_connection()
+        if connection is None:
+            connection = self.raw_connection()
+
+        start = time.perf_counter()
+        try:
+            cursor = connection.cursor()
+            if delete:
+                cursor.execute(*self.compile_statement(*delete))
+            for first_row in range(0, data.shape[0], chunksize):
+                buffer = io.StringIO()
+                data.iloc[first_row:first_row + chunksize].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+            cursor.close()
+            connection.commit()
+            if delete:
+                print(f"deleted data using query {delete[0]} {delete[1]}")
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            if owned:
+                connection.close()
+
+        elapsed = time.perf_counter() - start
+        print(f'COPY of {data.shape[0]} rows into {schema}.{table} took {elapsed:.2f}s '
+                f'({data.shape[0] / max(elapsed, 1e-9):.0f} rows/s)')
+        return data.shape[0]
+
+    def owns_connection(self):
+        # an Engine hands out new connections, a Connection belongs to the caller
+        return hasattr(self.conn, "raw_connection")
+
+    def raw_connection(self):
+        if self.owns_connection():
+            return self.conn.raw_connection()
+        return self.conn.connection
+
+    def compile_statement(self, statement, params:dict):
+        """
+        SQL string and parameters of a QueryBuilder statement in the DBAPI paramstyle of the
+        connection, for statements executed on a raw cursor.
+        """
+        compiled = statement.bindparams(**params).compile(dialect=self.conn.dialect,
+                                                            compile_kwargs={"render_postcompile": True})
+        if compiled.positional:
+            return compiled.string, tuple(compiled.params[name] for name in compiled.positiontup)
+        return compiled.string, compiled.params
+
+    def delete(self, table, schema, query=None, **kwargs):
+        """
+        Delete the rows matching the same keyword filters as get(). The former query argument, a raw
+        ' AND column = value' SQL fragment, is still accepted but deprecated.
+        """
+        if query is not None:
+            warnings.warn("GetData.delete(query=...) is deprecated, pass the filters as keyword arguments "
+                            "(e.g. mission_id=['=', 1]).", DeprecationWarning, stacklevel=2)
+            statement = f"DELETE FROM {self.queries.check_identifier(schema)}.{self.queries.check_identifier(table)} WHERE true {query}"
+            self.conn.execute(text(statement))
+            print(f"deleted data using query {statement}")
+            return
+
+        statement, params = self.queries.delete(table=table, schema=schema, filters=kwargs)
+        self.conn.execute(statement, params)
+        print(f"deleted data using query {statement} {params}")
 
     def engine_create(self):
 
         password = quote(self._psw)
 
-        engine = create_engine(f"postgresql+psycopg2://{self._user}:{password}@{self._host}/{self._db}")
+        engine = create_engine(f"postgresql+psycopg2://{self._user}:{password}@{self._host}/{self._db}",
+                                **self._engine_options)
 
         return engine
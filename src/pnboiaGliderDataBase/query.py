@@ -0,0 +1,190 @@
+from sqlalchemy import text, bindparam
+import pandas as pd
+import hashlib
+import pickle
+import time
+import re
+import os
+
+
+class QueryBuilder():
+    """
+    Builds the SELECT/DELETE statements used by GetData with bound parameters instead of
+    formatted literals, so the statement text only depends on the shape of the query.
+    Compiled text() constructs are kept per builder (one per GetData session) and reused.
+    """
+
+    identifier_pattern = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$")
+    # ' [LEFT|RIGHT|INNER|FULL] JOIN table [alias] ON column = column [AND column = column ...]' or '... USING (columns)'
+    join_pattern = re.compile(
+        r"^(\s+(LEFT|RIGHT|INNER|FULL)?\s*JOIN\s+[A-Za-z_][\w.]*(\s+[A-Za-z_]\w*)?\s+"
+        r"(ON\s+[A-Za-z_][\w.]*\s*=\s*[A-Za-z_][\w.]*(\s+AND\s+[A-Za-z_][\w.]*\s*=\s*[A-Za-z_][\w.]*)*"
+        r"|USING\s*\(\s*[A-Za-z_]\w*(\s*,\s*[A-Za-z_]\w*)*\s*\)))*$",
+        re.IGNORECASE)
+    operators = ("=", "!=", "<>", "<", "<=", ">", ">=", "in", "not in", "like", "ilike", "is", "is not")
+
+    def __init__(self):
+        self._statements = {}
+
+    def check_identifier(self, name:str):
+        if not self.identifier_pattern.match(name):
+            raise ValueError(f"Invalid table or column name '{name}'.")
+        return name
+
+    def check_join(self, join:str):
+        if not self.join_pattern.match(join):
+            raise ValueError(f"Invalid join '{join}'. Use ' JOIN table ON column = column' or ' JOIN table USING (column)'.")
+        return join
+
+    def check_operator(self, operator:str):
+        if operator.lower() not in self.operators:
+            raise ValueError(f"Invalid operator '{operator}'. Use one of {self.operators}.")
+        return operator
+
+    def statement(self, sql:str, expanding:tuple=()):
+        key = (sql, expanding)
+        if key not in self._statements:
+            statement = text(sql)
+            if expanding:
+                statement = statement.bindparams(*[bindparam(name, expanding=True) for name in expanding])
+            self._statements[key] = statement
+        return self._statements[key]
+
+    def where(self, filters:dict):
+        """
+        Turn GetData's {column: [operator, value]} filters into ' AND column operator :column_n'
+        clauses. List values are bound as expanding parameters, e.g. IN (...).
+        """
+        sql = ""
+        params = {}
+        expanding = []
+        for index, (column, (operator, value)) in enumerate(filters.items()):
+            name = f"{column}_{index}"
+            sql += f" AND {self.check_identifier(column)} {self.check_operator(operator)} :{name}"
+            if type(value) == list:
+                params[name] = [self.python_value(item) for item in value]
+                expanding.append(name)
+            else:
+                params[name] = self.python_value(value)
+        return sql, params, tuple(expanding)
+
+    def select(self, table:str, join:str="", start_date=None, end_date=None, limit=None, last=None, filters:dict=None):
+        sql = f"SELECT * FROM {self.check_identifier(table)}{self.check_join(join)} WHERE true"
+        params = {}
+        expanding = ()
+
+        if start_date:
+            sql += " AND date_time >= :start_date"
+            params["start_date"] = start_date
+        if end_date:
+            sql += " AND date_time <= :end_date"
+            params["end_date"] = end_date
+        if filters:
+            where, where_params, expanding = self.where(filters)
+            sql += where
+            params.update(where_params)
+        if limit:
+            sql += " LIMIT :limit"
+            params["limit"] = int(limit)
+        if last:
+            sql += " ORDER BY date_time DESC LIMIT 1"
+
+        return self.statement(sql, expanding), params
+
+    def delete(self, table:str, schema:str, filters:dict=None):
+        sql = f"DELETE FROM {self.check_identifier(schema)}.{self.check_identifier(table)} WHERE true"
+        params = {}
+        expanding = ()
+        if filters:
+            where, params, expanding = self.where(filters)
+            sql += where
+        return self.statement(sql, expanding), params
+
+    def python_value(self, value):
+        # numpy scalars (e.g. mission_info.mission_id.values[0]) are not adaptable by psycopg2
+        if hasattr(value, "item"):
+            return value.item()
+        return value
+
+
+class ReferenceCache():
+    """
+    Local on-disk cache for small reference tables (data.parameters, glider.missions).
+
+    Entries are keyed on the server (host, port, database, user) and the statement. An entry younger
+    than ttl seconds (PNBOIA_GLIDER_REFERENCE_CACHE_TTL, 6 hours by default, longer than the ETL cron
+    interval) is returned without touching the database. An older one is revalidated with the row
+    count and the largest key of the table, like an ETag, and is only downloaded again when they
+    changed. As in-place updates keep both, entries are downloaded again anyway after max_age seconds.
+    """
+
+    # reference table: key column of its fingerprint
+    tables = {"data.parameters": "id", "glider.missions": "mission_id"}
+
+    def __init__(self, cache_dir:str=None, ttl:float=None, max_age:float=86400, tables:dict=None):
+        if cache_dir is None:
+            cache_dir = os.getenv("PNBOIA_GLIDER_CACHE_DIR",
+                                    os.path.join(os.path.expanduser("~"), ".cache", "pnboia_glider"))
+        if ttl is None:
+            ttl = float(os.getenv("PNBOIA_GLIDER_REFERENCE_CACHE_TTL", 6 * 3600))
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_age = max_age
+        if tables is not None:
+            self.tables = tables
+
+    def compose_server_key(self, conn):
+        url = conn.engine.url
+        return f"{url.host}|{url.port}|{url.database}|{url.username}"
+
+    def compose_cache_path(self, statement, params:dict, server:str=""):
+        key = hashlib.sha1(f"{server}|{statement}|{sorted(params.items())}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def fingerprint(self, conn, table:str):
+        """
+        'rows:largest key' of the table, an index-only read instead of the whole table.
+        """
+        statement = text(f"SELECT count(*) AS n_rows, max({self.tables[table]}) AS last_key FROM {table}")
+        fingerprint = pd.read_sql(statement, conn).iloc[0]
+        return f"{fingerprint.n_rows}:{fingerprint.last_key}"
+
+    def load(self, cache_path:str):
+        if not os.path.exists(cache_path):
+            return None
+        with open(cache_path, "rb") as file:
+            return pickle.load(file)
+
+    def save(self, cache_path:str, entry:dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump(entry, file)
+        os.replace(temporary_path, cache_path)
+
+    def read(self, conn, table:str, statement, params:dict):
+        cache_path = self.compose_cache_path(statement, params, server=self.compose_server_key(conn))
+        entry = self.load(cache_path)
+
+        if entry is not None and time.time() - entry.get("validated_at", entry["fetched_at"]) < self.ttl:
+            print(f"Using cached {table}")
+            return entry["data"].copy()
+
+        fingerprint = self.fingerprint(conn, table)
+        if entry is not None and entry["fingerprint"] == fingerprint \
+                and time.time() - entry["fetched_at"] < self.max_age:
+            print(f"Using cached {table} (unchanged)")
+            entry["validated_at"] = time.time()
+            self.save(cache_path, entry)
+            return entry["data"].copy()
+
+        data = pd.read_sql(statement, conn, params=params)
+        self.save(cache_path, {"fetched_at": time.time(), "validated_at": time.time(),
+                                "fingerprint": fingerprint, "data": data})
+        return data.copy()
+
+    def clear(self):
+        if os.path.exists(self.cache_dir):
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, file_name))
@@ -0,0 +1,220 @@
+"""
+PNBoia Glider DataBase - data.data storage layout
+Author: Thiago Caminha
+version: 0.0.1
+
+data.data is partitioned by mission (LIST on mission_id) and each mission by month (RANGE on
+date_time), with composite indexes declared on the parent so every partition inherits them:
+
+    data.data
+    ├── data.data_mission_<id>
+    │   ├── data.data_mission_<id>_<yyyy>_<mm>
+    │   └── data.data_mission_<id>_default
+    └── data.data_default
+
+Rows of a mission or month without a partition land in a default partition; maintain() moves them
+into their own partition. Reads and writes keep going through data.data, so GetData is unchanged.
+"""
+
+from sqlalchemy import text
+import pandas as pd
+
+
+class DataSchema():
+
+    def __init__(self, conn, schema:str="data", table:str="data"):
+        # sqlalchemy engine or connection (GetData.conn)
+        self.conn = conn
+        self.schema = schema
+        self.table = table
+
+    @property
+    def parent(self):
+        return f"{self.schema}.{self.table}"
+
+    def compose_mission_partition(self, mission_id:int):
+        return f"{self.parent}_mission_{int(mission_id)}"
+
+    def compose_month_partition(self, mission_id:int, month:pd.Timestamp):
+        return f"{self.compose_mission_partition(mission_id)}_{month.year:04d}_{month.month:02d}"
+
+    def execute(self, connection, statement:str, **params):
+        return connection.execute(text(statement), params)
+
+    def exists(self, connection, relation:str):
+        return self.execute(connection, "SELECT to_regclass(:relation) IS NOT NULL", relation=relation).scalar()
+
+    def is_partitioned(self, connection):
+        return self.execute(connection,
+                            "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:relation))",
+                            relation=self.parent).scalar()
+
+    def create_parent(self, connection, like:str=None):
+        columns = f"(LIKE {like} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)" if like else \
+            "(mission_id integer NOT NULL, parameter_id integer NOT NULL, date_time timestamp NOT NULL, value double precision)"
+        self.execute(connection, f"CREATE TABLE {self.parent} {columns} PARTITION BY LIST (mission_id)")
+        self.execute(connection, f"CREATE TABLE {self.parent}_default PARTITION OF {self.parent} DEFAULT")
+        self.create_indexes(connection)
+
+    def get_owned_sequences(self, connection, relation:str):
+        """
+        {column: sequence} of the serial columns of relation.
+        """
+        rows = self.execute(connection, "SELECT attname, pg_get_serial_sequence(:relation, attname) FROM pg_attribute "
+                                        "WHERE attrelid = to_regclass(:relation) AND attnum > 0 AND NOT attisdropped",
+                                        relation=relation)
+        return {column: sequence for column, sequence in rows.all() if sequence}
+
+    def replace_sequences(self, connection, legacy:str):
+        """
+        Give the serial columns copied from legacy a sequence of their own. LIKE ... INCLUDING DEFAULTS
+        keeps them drawing from the sequences of legacy, which could then not be dropped without CASCADE.
+        Returns {column: sequence} of the new sequences.
+        """
+        sequences = {}
+        for column, legacy_sequence in self.get_owned_sequences(connection, legacy).items():
+            data_type = self.execute(connection, "SELECT format_type(seqtypid, NULL) FROM pg_sequence "
+                                                    "WHERE seqrelid = to_regclass(:sequence)",
+                                                    sequence=legacy_sequence).scalar()
+            # the legacy sequence keeps its table, under a name that frees the default one
+            self.execute(connection, f"ALTER SEQUENCE {legacy_sequence} RENAME TO {self.table}_legacy_{column}_seq")
+            sequence = f"{self.parent}_{column}_seq"
+            self.execute(connection, f"CREATE SEQUENCE {sequence} AS {data_type} OWNED BY {self.parent}.{column}")
+            self.execute(connection, f"ALTER TABLE {self.parent} ALTER COLUMN {column} SET DEFAULT nextval('{sequence}')")
+            sequences[column] = sequence
+        return sequences
+
+    def create_indexes(self, connection):
+        # (mission_id, parameter_id, date_time) for parameter/date range reads,
+        # (mission_id, date_time) for the last timestamp of a mission
+        self.execute(connection, f"CREATE INDEX IF NOT EXISTS {self.table}_mission_parameter_time_idx "
+                                    f"ON {self.parent} (mission_id, parameter_id, date_time)")
+        self.execute(connection, f"CREATE INDEX IF NOT EXISTS {self.table}_mission_time_idx "
+                                    f"ON {self.parent} (mission_id, date_time)")
+
+    def move_rows(self, connection, source:str, condition:str, create_partitions:list, **params):
+        """
+        Take the rows matching condition out of a default partition, create the partition they belong
+        to and put them back through the parent. Postgres refuses to create a partition while its rows
+        are still in the default one.
+        """
+        self.execute(connection, f"CREATE TEMP TABLE moving_rows (LIKE {self.parent}) ON COMMIT DROP")
+        self.execute(connection, f"WITH moved AS (DELETE FROM {source} WHERE {condition} RETURNING *) "
+                                    f"INSERT INTO moving_rows SELECT * FROM moved", **params)
+        for statement in create_partitions:
+            self.execute(connection, statement)
+        moved = self.execute(connection, f"INSERT INTO {self.parent} SELECT * FROM moving_rows").rowcount
+        self.execute(connection, "DROP TABLE moving_rows")
+        return moved
+
+    def create_mission_partition(self, connection, mission_id:int):
+        partition = self.compose_mission_partition(mission_id)
+        if self.exists(connection, partition):
+            return False
+
+        statements = [f"CREATE TABLE {partition} PARTITION OF {self.parent} FOR VALUES IN ({int(mission_id)}) "
+                        f"PARTITION BY RANGE (date_time)",
+                        f"CREATE TABLE {partition}_default PARTITION OF {partition} DEFAULT"]
+        moved = self.move_rows(connection, source=f"{self.parent}_default", condition="mission_id = :mission_id",
+                                create_partitions=statements, mission_id=int(mission_id))
+        print(f"Created partition {partition} ({moved} rows moved from {self.parent}_default)")
+        return True
+
+    def create_month_partition(self, connection, mission_id:int, month:pd.Timestamp):
+        month = pd.Timestamp(month).to_period("M").to_timestamp()
+        partition = self.compose_month_partition(mission_id, month)
+        if self.exists(connection, partition):
+            return False
+
+        start, end = month, month + pd.offsets.MonthBegin(1)
+        mission_partition = self.compose_mission_partition(mission_id)
+        statement = (f"CREATE TABLE {partition} PARTITION OF {mission_partition} "
+                        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')")
+        moved = self.move_rows(connection, source=f"{mission_partition}_default",
+                                condition="date_time >= :start AND date_time < :end",
+                                create_partitions=[statement], start=start.to_pydatetime(), end=end.to_pydatetime())
+        print(f"Created partition {partition} ({moved} rows moved from {mission_partition}_default)")
+        return True
+
+    def migrate(self, drop_legacy:bool=False):
+        """
+        Create the partitioned data.data, or convert a plain data.data into it: the old table is renamed
+        to <table>_legacy, its rows are copied into the new layout and maintain() creates their partitions.
+        Serial columns get new sequences, so <table>_legacy can be dropped on its own later.
+        """
+        with self.conn.begin() as connection:
+            if self.exists(connection, self.parent) and self.is_partitioned(connection):
+                print(f"{self.parent} is already partitioned")
+                self.create_indexes(connection)
+                return
+
+            legacy = None
+            if self.exists(connection, self.parent):
+                legacy = f"{self.parent}_legacy"
+                print(f"Renaming {self.parent} to {legacy}")
+                self.execute(connection, f"ALTER TABLE {self.parent} RENAME TO {self.table}_legacy")
+
+            print(f"Creating partitioned table {self.parent}")
+            self.create_parent(connection, like=legacy)
+            sequences = self.replace_sequences(connection, legacy=legacy) if legacy else {}
+
+            if legacy:
+                # partitions first, so the rows go straight to them instead of through the defaults
+                months = self.execute(connection, f"SELECT DISTINCT mission_id, date_trunc('month', date_time) "
+                                                    f"FROM {legacy} WHERE mission_id IS NOT NULL AND date_time IS NOT NULL")
+                for mission_id, month in months.all():
+                    self.create_mission_partition(connection, mission_id)
+                    self.create_month_partition(connection, mission_id, month)
+
+                rows = self.execute(connection, f"INSERT INTO {self.parent} SELECT * FROM {legacy}").rowcount
+                print(f"{rows} rows copied from {legacy}")
+                # new rows carry on after the copied ones
+                for column, sequence in sequences.items():
+                    self.execute(connection, f"SELECT setval('{sequence}', COALESCE(max({column}), 0) + 1, false) "
+                                                f"FROM {self.parent}")
+                if drop_legacy:
+                    self.execute(connection, f"DROP TABLE {legacy}")
+
+        self.maintain()
+
+    def maintain(self, mission_ids:list=None, months_ahead:int=1):
+        """
+        Create the partitions of the active missions (or of mission_ids) for the current month and the
+        next months_ahead, and the partitions of every mission and month with rows in a default partition.
+        """
+        with self.conn.begin() as connection:
+            if mission_ids is None:
+                mission_ids = self.get_active_mission_ids(connection)
+            # rows of missions without a partition yet
+            stray_mission_ids = self.execute(connection, f"SELECT DISTINCT mission_id FROM {self.parent}_default "
+                                                            f"WHERE mission_id IS NOT NULL").scalars().all()
+
+            current_month = pd.Timestamp.now().to_period("M").to_timestamp()
+            upcoming_months = [current_month + pd.offsets.MonthBegin(months) for months in range(months_ahead + 1)]
+
+            created = 0
+            for mission_id in sorted(set(mission_ids) | set(stray_mission_ids)):
+                created += self.create_mission_partition(connection, mission_id)
+                months = set(pd.to_datetime(self.execute(connection,
+                                        f"SELECT DISTINCT date_trunc('month', date_time) FROM "
+                                        f"{self.compose_mission_partition(mission_id)}_default "
+                                        f"WHERE date_time IS NOT NULL").scalars().all()))
+                if mission_id in mission_ids:
+                    months |= set(upcoming_months)
+                for month in sorted(months):
+                    created += self.create_month_partition(connection, mission_id, month)
+
+        print(f"{created} partitions created")
+        return created
+
+    def get_active_mission_ids(self, connection):
+        """
+        Missions flagged as active (an 'active' column, or no 'end_date' yet), the ones that get
+        partitions ahead of their data.
+        """
+        missions = pd.read_sql(text("SELECT * FROM glider.missions"), connection)
+        if "active" in missions.columns:
+            missions = missions[missions["active"].fillna(False).astype(bool)]
+        elif "end_date" in missions.columns:
+            missions = missions[missions["end_date"].isna()]
+        return [int(mission_id) for mission_id in missions["mission_id"]]
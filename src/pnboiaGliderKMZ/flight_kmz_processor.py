@@ -3,13 +3,20 @@ import numpy as np
 
 import folium
 from folium.plugins import MeasureControl
+from folium.utilities import JsCode
 
 import glob
 import zipfile
 from bs4 import BeautifulSoup
+from pnboiaGliderKMZ.kml_stream import KMLStreamParser
+from pnboiaGliderKMZ.layers import LayerHandler, LAYERS
+from pnboiaGliderKMZ.store import LayerStore, StoredLayers
+from pnboiaGliderProfiling.profiler import StageProfiler, profiled_stage, create_profiler
 import re
 import os
 import sys
+import json
+import hashlib
 
 import webbrowser
 
@@ -18,76 +25,79 @@ warnings.filterwarnings("ignore")
 
 
 class KMZParser:
-    def __init__(self, folder_path:str):
+
+    # incremental runs read the stored layers back only when one of these is used
+    surfacings_coords_df = property(lambda self: self.layers["Surfacings"])
+    surface_movements_coords_df = property(lambda self: self.layers["Surface Movements"])
+    glider_track_coords_df = property(lambda self: self.layers["Glider Tracks"])
+    depth_current_avg_coords_df = property(lambda self: self.layers["Depth Averaged Current Vectors"])
+    planned_waypoints_coords_df = property(lambda self: self.layers["Planned Waypoints"])
+
+    def __init__(self, folder_path:str, backend:str="lxml", build_map:bool=True,
+                    incremental:bool=False, output_path:str="data/", output_format:str="csv",
+                    renderer:str="geojson", canvas:bool=False, profiler:StageProfiler=None):
 
         # file handling
         self.output_interactive_map_html_file_name = "flight_map.html"
+        self.map_manifest_file_name = ".flight_map_manifest.json"
+        self.science_plot_manifest_file_name = "glider_sci_data_timeseries.json"
         self.output_surfacings_csv_file_name = "surfacings.csv"
         self.output_surface_movements_csv_file_name = "surface_movements.csv"
         self.output_glider_tracks_csv_file_name = "glider_tracks.csv"
         self.output_depth_curr_csv_file_name = "depth_avg_currents.csv"
         self.output_planned_waypoints_csv_file_name = "planned_waypoints.csv"
 
+        self.profiler = profiler
+
 
 
         self.kmz_file_name = self.grab_kmz_file(folder_path=folder_path)
 
         self.kml = self.convert_to_kml(filepath=self.kmz_file_name)
-        self.soup = self.parse_kml_as_soup(kml=self.kml)
-        self.folders = self.parse_folders(soup=self.soup)
-        self.folders_names = self.parse_all_folders_names(folders=self.folders)
-
-        # strings handling
-        self._gps_time_string_pattern = r"Time of GPS Position: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})"
-        self._glider_track_range_string_pattern = r"Range: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+.*?Speed: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+ @ (\d)"
-        self._depth_current_avg_string_pattern = r"Speed: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+ @ (\d)"
-
-
-        # surfacings coords
-        self.surfacings_coords = self.parse_surfacings_coordinates(folders=self.folders)
-        self.surfacings_coords_cols_names = ["folder_name", "gps_date_time", "longitude", "latitude" ]
-        self.surfacings_coords_df = self.generate_coordinates_dataframe(coordinates=self.surfacings_coords, columns_names=self.surfacings_coords_cols_names)
-
-        # surface movements coords
-        self.surface_movements_coords_cols_names = ["folder_name", "gps_date_time", "longitude", "latitude" ]
-        self.surface_movements_coords = self.parse_surface_movements_coordinates(folders=self.folders)
-        self.surface_movements_coords_df = self.generate_coordinates_dataframe(coordinates=self.surface_movements_coords,
-                                                                    columns_names=self.surface_movements_coords_cols_names)
-
-        # glider track
-        self.glider_track_coords_cols_names = ["folder_name", "range", "speed", "degree","start_longitude", "start_latitude", "end_longitude", "end_latitude"]
-        self.glider_track_coords = self.parse_glider_tracks_coordinates(folders=self.folders)
-        self.glider_track_coords_df = self.generate_coordinates_dataframe(coordinates=self.glider_track_coords,
-                                                                    columns_names=self.glider_track_coords_cols_names)
-
-
-        # depth current avg vectors
-        self.depth_current_avg_coords_cols_names = ["folder_name", "speed", "degree","start_longitude", "start_latitude", "end_longitude", "end_latitude"]
-        self.depth_current_avg_coords = self.parse_depth_current_coordinates(folders=self.folders)
-        self.depth_current_avg_coords_df = self.generate_coordinates_dataframe(coordinates=self.depth_current_avg_coords,
-                                                                    columns_names=self.depth_current_avg_coords_cols_names)
 
-        # # planned waypoints coords
-        # self.planned_waypoints_coords_cols_names = ["folder_name", "longitude", "latitude" ]
-        # self.planned_waypoints_coords = self.parse_planned_waypoints(folders=self.folders)
-        # self.planned_waypoints_coords_df = self.generate_coordinates_dataframe(coordinates=self.surface_movements_coords,
-        #                                                             columns_names=self.surface_movements_coords_cols_names)
+        if backend not in ["lxml", "soup"]:
+            raise ValueError(f"Unknown backend '{backend}'. Use 'lxml' or 'soup'.")
+        self.backend = backend
 
+        # every folder in the LAYERS registry, filled in one walk over the kml
+        if incremental:
+            self.layers, layer_hashes = self.update_layers(kml=self.kml, output_path=output_path,
+                                                            output_format=output_format)
+        else:
+            self.layers = self.parse_layers(kml=self.kml)
+            layer_hashes = None
 
         # interactive map
+        if not build_map:
+            return
+
+        # rebuilt only when the layers, the science plot or the rendering options changed
+        if layer_hashes is None:
+            layer_hashes = {folder_name: self.hash_layer(data=data) for folder_name, data in self.layers.items()}
+        map_hash = self.compute_map_hash(layer_hashes=layer_hashes, renderer=renderer, canvas=canvas)
+        if self.is_map_up_to_date(map_hash=map_hash):
+            print(f"Interactive map {self.output_interactive_map_html_file_name} is up to date")
+            self.delete_stale_science_plots()
+            return
+
         self.interactive_map = self.plot_map(surfacings_data=self.surfacings_coords_df,
                 surface_movements_data=self.surface_movements_coords_df,
                 glider_tracks_data=self.glider_track_coords_df,
-                depth_avg_currents_data=self.depth_current_avg_coords_df)
+                depth_avg_currents_data=self.depth_current_avg_coords_df,
+                renderer=renderer,
+                canvas=canvas)
                 # planned_waypoints=self.planned_waypoints_coords_df)
 
         self.save_map_as_html(map=self.interactive_map, file_name=self.output_interactive_map_html_file_name)
+        self.save_map_manifest(map_hash=map_hash, science_plot_file_name=self.science_plot_file_name)
+        self.delete_stale_science_plots()
 
     def grab_kmz_file(self, folder_path:str):
         folder_path = os.path.join(folder_path, "*.kmz")
         files = glob.glob(folder_path, recursive=False)
         return files[0]
 
+    @profiled_stage("unzip")
     def convert_to_kml(self, filepath:str):
         print("Converting file to kml...")
         with zipfile.ZipFile(filepath, 'r') as kmz:
@@ -103,22 +113,7 @@ class KMZParser:
 
     def parse_all_folders_names(self, folders):
         print("Extracting all folders names...")
-        folders_names = []
-        for folder in self.folders:
-            folders_names.append(folder.find("name").text)
-        return folders_names
-
-    def get_folder_index(self, folder_name:str):
-        return self.folders_names.index(folder_name)
-
-    def generate_coordinates_dataframe(self, coordinates:list, columns_names:list):
-        return pd.DataFrame(columns=columns_names, data=coordinates)
-
-    def parse_find_all(self, folder, child_name:str):
-        parsed = folder.find_all(child_name)
-        if not parsed:
-            raise ValueError(f"No matches for {child_name} found. Aborting parsing.")
-        return parsed
+        return [folder.find("name").text for folder in folders]
 
     def parse_find(self, parent, child_name:str):
         parsed = parent.find(child_name)
@@ -126,155 +121,166 @@ class KMZParser:
             raise ValueError(f"No matches for {child_name} found. Aborting parsing.")
         return parsed
 
-    def parse_surfacings_coordinates(self, folders, folder_name:str="Surfacings"):
-        print(f"Parsing {folder_name} folder...")
-        index = self.get_folder_index(folder_name=folder_name)
-        folder_name = self.folders_names[index]
-        folder = self.folders[index]
-
-        coordinates = []
-
-        placemarks = self.parse_find_all(folder=folder, child_name="placemark")
-
-        for placemark in placemarks:
-            coordinates_text = self.parse_find(parent=placemark, child_name="coordinates").text
-            try:
-                gps_time_text = placemark.find("description").text
-                gps_time = re.search(self._gps_time_string_pattern, gps_time_text).group(1)
-            except:
-                gps_time = np.nan
-
-            coordinates_list = [tuple(map(float, coord.split(","))) for coord in coordinates_text.strip().split()]
-
-            for coord in coordinates_list:
-                coordinates.append((folder_name, gps_time, coord[0], coord[1]))
-
-        return coordinates
-
-    def parse_surface_movements_coordinates(self, folders, folder_name:str="Surface Movements"):
-        print(f"Parsing {folder_name} folder...")
-
-        index = self.get_folder_index(folder_name=folder_name)
-        folder_name = self.folders_names[index]
-        folder = self.folders[index]
-
-        coordinates = []
-
-        placemarks = self.parse_find_all(folder=folder, child_name="placemark")
-
-        for placemark in placemarks:
-            coordinates_text = self.parse_find(parent=placemark, child_name="coordinates").text
-            try:
-                gps_time_text = placemark.find("description").text
-                gps_time = re.search(self._gps_time_string_pattern, gps_time_text).group(1)
-            except:
-                gps_time = np.nan
-
-            coordinates_list = [tuple(map(float, coord.split(","))) for coord in coordinates_text.strip().split()]
-
-            for coord in coordinates_list:
-                coordinates.append((folder_name, gps_time, coord[0], coord[1]))
-
-        return coordinates
-
-    def parse_glider_tracks_coordinates(self, folders, folder_name:str="Glider Tracks"):
-        print(f"Parsing {folder_name} folder...")
-
-        index = self.get_folder_index(folder_name=folder_name)
-        folder_name = self.folders_names[index]
-        folder = self.folders[index]
-
-        coordinates = []
-
-        placemarks = self.parse_find_all(folder=folder, child_name="placemark")
-
-        for placemark in placemarks:
-            coordinates_text = self.parse_find(parent=placemark, child_name="coordinates").text
-            track_info_text = placemark.find("description").text
-            track_info = re.search(self._glider_track_range_string_pattern, track_info_text)
-            range = track_info.group(1)
-            speed = track_info.group(2)
-            deg = track_info.group(3)
-
-            coordinates_list = [tuple(map(float, coord.split(","))) for coord in coordinates_text.strip().split()]
-
-            coordinates.append((folder_name,
-                            range,
-                            speed,
-                            deg,
-                            coordinates_list[0][0],
-                            coordinates_list[0][1],
-                            coordinates_list[1][0],
-                            coordinates_list[1][1]))
-
-        return coordinates
-
-    def parse_depth_current_coordinates(self, folders, folder_name:str="Depth Averaged Current Vectors"):
-        print(f"Parsing {folder_name} folder...")
-
-        index = self.get_folder_index(folder_name=folder_name)
-        folder_name = self.folders_names[index]
-        folder = self.folders[index]
-
-        coordinates = []
-
-        placemarks = self.parse_find_all(folder=folder, child_name="placemark")
-
-        for placemark in placemarks:
-            coordinates_text = self.parse_find(parent=placemark, child_name="coordinates").text
-            track_info_text = placemark.find("description").text
-            track_info = re.search(self._depth_current_avg_string_pattern, track_info_text)
-            speed = track_info.group(1)
-            deg = track_info.group(2)
-
-            coordinates_list = [tuple(map(float, coord.split(","))) for coord in coordinates_text.strip().split()]
-
-            coordinates.append((folder_name,
-                            speed,
-                            deg,
-                            coordinates_list[0][0],
-                            coordinates_list[0][1],
-                            coordinates_list[1][0],
-                            coordinates_list[1][1]))
-
-        return coordinates
-
-    def parse_planned_waypoints(self, folders, folder_name:str="Planned Waypoints"):
-        print(f"Parsing {folder_name} folder...")
-
-        index = self.get_folder_index(folder_name=folder_name)
-        folder_name = self.folders_names[index]
-        folder = self.folders[index]
-
-        coordinates = []
-
-        placemarks = self.parse_find_all(folder=folder, child_name="placemark")
-
-        for placemark in placemarks:
-            coordinates_text = self.parse_find(parent=placemark, child_name="coordinates").text
-            try:
-                gps_time_text = placemark.find("description").text
-                gps_time = re.search(self._gps_time_string_pattern, gps_time_text).group(1)
-            except:
-                gps_time = np.nan
-
-            coordinates_list = [tuple(map(float, coord.split(","))) for coord in coordinates_text.strip().split()]
-
-            for coord in coordinates_list:
-                coordinates.append((folder_name, gps_time, coord[0], coord[1]))
-
-        return coordinates
-
+    def dispatch_soup_placemarks(self, kml:bytes, handlers:dict):
+        soup = self.parse_kml_as_soup(kml=kml)
+        folders = self.parse_folders(soup=soup)
+        for folder, folder_name in zip(folders, self.parse_all_folders_names(folders=folders)):
+            if folder_name not in handlers:
+                continue
+            for placemark in folder.find_all("placemark"):
+                description = placemark.find("description")
+                handlers[folder_name].add(self.parse_find(parent=placemark, child_name="coordinates").text,
+                                            description.text if description else None)
+
+    def walk_layers(self, kml:bytes, skips:dict={}):
+        handlers = {folder_name: LayerHandler.from_registry(folder_name, skip=skips.get(folder_name, 0))
+                    for folder_name in LAYERS}
+
+        if self.backend == "lxml":
+            print("Parsing kml (streaming)...")
+            KMLStreamParser(handlers=handlers).parse(kml)
+        else:
+            self.dispatch_soup_placemarks(kml=kml, handlers=handlers)
+        return handlers
+
+    @profiled_stage("parse")
+    def parse_layers(self, kml:bytes):
+        layers = {}
+        for folder_name, handler in self.walk_layers(kml=kml).items():
+            print(f"Parsing {folder_name} folder...")
+            layers[folder_name] = handler.to_dataframe()
+        return layers
+
+    def compose_manifest_path(self, output_path:str):
+        return os.path.join(output_path, ".pnboia_glider_kmz_manifest.json")
+
+    def load_manifest(self, manifest_path:str):
+        if not os.path.exists(manifest_path):
+            return {"folders": {}}
+        try:
+            with open(manifest_path, "r") as file:
+                manifest = json.load(file)
+        except ValueError:
+            manifest = None
+        if not isinstance(manifest, dict) or not isinstance(manifest.get("folders"), dict):
+            print(f"Unreadable manifest {manifest_path}. Rebuilding the stored layers...")
+            return {"folders": {}}
+        return manifest
+
+    def save_manifest(self, manifest:dict, manifest_path:str):
+        print(f"Saving processed placemarks manifest ({manifest_path})")
+        with open(manifest_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+
+    def hash_layer(self, data:pd.DataFrame, previous:str=""):
+        """
+        sha1 of the rows of a layer, chained to the hash of the rows stored before them, so an
+        incremental run only hashes the rows it appends.
+        """
+        if previous and data.empty:
+            return previous
+        hashed = hashlib.sha1(previous.encode())
+        hashed.update(",".join(map(str, data.columns)).encode())
+        hashed.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+        return hashed.hexdigest()
+
+    def is_stored(self, store:LayerStore, folder_name:str, entry:dict):
+        """
+        True when the stored layer is the one described by its manifest entry: written with the current
+        columns of the layer and untouched since (same size), so new placemarks can be appended to it.
+        """
+        handler = LayerHandler.from_registry(folder_name)
+        if not store.exists(file_name=handler.file_name):
+            return False
+        if entry.get("columns") != handler.columns or entry.get("size") != store.size(file_name=handler.file_name):
+            print(f"Stored {folder_name} layer does not match the manifest. Rebuilding it...")
+            return False
+        return True
+
+    def get_last_time(self, handler:LayerHandler, data:pd.DataFrame):
+        time_fields = [field for field, field_type in handler.fields.items() if field_type == "datetime"]
+        if not time_fields or data[time_fields[0]].isna().all():
+            return None
+        return data[time_fields[0]].max()
+
+    def is_continuation(self, handlers:dict, new_layers:dict, manifest:dict):
+        """
+        False when the kmz no longer extends the stored layers: a folder lost placemarks, or new
+        placemarks are older than the last stored surfacing (e.g. a new mission file).
+        """
+        for folder_name, handler in handlers.items():
+            entry = manifest["folders"].get(folder_name)
+            if not handler.skip or entry is None:
+                continue
+            if handler.placemarks < handler.skip:
+                return False
+            first_time = self.get_last_time(handler=handler, data=new_layers[folder_name].iloc[:1])
+            if entry["last_time"] is not None and first_time is not None and first_time < pd.Timestamp(entry["last_time"]):
+                return False
+        return True
+
+    @profiled_stage("update_layers")
+    def update_layers(self, kml:bytes, output_path:str, output_format:str="csv"):
+        """
+        Append to the stored layers only the placemarks added since the last run (folders that are not
+        append-only are rewritten whole), and return the stored layers, read back on first access,
+        with the chained hash of every layer kept in the manifest.
+        """
+        store = LayerStore(output_path=output_path, output_format=output_format)
+        manifest_path = self.compose_manifest_path(output_path=output_path)
+        manifest = self.load_manifest(manifest_path=manifest_path)
+
+        # placemarks already in the store are skipped during the walk
+        skips = {folder_name: entry["placemarks"] for folder_name, entry in manifest["folders"].items()
+                    if folder_name in LAYERS and LAYERS[folder_name].get("append_only", True)
+                    and self.is_stored(store=store, folder_name=folder_name, entry=entry)}
+        handlers = self.walk_layers(kml=kml, skips=skips)
+        new_layers = {folder_name: handler.to_dataframe() for folder_name, handler in handlers.items()}
+
+        if not self.is_continuation(handlers=handlers, new_layers=new_layers, manifest=manifest):
+            print("KMZ does not extend the stored layers. Rebuilding them from scratch...")
+            manifest = {"folders": {}}
+            handlers = self.walk_layers(kml=kml)
+            new_layers = {folder_name: handler.to_dataframe() for folder_name, handler in handlers.items()}
+
+        for folder_name, handler in handlers.items():
+            new_rows = new_layers[folder_name]
+            entry = manifest["folders"].get(folder_name) if handler.skip else None
+            entry = entry or {"placemarks": 0, "rows": 0, "last_time": None, "hash": ""}
+
+            print(f"{folder_name}: {handler.placemarks - handler.skip} new placemarks, {len(new_rows)} new rows")
+            store.write(data=new_rows, file_name=handler.file_name, append=bool(handler.skip), start_row=entry["rows"])
+
+            last_time = self.get_last_time(handler=handler, data=new_rows)
+            manifest["folders"][folder_name] = {
+                "placemarks": handler.placemarks,
+                "rows": entry["rows"] + len(new_rows),
+                "last_time": last_time.isoformat() if last_time is not None else entry["last_time"],
+                "hash": self.hash_layer(data=new_rows, previous=entry.get("hash", "")),
+                "columns": handler.columns,
+                "size": store.size(file_name=handler.file_name),
+            }
+
+        self.save_manifest(manifest=manifest, manifest_path=manifest_path)
+        layer_hashes = {folder_name: manifest["folders"][folder_name]["hash"] for folder_name in handlers}
+        return StoredLayers(store=store, handlers=handlers), layer_hashes
+
+    @profiled_stage("plot_map")
     def plot_map(self,
                 surfacings_data:pd.DataFrame,
                 surface_movements_data:pd.DataFrame,
                 glider_tracks_data:pd.DataFrame,
                 depth_avg_currents_data:pd.DataFrame,
                 zoom_start=10,
-                center=None):
+                center=None,
+                renderer:str="geojson",
+                canvas:bool=False):
         print("Generating interactive map...")
+        if renderer not in ["geojson", "markers"]:
+            raise ValueError(f"Unknown renderer '{renderer}'. Use 'geojson' or 'markers'.")
         # map_center = [data['latitude'].iloc[0], data['longitude'].iloc[0]]
-        map = folium.Map(zoom_start=zoom_start, control_scale=True, location=(-22.92830339525606, -43.137900250593106))
+        map = folium.Map(zoom_start=zoom_start, control_scale=True, location=(-22.92830339525606, -43.137900250593106),
+                        prefer_canvas=canvas)
 
         tile_layer = folium.TileLayer(
             tiles='https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
@@ -284,7 +290,12 @@ class KMZParser:
             control=True
         ).add_to(map)
 
-        plotly_graph_html = open('htmls/glider_sci_data_timeseries.html').read()
+        # the science plot is its own content-hashed page, only fetched when the panel is opened
+        science_plot = self.load_science_plot_manifest()
+        science_plot_file_name = science_plot["file_name"] if science_plot else ""
+        self.science_plot_file_name = science_plot_file_name
+        if not science_plot:
+            print("Science plot not found. The map is built without it.")
 
         # Define a custom HTML control to toggle the Plotly graph
         html = """
@@ -320,6 +331,7 @@ class KMZParser:
     border-radius: 5px;
     z-index: 1000;
     cursor: pointer;
+    display: %s;
 ">Science Data</button>
 <div id="plotly-container" style="
     position: absolute;
@@ -330,11 +342,15 @@ class KMZParser:
     border: 1px solid gray;
     z-index: 1000;
     display: none;">
-    %s
+    <iframe id="plotly-frame" data-src="%s" style="width: 900px; height: 520px; border: none;"></iframe>
 </div>
 <script>
 function togglePlotly() {
     var plotlyContainer = document.getElementById("plotly-container");
+    var plotlyFrame = document.getElementById("plotly-frame");
+    if (!plotlyFrame.getAttribute("src")) {
+        plotlyFrame.setAttribute("src", plotlyFrame.dataset.src);
+    }
     if (plotlyContainer.style.display === "none") {
         plotlyContainer.style.display = "block";
     } else {
@@ -342,7 +358,7 @@ function togglePlotly() {
     }
 }
 </script>
-""" % plotly_graph_html
+""" % ("block" if science_plot_file_name else "none", science_plot_file_name)
 
         # Add the custom HTML control to the map
         map.get_root().html.add_child(folium.Element(html))
@@ -377,6 +393,38 @@ function togglePlotly() {
         # map.get_root().html.add_child(folium.Element(title_html))
 
 
+        if renderer == "geojson":
+            self.add_geojson_layers(map=map,
+                                    surfacings_data=surfacings_data,
+                                    surface_movements_data=surface_movements_data,
+                                    glider_tracks_data=glider_tracks_data,
+                                    depth_avg_currents_data=depth_avg_currents_data,
+                                    canvas=canvas)
+        else:
+            self.add_marker_layers(map=map,
+                                    surfacings_data=surfacings_data,
+                                    surface_movements_data=surface_movements_data,
+                                    glider_tracks_data=glider_tracks_data,
+                                    depth_avg_currents_data=depth_avg_currents_data)
+
+        # surfacings_layer = folium.FeatureGroup(name='Surfacings', overlay=True).add_to(map)
+        folium.LayerControl().add_to(map)
+
+        # MeasureControl(primary_length_unit='meters',
+        #                 primary_area_unit='sqmeters').add_to(map)
+
+        return map
+
+    def add_marker_layers(self,
+                        map:folium.Map,
+                        surfacings_data:pd.DataFrame,
+                        surface_movements_data:pd.DataFrame,
+                        glider_tracks_data:pd.DataFrame,
+                        depth_avg_currents_data:pd.DataFrame):
+        """
+        One folium object per row (the original renderer). Kept for comparison, slow past a few
+        hundred surfacings.
+        """
         surfacings_layer = folium.FeatureGroup(name='Surfacings', overlay=True).add_to(map)
         surface_movements_layer = folium.FeatureGroup(name='Surface Movements', overlay=True).add_to(map)
         glider_tracks_layer = folium.FeatureGroup(name='Glider Tracks', overlay=True).add_to(map)
@@ -463,14 +511,135 @@ function togglePlotly() {
             lines = folium.PolyLine(locations=[[row["start_latitude"], row["start_longitude"]], [row["end_latitude"],row["end_longitude"]]],
                                         color='green',
                                         weight=3,z_index=1000).add_to(depth_currents)
-        # surfacings_layer = folium.FeatureGroup(name='Surfacings', overlay=True).add_to(map)
-        folium.LayerControl().add_to(map)
 
-        # MeasureControl(primary_length_unit='meters',
-        #                 primary_area_unit='sqmeters').add_to(map)
+    def points_feature_collection(self, data:pd.DataFrame):
+        data = data.dropna(subset=["longitude", "latitude"])
+        gps_date_time = data["gps_date_time"].dt.strftime("%Y-%m-%d %H:%M:%S").fillna("")
+        return {"type": "FeatureCollection",
+                "features": [{"type": "Feature",
+                                "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+                                "properties": {"gps_date_time": date_time, "latitude": latitude, "longitude": longitude}}
+                                for longitude, latitude, date_time in zip(data["longitude"].round(6).tolist(),
+                                                                        data["latitude"].round(6).tolist(),
+                                                                        gps_date_time.tolist())]}
+
+    def line_feature_collection(self, data:pd.DataFrame):
+        data = data.dropna(subset=["longitude", "latitude"])
+        return {"type": "FeatureCollection",
+                "features": [{"type": "Feature",
+                                "geometry": {"type": "LineString",
+                                            "coordinates": data[["longitude", "latitude"]].round(6).to_numpy().tolist()},
+                                "properties": {}}]}
+
+    def segments_feature_collection(self, data:pd.DataFrame):
+        columns = ["start_longitude", "start_latitude", "end_longitude", "end_latitude"]
+        segments = data[columns].dropna().round(6).to_numpy().reshape(-1, 2, 2)
+        return {"type": "FeatureCollection",
+                "features": [{"type": "Feature",
+                                "geometry": {"type": "MultiLineString", "coordinates": segments.tolist()},
+                                "properties": {}}]}
+
+    def add_geojson_layers(self,
+                        map:folium.Map,
+                        surfacings_data:pd.DataFrame,
+                        surface_movements_data:pd.DataFrame,
+                        glider_tracks_data:pd.DataFrame,
+                        depth_avg_currents_data:pd.DataFrame,
+                        canvas:bool=False):
+        """
+        Each layer is a single GeoJSON FeatureCollection: surfacings and surface movements as points
+        sharing one popup template, the surfacings path as one LineString and the tracks and currents
+        as one MultiLineString each. With canvas=True points are drawn as circles on a canvas instead
+        of image markers.
+        """
+        popup = JsCode("""
+            function(feature, layer) {
+                var p = feature.properties;
+                layer.bindPopup('<div style="font-family: sans-serif; font-size: 12px;">'
+                    + '<b>unit_1094</b><br>'
+                    + '<b>Datahora:</b> ' + p.gps_date_time + 'Z<br>'
+                    + '<b>Latitude:</b> ' + p.latitude + '<br>'
+                    + '<b>Longitude:</b> ' + p.longitude + '</div>', {maxWidth: 300});
+            }
+        """)
+
+        def point_marker(color:str):
+            if canvas:
+                return folium.CircleMarker(radius=3, fill=True, fill_color=color, color=None, fill_opacity=1)
+            return folium.Marker(icon=folium.CustomIcon(icon_image="https://i.imgur.com/BJqEyd0.png", icon_size=(25,20)))
 
-        return map
+        surfacings_layer = folium.FeatureGroup(name='Surfacings', overlay=True).add_to(map)
+        folium.GeoJson(self.line_feature_collection(surfacings_data),
+                        style_function=lambda feature: {"color": "white", "dashArray": "4, 4", "weight": 1},
+                        control=False).add_to(surfacings_layer)
+        folium.GeoJson(self.points_feature_collection(surfacings_data),
+                        marker=point_marker(color="cornflowerblue"),
+                        on_each_feature=popup,
+                        control=False).add_to(surfacings_layer)
+
+        surface_movements_layer = folium.FeatureGroup(name='Surface Movements', overlay=True).add_to(map)
+        folium.GeoJson(self.points_feature_collection(surface_movements_data),
+                        marker=point_marker(color="red"),
+                        on_each_feature=popup,
+                        control=False).add_to(surface_movements_layer)
 
+        glider_tracks_layer = folium.FeatureGroup(name='Glider Tracks', overlay=True).add_to(map)
+        folium.GeoJson(self.segments_feature_collection(glider_tracks_data),
+                        style_function=lambda feature: {"color": "white", "dashArray": "4, 4", "weight": 1},
+                        control=False).add_to(glider_tracks_layer)
+
+        depth_currents = folium.FeatureGroup(name='Depth Avg Currents', overlay=True).add_to(map)
+        folium.GeoJson(self.segments_feature_collection(depth_avg_currents_data),
+                        style_function=lambda feature: {"color": "green", "weight": 3},
+                        control=False).add_to(depth_currents)
+
+    def load_science_plot_manifest(self):
+        manifest_path = os.path.join("htmls/", self.science_plot_manifest_file_name)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+
+    @profiled_stage("map_hash")
+    def compute_map_hash(self, layer_hashes:dict, renderer:str, canvas:bool):
+        hashed = hashlib.sha1(f"{renderer},{canvas}".encode())
+        for folder_name, layer_hash in layer_hashes.items():
+            hashed.update(f"{folder_name}:{layer_hash}".encode())
+        science_plot = self.load_science_plot_manifest()
+        hashed.update((science_plot["data_hash"] if science_plot else "").encode())
+        return hashed.hexdigest()
+
+    def is_map_up_to_date(self, map_hash:str):
+        manifest_path = os.path.join("htmls/", self.map_manifest_file_name)
+        if not os.path.exists(manifest_path) or \
+                not os.path.exists(os.path.join("htmls/", self.output_interactive_map_html_file_name)):
+            return False
+        with open(manifest_path, "r") as file:
+            return json.load(file).get("map_hash") == map_hash
+
+    def save_map_manifest(self, map_hash:str, science_plot_file_name:str=""):
+        with open(os.path.join("htmls/", self.map_manifest_file_name), "w") as file:
+            json.dump({"map_hash": map_hash, "science_plot": science_plot_file_name}, file, indent=2)
+
+    def delete_stale_science_plots(self):
+        """
+        Deletes the science plot artifacts left by SFMCGliderData once the saved map no longer loads
+        them, keeping the one of the map and the current one.
+        """
+        keep = set()
+        science_plot = self.load_science_plot_manifest()
+        if science_plot:
+            keep.add(science_plot["file_name"])
+        with open(os.path.join("htmls/", self.map_manifest_file_name), "r") as file:
+            keep.add(json.load(file).get("science_plot"))
+
+        prefix = os.path.splitext(self.science_plot_manifest_file_name)[0]
+        for path in sorted(glob.glob(os.path.join("htmls/", f"{prefix}.*.html"))):
+            if os.path.basename(path) not in keep:
+                print(f"Deleting previous science plot artifact {os.path.basename(path)}")
+                os.remove(path)
+
+    @profiled_stage("save_html")
     def save_map_as_html(self, map, file_name:str):
         print(f"Saving interactive map as {file_name}")
         map.save(os.path.join("htmls/", file_name))
@@ -483,29 +652,35 @@ if __name__ == "__main__":
     print("="*30)
     print("RUNNING GLIDER FLIGHT DATA PROCESSOR")
 
-    k = KMZParser(folder_path="data/")
+    profiler, options = create_profiler(pipeline="kmz", options=sys.argv[1:])
+    incremental = any(option in ("-i", "--incremental") for option in options)
 
+    k = KMZParser(folder_path="data/", incremental=incremental, profiler=profiler)
 
-    print(f"Saving Surfacings data as {k.output_surfacings_csv_file_name}")
-    k.surfacings_coords_df.to_csv(os.path.join("data/",k.output_surfacings_csv_file_name))
+    # incremental runs have already appended their new rows to data/<layer>.csv
+    if not incremental:
+        print(f"Saving Surfacings data as {k.output_surfacings_csv_file_name}")
+        k.surfacings_coords_df.to_csv(os.path.join("data/",k.output_surfacings_csv_file_name))
 
-    print(f"Saving Surface Movements data as {k.output_surface_movements_csv_file_name}")
-    k.surface_movements_coords_df.to_csv(os.path.join("data/",k.output_surface_movements_csv_file_name))
+        print(f"Saving Surface Movements data as {k.output_surface_movements_csv_file_name}")
+        k.surface_movements_coords_df.to_csv(os.path.join("data/",k.output_surface_movements_csv_file_name))
 
-    print(f"Saving Glider Tracks data as {k.output_glider_tracks_csv_file_name}")
-    k.glider_track_coords_df.to_csv(os.path.join("data/",k.output_glider_tracks_csv_file_name))
+        print(f"Saving Glider Tracks data as {k.output_glider_tracks_csv_file_name}")
+        k.glider_track_coords_df.to_csv(os.path.join("data/",k.output_glider_tracks_csv_file_name))
 
-    print(f"Saving Depth Avarage Currents data as {k.output_depth_curr_csv_file_name}")
-    k.depth_current_avg_coords_df.to_csv(os.path.join("data/",k.output_depth_curr_csv_file_name))
+        print(f"Saving Depth Avarage Currents data as {k.output_depth_curr_csv_file_name}")
+        k.depth_current_avg_coords_df.to_csv(os.path.join("data/",k.output_depth_curr_csv_file_name))
 
-    # print(f"Saving Planned waypoints data as {k.output_depth_curr_csv_file_name}")
-    # k.surface_movements_coords_df.to_csv(os.path.join("data/",k.output_planned_waypoints_csv_file_name))
+        print(f"Saving Planned waypoints data as {k.output_planned_waypoints_csv_file_name}")
+        k.planned_waypoints_coords_df.to_csv(os.path.join("data/",k.output_planned_waypoints_csv_file_name))
 
 
     print("\nSUCCESSFULL PROCESSING")
 
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ("-oim", "--open-interactive-map"):
-            print("\nOpenning interactive map in your default webbrowser...")
-            html_file_path = os.path.join(os.getcwd(),"htmls/", k.output_interactive_map_html_file_name)
-            k.open_interactive_map_in_webbrowser(html_file_path=html_file_path)
+    if profiler:
+        profiler.finish()
+
+    if any(option in ("-oim", "--open-interactive-map") for option in options):
+        print("\nOpenning interactive map in your default webbrowser...")
+        html_file_path = os.path.join(os.getcwd(),"htmls/", k.output_interactive_map_html_file_name)
+        k.open_interactive_map_in_webbrowser(html_file_path=html_file_path)
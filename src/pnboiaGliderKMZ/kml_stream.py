@@ -0,0 +1,74 @@
+"""
+PNBoia Glider Flight KMZ Processor - streaming KML reader
+Author: Thiago Caminha
+version: 0.0.1
+
+Single pass lxml reader used by KMZParser in place of BeautifulSoup's html.parser.
+"""
+
+from lxml import etree
+import io
+
+
+class KMLStreamParser:
+    """
+    Streaming KML reader built on lxml.etree.iterparse.
+
+    Walks the document once and hands the coordinates and description text of every placemark
+    in a registered folder (nested placemarks included, as with find_all) to that folder's
+    handler. Every element is freed as soon as it is processed, so memory does not grow with
+    the file.
+    """
+
+    def __init__(self, handlers:dict):
+        # folder name -> object with an add(coordinates_text, description_text) method
+        self.handlers = handlers
+
+    def localname(self, element):
+        # namespace-aware tag comparison ({http://www.opengis.net/kml/2.2}Placemark -> Placemark)
+        return element.tag.rpartition("}")[2]
+
+    def child_text(self, element, child_name:str):
+        child = element.find(f".//{{*}}{child_name}")
+        if child is None or child.text is None:
+            return None
+        return child.text
+
+    def release(self, element):
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+    def parse(self, kml:bytes):
+        folders_stack = []
+
+        # only the elements the walk looks at raise events, the rest is built by lxml in C
+        context = etree.iterparse(io.BytesIO(kml), events=("start", "end"), tag=["{*}Folder", "{*}name", "{*}Placemark"],
+                                    huge_tree=True, remove_comments=True)
+        for event, element in context:
+            tag = self.localname(element)
+
+            if event == "start":
+                if tag == "Folder":
+                    folders_stack.append(None)
+                continue
+
+            if tag == "name" and folders_stack and self.localname(element.getparent()) == "Folder" \
+                    and folders_stack[-1] is None:
+                folders_stack[-1] = element.text
+
+            elif tag == "Placemark":
+                targets = [name for name in dict.fromkeys(folders_stack) if name in self.handlers]
+                if targets:
+                    coordinates_text = self.child_text(element, "coordinates")
+                    description_text = self.child_text(element, "description")
+                    for name in targets:
+                        self.handlers[name].add(coordinates_text, description_text)
+                self.release(element)
+
+            elif tag == "Folder":
+                folders_stack.pop()
+                self.release(element)
+
+        del context
+        return self.handlers
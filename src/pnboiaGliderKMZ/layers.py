@@ -0,0 +1,144 @@
+"""
+PNBoia Glider Flight KMZ Processor - layer registry
+Author: Thiago Caminha
+version: 0.0.1
+
+Table of the KMZ folders read by KMZParser. Each entry gives the coordinate layout of the folder's
+placemarks and the regex that pulls its fields out of the placemark description.
+"""
+
+import pandas as pd
+import numpy as np
+
+
+GPS_TIME_PATTERN = r"Time of GPS Position: (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})"
+GLIDER_TRACK_PATTERN = r"Range: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+.*?Speed: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+ @ (\d+)"
+DEPTH_CURRENT_PATTERN = r"Speed: ([-+]?\d*\.\d+|\d+|NaN)[A-Za-z/]+ @ (\d+)"
+
+# geometry "points": one row per coordinate of the placemark
+# geometry "segment": one row per placemark, from its first to its second coordinate
+# fields: description regex groups, in order, with the type of their column
+# append_only: False for folders whose placemarks can change in place, rebuilt on every incremental run
+LAYERS = {
+    "Surfacings": {"geometry": "points", "pattern": GPS_TIME_PATTERN, "fields": {"gps_date_time": "datetime"},
+                   "file_name": "surfacings"},
+    "Surface Movements": {"geometry": "points", "pattern": GPS_TIME_PATTERN, "fields": {"gps_date_time": "datetime"},
+                          "file_name": "surface_movements"},
+    "Glider Tracks": {"geometry": "segment", "pattern": GLIDER_TRACK_PATTERN,
+                      "fields": {"range": "float", "speed": "float", "degree": "int"},
+                      "file_name": "glider_tracks"},
+    "Depth Averaged Current Vectors": {"geometry": "segment", "pattern": DEPTH_CURRENT_PATTERN,
+                                       "fields": {"speed": "float", "degree": "int"},
+                                       "file_name": "depth_avg_currents"},
+    "Planned Waypoints": {"geometry": "points", "pattern": None, "fields": {}, "required": False,
+                          "append_only": False, "file_name": "planned_waypoints"},
+}
+
+GEOMETRY_COLUMNS = {
+    "points": ["longitude", "latitude"],
+    "segment": ["start_longitude", "start_latitude", "end_longitude", "end_latitude"],
+}
+
+
+class LayerHandler():
+    """
+    Collects the raw coordinates and description text of one KMZ folder's placemarks and parses
+    them in bulk into typed columns when the frame is built.
+    """
+
+    def __init__(self, folder_name:str, geometry:str, pattern:str=None, fields:dict={}, required:bool=True,
+                    append_only:bool=True, file_name:str=None, skip:int=0):
+        if geometry not in GEOMETRY_COLUMNS:
+            raise ValueError(f"Unknown geometry '{geometry}'. Use one of {list(GEOMETRY_COLUMNS)}.")
+        self.folder_name = folder_name
+        self.geometry = geometry
+        self.pattern = pattern
+        self.fields = dict(fields)
+        self.required = required
+        self.append_only = append_only
+        self.file_name = file_name or folder_name.lower().replace(" ", "_")
+        # placemarks already handled by a previous run, in document order
+        self.skip = skip
+        self.placemarks = 0
+        self.coordinates_texts = []
+        self.descriptions_texts = []
+
+    @classmethod
+    def from_registry(cls, folder_name:str, skip:int=0):
+        return cls(folder_name=folder_name, skip=skip, **LAYERS[folder_name])
+
+    def __len__(self):
+        return len(self.coordinates_texts)
+
+    @property
+    def columns(self):
+        return ["folder_name"] + list(self.fields) + GEOMETRY_COLUMNS[self.geometry]
+
+    def add(self, coordinates_text:str, description_text:str):
+        self.placemarks += 1
+        if self.placemarks <= self.skip:
+            return
+        if not coordinates_text:
+            raise ValueError(f"No matches for coordinates found in {self.folder_name}. Aborting parsing.")
+        self.coordinates_texts.append(coordinates_text)
+        self.descriptions_texts.append(description_text)
+
+    def parse_coordinates(self):
+        """
+        (n coordinates, 2) lon/lat array of every placemark, and the number of coordinates of each one.
+        """
+        counts = pd.Series(self.coordinates_texts).str.split().str.len().to_numpy()
+        values = np.fromstring(" ".join(self.coordinates_texts).replace(",", " "), sep=" ")
+
+        # lon,lat or lon,lat,alt tuples: a single reshape when every tuple has the same size
+        if len(values) % counts.sum() == 0 and len(values) // counts.sum() in (2, 3):
+            return values.reshape(counts.sum(), -1)[:, :2], counts
+
+        tuples = pd.Series(" ".join(self.coordinates_texts).split()).str.split(",", expand=True)
+        return tuples.iloc[:, :2].astype(float).to_numpy(), counts
+
+    def parse_descriptions(self):
+        if not self.fields:
+            return pd.DataFrame(index=range(len(self)))
+
+        extracted = pd.Series(self.descriptions_texts, dtype=object).str.extract(self.pattern)
+        extracted.columns = list(self.fields)
+        return self.convert_fields(extracted)
+
+    def convert_fields(self, data:pd.DataFrame):
+        """
+        Cast the description fields to their registry types (also used on layers read back from CSV).
+        """
+        for field, field_type in self.fields.items():
+            if field_type == "datetime":
+                data[field] = pd.to_datetime(data[field], format="%Y-%m-%d %H:%M:%S")
+            elif field_type == "int":
+                data[field] = data[field].astype(float).astype("Int64")
+            else:
+                # float() also reads the "NaN" the SFMC writes for missing values
+                data[field] = data[field].astype(float)
+        return data
+
+    def to_dataframe(self):
+        if not len(self):
+            if self.required and not self.skip:
+                raise ValueError(f"No matches for placemark found in {self.folder_name}. Aborting parsing.")
+            return pd.DataFrame(columns=self.columns)
+
+        coordinates, counts = self.parse_coordinates()
+        descriptions = self.parse_descriptions()
+
+        if self.geometry == "points":
+            data = descriptions.iloc[np.repeat(np.arange(len(self)), counts)].reset_index(drop=True)
+            data["longitude"] = coordinates[:, 0]
+            data["latitude"] = coordinates[:, 1]
+        else:
+            if (counts < 2).any():
+                raise ValueError(f"{self.folder_name} placemark with less than two coordinates. Aborting parsing.")
+            starts = np.cumsum(counts) - counts
+            data = descriptions
+            data["start_longitude"], data["start_latitude"] = coordinates[starts, 0], coordinates[starts, 1]
+            data["end_longitude"], data["end_latitude"] = coordinates[starts + 1, 0], coordinates[starts + 1, 1]
+
+        data.insert(0, "folder_name", self.folder_name)
+        return data
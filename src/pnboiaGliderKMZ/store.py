@@ -0,0 +1,85 @@
+"""
+PNBoia Glider Flight KMZ Processor - stored layers
+Author: Thiago Caminha
+version: 0.0.1
+
+CSV or Parquet copies of the KMZ layers, to which incremental KMZParser runs append their new rows.
+A layer is a single CSV file, or a folder of Parquet parts (part-<n>.parquet). pyarrow is only
+needed by the Parquet format.
+"""
+
+from collections.abc import Mapping
+import pandas as pd
+import os
+import glob
+import shutil
+
+
+class LayerStore():
+
+    def __init__(self, output_path:str, output_format:str="csv"):
+        if output_format not in ["csv", "parquet"]:
+            raise ValueError(f"Unknown output format '{output_format}'. Use 'csv' or 'parquet'.")
+        self.output_path = output_path
+        self.output_format = output_format
+
+    def compose_layer_path(self, file_name:str):
+        return os.path.join(self.output_path, f"{file_name}.{self.output_format}")
+
+    def exists(self, file_name:str):
+        return os.path.exists(self.compose_layer_path(file_name=file_name))
+
+    def size(self, file_name:str):
+        layer_path = self.compose_layer_path(file_name=file_name)
+        if os.path.isdir(layer_path):
+            return sum(os.path.getsize(part) for part in glob.glob(os.path.join(layer_path, "part-*.parquet")))
+        return os.path.getsize(layer_path)
+
+    def write(self, data:pd.DataFrame, file_name:str, append:bool=False, start_row:int=0):
+        layer_path = self.compose_layer_path(file_name=file_name)
+        # rows keep a running index across appends, as in a single to_csv of the whole layer
+        data = data.set_axis(pd.RangeIndex(start_row, start_row + len(data)))
+
+        if self.output_format == "csv":
+            data.to_csv(layer_path, mode="a" if append else "w", header=not append)
+            return
+
+        if not append and os.path.isdir(layer_path):
+            shutil.rmtree(layer_path)
+        os.makedirs(layer_path, exist_ok=True)
+        part = len(glob.glob(os.path.join(layer_path, "part-*.parquet")))
+        data.to_parquet(os.path.join(layer_path, f"part-{part}.parquet"))
+
+    def read(self, file_name:str):
+        layer_path = self.compose_layer_path(file_name=file_name)
+
+        if self.output_format == "csv":
+            return pd.read_csv(layer_path, index_col=0)
+
+        parts = sorted(glob.glob(os.path.join(layer_path, "part-*.parquet")),
+                        key=lambda part: int(os.path.basename(part)[5:-8]))
+        return pd.concat([pd.read_parquet(part) for part in parts])
+
+
+class StoredLayers(Mapping):
+    """
+    {folder name: layer} of a LayerStore, each layer read back and typed on first access, so a
+    refresh that does not rebuild the map never reads the stored layers.
+    """
+
+    def __init__(self, store:LayerStore, handlers:dict):
+        self.store = store
+        self.handlers = handlers
+        self.loaded = {}
+
+    def __getitem__(self, folder_name:str):
+        if folder_name not in self.loaded:
+            handler = self.handlers[folder_name]
+            self.loaded[folder_name] = handler.convert_fields(self.store.read(file_name=handler.file_name))
+        return self.loaded[folder_name]
+
+    def __iter__(self):
+        return iter(self.handlers)
+
+    def __len__(self):
+        return len(self.handlers)
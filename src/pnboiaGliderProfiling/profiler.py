@@ -0,0 +1,334 @@
+"""
+PNBoia Glider Profiling - pipeline stage metrics
+Author: Thiago Caminha
+version: 0.0.1
+
+Wall/CPU time, peak RSS and rows in/out of every stage of the decode/ETL pipelines (GliderDataToCSV,
+PNBOIAGlider, SFMCGliderData and KMZParser), written as a JSON run report and, optionally, as a
+Prometheus textfile (node_exporter textfile collector). One stage can also be run under cProfile
+and tracemalloc.
+
+Methods decorated with profiled_stage are only measured when their object has a profiler attribute
+set, so the classes run as before when none is given.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import functools
+import threading
+import tracemalloc
+import cProfile
+import pstats
+import resource
+import json
+import time
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+
+PROFILING_OPTIONS = ("--profile=", "--report=", "--metrics=")
+
+
+def read_rss():
+    """
+    Resident set size of this process in bytes. Outside Linux the peak RSS of the process is
+    returned instead.
+    """
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def count_rows(value):
+    """
+    Rows of a dataframe, series or array, summed over lists, tuples and dicts of them. None when
+    there is nothing to count.
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        rows = [count_rows(item) for item in value]
+        rows = [row for row in rows if row is not None]
+        return sum(rows) if rows else None
+    return None
+
+
+class RSSSampler(threading.Thread):
+    """
+    Polls the RSS every interval seconds while a stage runs and keeps the highest value.
+    """
+
+    def __init__(self, interval:float=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = read_rss()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, read_rss())
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        self.peak = max(self.peak, read_rss())
+        return self.peak
+
+
+class StageRecord():
+
+    def __init__(self, name:str, parent:str=None, rows_in:int=None):
+        self.name = name
+        self.parent = parent
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.status = "ok"
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.rss_start = None
+        self.rss_end = None
+        self.peak_rss = None
+        self.traced_peak = None
+        self.top_allocations = None
+
+    def to_dict(self):
+        # the tracemalloc fields are only set on the profiled stage
+        return {key: value for key, value in vars(self).items()
+                if value is not None or key not in ("traced_peak", "top_allocations")}
+
+
+class StageProfiler():
+    """
+    Collects a StageRecord per stage run. profile_stage names the stage run under cProfile and
+    tracemalloc (every run of it, when it runs more than once). report_path and metrics_path are
+    written by finish().
+    """
+
+    def __init__(self, pipeline:str, profile_stage:str=None, report_path:str=None, metrics_path:str=None,
+                    labels:dict=None, sample_interval:float=0.01):
+        self.pipeline = pipeline
+        self.profile_stage = profile_stage
+        self.report_path = report_path
+        self.metrics_path = metrics_path
+        self.labels = labels or {}
+        self.sample_interval = sample_interval
+
+        self.records = []
+        self.stack = []
+        self.cprofile = cProfile.Profile() if profile_stage else None
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.run_sampler = RSSSampler(interval=sample_interval * 10)
+        self.run_sampler.start()
+
+    @contextmanager
+    def stage(self, name:str, rows_in:int=None):
+        """
+        with profiler.stage("decode") as record: ...; record.rows_out = len(data)
+        """
+        record = StageRecord(name=name, parent=self.stack[-1].name if self.stack else None, rows_in=rows_in)
+        profiled = name == self.profile_stage
+        self.stack.append(record)
+
+        if profiled:
+            tracemalloc.start()
+            self.cprofile.enable()
+        sampler = RSSSampler(interval=self.sample_interval)
+        record.rss_start = sampler.peak
+        sampler.start()
+        start, cpu_start = time.perf_counter(), time.process_time()
+
+        try:
+            yield record
+        except BaseException:
+            record.status = "error"
+            raise
+        finally:
+            record.wall_time = time.perf_counter() - start
+            record.cpu_time = time.process_time() - cpu_start
+            record.peak_rss = sampler.stop()
+            record.rss_end = read_rss()
+            if profiled:
+                self.cprofile.disable()
+                record.traced_peak = tracemalloc.get_traced_memory()[1]
+                record.top_allocations = self.get_top_allocations(tracemalloc.take_snapshot())
+                tracemalloc.stop()
+            self.stack.pop()
+            self.records.append(record)
+
+    def get_top_allocations(self, snapshot, limit:int=10):
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        return [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size": stat.size, "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:limit]]
+
+    def summarize(self):
+        """
+        One row per stage name (in order of first run): runs, total times and rows, highest peak RSS.
+        """
+        if not self.records:
+            return pd.DataFrame(columns=["stage", "parent", "runs", "wall_time", "cpu_time", "peak_rss", "rows_in", "rows_out"])
+        records = pd.DataFrame([record.to_dict() for record in self.records])
+        order = records.sort_values("started_at", kind="stable").drop_duplicates("name")["name"]
+        summary = (records
+                    .groupby("name", sort=False)
+                    .agg(parent=("parent", "first"),
+                        runs=("name", "size"),
+                        wall_time=("wall_time", "sum"),
+                        cpu_time=("cpu_time", "sum"),
+                        peak_rss=("peak_rss", "max"),
+                        rows_in=("rows_in", lambda rows: rows.sum(min_count=1)),
+                        rows_out=("rows_out", lambda rows: rows.sum(min_count=1)))
+                    .reindex(order))
+        return summary.rename_axis("stage").reset_index()
+
+    def compose_report(self):
+        return {
+            "pipeline": self.pipeline,
+            "labels": self.labels,
+            "started_at": self.started_at.isoformat(),
+            "wall_time": time.perf_counter() - self.start,
+            "peak_rss": max([self.run_sampler.peak] + [record.peak_rss for record in self.records]),
+            "status": "error" if any(record.status == "error" for record in self.records) else "ok",
+            "profile_stage": self.profile_stage,
+            "summary": json.loads(self.summarize().to_json(orient="records")),
+            "stages": [record.to_dict() for record in self.records],
+        }
+
+    def save_report(self, report:dict, report_path:str):
+        print(f"Saving run report as {report_path}")
+        with open(report_path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    def compose_prometheus_labels(self, **labels):
+        labels = dict({"pipeline": self.pipeline}, **self.labels, **labels)
+        return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+    def save_prometheus(self, report:dict, metrics_path:str):
+        """
+        Textfile collector format, written to a temporary file and renamed so the collector never
+        reads a partial file.
+        """
+        run_labels = self.compose_prometheus_labels()
+        metrics = [
+            ("pnboia_glider_run_seconds", "Wall time of the pipeline run.", [(run_labels, report["wall_time"])]),
+            ("pnboia_glider_run_peak_rss_bytes", "Peak resident memory of the pipeline run.", [(run_labels, report["peak_rss"])]),
+            ("pnboia_glider_run_success", "1 when no stage of the run failed.", [(run_labels, int(report["status"] == "ok"))]),
+            ("pnboia_glider_run_timestamp_seconds", "Start of the pipeline run.", [(run_labels, self.started_at.timestamp())]),
+        ]
+        stage_metrics = [("runs", "pnboia_glider_stage_runs", "Runs of the stage."),
+                        ("wall_time", "pnboia_glider_stage_seconds", "Wall time of the stage."),
+                        ("cpu_time", "pnboia_glider_stage_cpu_seconds", "CPU time of the stage."),
+                        ("peak_rss", "pnboia_glider_stage_peak_rss_bytes", "Peak resident memory during the stage."),
+                        ("rows_in", "pnboia_glider_stage_rows_in", "Rows into the stage."),
+                        ("rows_out", "pnboia_glider_stage_rows_out", "Rows out of the stage.")]
+        for field, metric, help_text in stage_metrics:
+            samples = [(self.compose_prometheus_labels(stage=stage["stage"]), stage[field])
+                        for stage in report["summary"] if stage[field] is not None]
+            metrics.append((metric, help_text, samples))
+
+        lines = []
+        for metric, help_text, samples in metrics:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+            lines += [f"{metric}{{{labels}}} {float(value)!r}" for labels, value in samples]
+
+        print(f"Saving Prometheus metrics as {metrics_path}")
+        temporary_path = metrics_path + ".tmp"
+        with open(temporary_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(temporary_path, metrics_path)
+
+    def compose_profile_path(self):
+        if self.report_path:
+            return f"{os.path.splitext(self.report_path)[0]}.{self.profile_stage}.prof"
+        return f"{self.pipeline}_{self.profile_stage}.prof"
+
+    def save_profile(self):
+        if not any(record.name == self.profile_stage for record in self.records):
+            stages = ", ".join(dict.fromkeys(record.name for record in self.records))
+            print(f"Stage '{self.profile_stage}' did not run, nothing was profiled. Stages of this run: {stages}")
+            return
+
+        profile_path = self.compose_profile_path()
+        print(f"\ncProfile of stage '{self.profile_stage}' (top 20 by cumulative time), saved as {profile_path}:")
+        self.cprofile.dump_stats(profile_path)
+        pstats.Stats(self.cprofile, stream=sys.stdout).sort_stats("cumulative").print_stats(20)
+
+    def print_summary(self, summary:pd.DataFrame):
+        print(f"\n{'stage':<28} {'runs':>5} {'wall (s)':>9} {'cpu (s)':>9} {'peak RSS (MB)':>14} {'rows in':>10} {'rows out':>10}")
+        for _, stage in summary.iterrows():
+            name = ("  " if stage["parent"] else "") + stage["stage"]
+            rows_in = "" if pd.isna(stage["rows_in"]) else f"{int(stage['rows_in'])}"
+            rows_out = "" if pd.isna(stage["rows_out"]) else f"{int(stage['rows_out'])}"
+            print(f"{name:<28} {stage['runs']:>5} {stage['wall_time']:>9.2f} {stage['cpu_time']:>9.2f} "
+                    f"{stage['peak_rss'] / 1e6:>14.0f} {rows_in:>10} {rows_out:>10}")
+
+    def finish(self):
+        """
+        Print the stage summary and write the report, the metrics and the profile that were asked for.
+        """
+        self.run_sampler.stop()
+        report = self.compose_report()
+        self.print_summary(summary=self.summarize())
+
+        if self.profile_stage:
+            self.save_profile()
+        if self.report_path:
+            self.save_report(report=report, report_path=self.report_path)
+        if self.metrics_path:
+            self.save_prometheus(report=report, metrics_path=self.metrics_path)
+        return report
+
+
+def profiled_stage(name:str):
+    """
+    Runs the method as a profiler stage when self.profiler is set. Rows in are the rows of the
+    dataframes/arrays passed to it, rows out the rows of what it returns.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, "profiler", None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+
+            with profiler.stage(name, rows_in=count_rows(list(args) + list(kwargs.values()))) as record:
+                result = method(self, *args, **kwargs)
+                record.rows_out = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def create_profiler(pipeline:str, options:list, labels:dict=None):
+    """
+    (profiler, other options) from the command line options. A profiler is created when any of
+    --profile=<stage>, --report=<file.json> or --metrics=<file.prom> is given, otherwise None.
+    """
+    settings = {}
+    other_options = []
+    for option in options:
+        if option.startswith(PROFILING_OPTIONS):
+            key, value = option.split("=", 1)
+            settings[key.strip("-")] = value
+        else:
+            other_options.append(option)
+
+    if not settings:
+        return None, other_options
+
+    profiler = StageProfiler(pipeline=pipeline,
+                                profile_stage=settings.get("profile"),
+                                report_path=settings.get("report"),
+                                metrics_path=settings.get("metrics"),
+                                labels=labels)
+    return profiler, other_options
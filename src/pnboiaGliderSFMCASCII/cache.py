@@ -0,0 +1,55 @@
+"""
+PNBoia Glider SFMC ASCII Data Processor - parsed files cache
+Author: Thiago Caminha
+version: 0.0.1
+
+On-disk cache of the parsed SFMC *.txt files, so a refresh only parses the files that are new or
+changed since the last run.
+"""
+
+import os
+import pickle
+import hashlib
+
+
+class ParsedFileCache():
+    """
+    One pickle per source file, named after its absolute path. An entry is only used while the file
+    keeps the size and mtime it had when it was parsed, and was written by the current parser.
+    """
+
+    # bump whenever the parsed output changes (columns, dtypes, time handling)
+    format_version = 2
+
+    def __init__(self, cache_dir:str=None):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.getenv("PNBOIA_GLIDER_CACHE_DIR",
+                                                os.path.join(os.path.expanduser("~"), ".cache", "pnboia_glider")),
+                                    "sfmc")
+        self.cache_dir = cache_dir
+
+    def compose_cache_path(self, filepath:str):
+        key = hashlib.sha1(os.path.abspath(filepath).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def file_signature(self, filepath:str):
+        stat = os.stat(filepath)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "format_version": self.format_version}
+
+    def load(self, filepath:str):
+        cache_path = self.compose_cache_path(filepath)
+        if not os.path.exists(cache_path):
+            return None
+        with open(cache_path, "rb") as file:
+            entry = pickle.load(file)
+        if entry["signature"] != self.file_signature(filepath):
+            return None
+        return entry["parsed"]
+
+    def save(self, filepath:str, parsed):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self.compose_cache_path(filepath)
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as file:
+            pickle.dump({"signature": self.file_signature(filepath), "parsed": parsed}, file)
+        os.replace(temporary_path, cache_path)
@@ -0,0 +1,98 @@
+"""
+PNBoia Glider SFMC ASCII Data Processor - time series decimation
+Author: Thiago Caminha
+version: 0.0.1
+
+Min/max downsampling of the science time series and the resolution levels the timeseries plot
+switches between as the user zooms in.
+"""
+
+import numpy as np
+import json
+
+
+def minmax_decimate(y:np.ndarray, max_points:int):
+    """
+    Indices of the samples to keep so that at most max_points remain: the min and the max of each
+    of max_points / 2 consecutive buckets, which keeps the spikes a plain stride would drop.
+    """
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+
+    n_buckets = max(max_points // 2, 1)
+    bucket_size = -(-n // n_buckets)
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+
+    # buckets entirely past the end of the series are skipped
+    valid = ~np.isnan(buckets).all(axis=1)
+    rows = np.arange(n_buckets)[valid] * bucket_size
+    minimum = rows + np.nanargmin(buckets[valid], axis=1)
+    maximum = rows + np.nanargmax(buckets[valid], axis=1)
+    return np.unique(np.concatenate([minimum, maximum]))
+
+
+def build_resolution_levels(x:np.ndarray, y:np.ndarray, levels:tuple=(2_000, 10_000, 50_000)):
+    """
+    [(x, y), ...] from the coarsest to the finest level. x is in epoch milliseconds, as read by a
+    plotly date axis.
+    """
+    resolution_levels = []
+    for max_points in sorted(levels):
+        indices = minmax_decimate(y=y, max_points=max_points)
+        resolution_levels.append((x[indices], y[indices]))
+        if len(indices) == len(y):
+            break
+    return resolution_levels
+
+
+def compose_zoom_script(traces_levels:list, target_points:int=2_000):
+    """
+    post_script for plotly's write_html: on every zoom/pan each trace is restyled with the coarsest
+    level that still shows target_points samples in the visible range.
+    """
+    levels = [{"trace": trace,
+                "span": float(levels[-1][0][-1] - levels[-1][0][0]) if len(levels[-1][0]) else 0.0,
+                "levels": [{"x": np.round(x).tolist(), "y": np.where(np.isnan(y), None, y).tolist()} for x, y in levels]}
+                for trace, levels in traces_levels]
+
+    return """
+var gd = document.getElementById('{plot_id}');
+var levels = %s;
+var target = %d;
+// the page starts on the coarsest level
+var current = {};
+levels.forEach(function(trace) { current[trace.trace] = 0; });
+function toMs(value) {
+    return typeof value === 'number' ? value : Date.parse(String(value).replace(' ', 'T'));
+}
+gd.on('plotly_relayout', function(event) {
+    var range = event['xaxis.range'] || [event['xaxis.range[0]'], event['xaxis.range[1]']];
+    var span;
+    if (event['xaxis.autorange']) {
+        span = Infinity;
+    } else if (range[0] !== undefined && range[1] !== undefined) {
+        span = Math.abs(toMs(range[1]) - toMs(range[0]));
+    } else {
+        return;
+    }
+    var traces = [], xs = [], ys = [];
+    levels.forEach(function(trace) {
+        var k = 0;
+        while (k < trace.levels.length - 1 && trace.levels[k].x.length * span / trace.span < target) {
+            k++;
+        }
+        if (current[trace.trace] !== k) {
+            current[trace.trace] = k;
+            traces.push(trace.trace);
+            xs.push(trace.levels[k].x);
+            ys.push(trace.levels[k].y);
+        }
+    });
+    if (traces.length) {
+        Plotly.restyle(gd, {x: xs, y: ys}, traces);
+    }
+});
+""" % (json.dumps(levels), target_points)
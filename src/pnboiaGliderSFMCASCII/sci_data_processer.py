@@ -1,10 +1,18 @@
 import pandas as pd
+import numpy as np
+import plotly
 import plotly.graph_objs as go
+from pnboiaGliderSFMCASCII.decimate import build_resolution_levels, compose_zoom_script
+from pnboiaGliderSFMCASCII.cache import ParsedFileCache
+from pnboiaGliderProfiling.profiler import StageProfiler, profiled_stage, create_profiler
 from datetime import datetime, timedelta
 import glob
+from concurrent.futures import ThreadPoolExecutor
 import webbrowser
 import os
 import sys
+import json
+import hashlib
 
 class SFMCGliderData():
     """
@@ -12,60 +20,92 @@ class SFMCGliderData():
 
     """
 
-    def __init__(self, folder_path:str):
+    # bump whenever plot_timeseries changes how the figure looks, so the artifact is written again
+    renderer_version = 1
+
+    def __init__(self, folder_path:str, workers:int=4, use_cache:bool=True, cache_dir:str=None,
+                    save_html:bool=False, profiler:StageProfiler=None):
         self.output_html_file_name = "glider_sci_data_timeseries.html"
         self.output_csv_file_name = "glider_sci_data_timeseries.csv"
+        # points the flight map to the current content-hashed plot
+        self.output_artifact_manifest_file_name = "glider_sci_data_timeseries.json"
+
 
+        self.workers = workers
+        self.profiler = profiler
+        self.cache = ParsedFileCache(cache_dir=cache_dir) if use_cache else None
 
         self.raw_data = self.load_all_files(folder_path=folder_path)
         self.units = self.get_units(data=self.raw_data)
 
         self.sci_data = self.process_data(data=self.raw_data)
         self.timeseries = self.plot_timeseries(data=self.sci_data)
-        self.save_plot_as_html(plot=self.timeseries, file_name=self.output_html_file_name)
+        # standalone page with plotly.js inlined, only when asked for
+        if save_html:
+            self.save_plot_as_html(plot=self.timeseries, file_name=self.output_html_file_name)
+        self.artifact_file_name = self.save_plot_artifact(plot=self.timeseries, data=self.sci_data)
 
     def grab_txt_files(self, folder_path:str):
         folder_path = os.path.join(folder_path, "*.txt")
-        return glob.glob(folder_path, recursive=False)
-
-    def load_individual_file(self, filepath:str, sep:str=","):
-        return pd.read_csv(filepath, sep=sep)
-
+        return sorted(glob.glob(folder_path, recursive=False))
+
+    def load_individual_file(self, filepath:str, sep:str=" "):
+        """
+        (data, units) of one SFMC ascii file: parameter names and units are its first two lines.
+        """
+        with open(filepath, "r") as file:
+            names = file.readline().split()
+            units = file.readline().split()
+
+        # the body is parsed straight into its final dtypes, and lines end with the separator,
+        # which adds an empty last column
+        data_types = self.get_data_types(names=names)
+        data = pd.read_csv(filepath, sep=sep, skiprows=2, header=None, engine="pyarrow",
+                            dtype={index: data_types[name] for index, name in enumerate(names)})
+        data = data.iloc[:, :len(names)]
+        data.columns = names
+        return data, dict(zip(names, units))
+
+    def load_cached_file(self, filepath:str):
+        parsed = self.cache.load(filepath) if self.cache else None
+        if parsed is None:
+            parsed = self.load_individual_file(filepath)
+            if self.cache:
+                self.cache.save(filepath, parsed)
+        return parsed
+
+    @profiled_stage("load")
     def load_all_files(self, folder_path:str):
         print("\nLoading the files:")
         files = self.grab_txt_files(folder_path=folder_path)
+        if not files:
+            raise Exception("Unnable to load data files. Make sure the correct path is being passed.")
+
         for file in files:
             print("-", file)
-            if 'global_data' not in locals():
-                global_data = self.load_individual_file(file, sep=" ")
-            else:
-                data = self.load_individual_file(file, sep=" ")
-                global_data = self.merge_sci_data(data1=global_data, data2=data)
-
-        # global_data = global_data[global_data.columns.sort_values()]
-        if 'global_data' not in locals():
-            raise Exception("Unnable to load data files. Make sure the correct path is being passed.")
-        else:
-            return global_data
-
-
-    def convert_data_types(self, data:pd.DataFrame):
-        data_types= {"time": int,
-                     "m_depth": float,
-                     "sci_seaowl_fdom_scaled": float,
-                     "sci_rbrctd_salinity_00": float,
-                     "sci_oxy4_oxygen": float,
-                     "sci_rbrctd_pressure_00": float,
-                     "sci_seaowl_chl_sig": float,
-                     "sci_rbrctd_temperature_00": float,
-                     "sci_oxy4_saturation": float,
-                     "sci_rbrctd_conductivity_00": float
-                }
-        for column in data_types:
-            if column in data.columns:
-                data[column] = data[column].astype(data_types[column])
 
-        return data
+        # pyarrow releases the GIL while parsing, so threads are enough
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            parsed = list(executor.map(self.load_cached_file, files))
+
+        self.files_units = [units for _, units in parsed]
+        return self.merge_sci_data(data=[data for data, _ in parsed])
+
+
+    def get_data_types(self, names:list):
+        data_types= {"time": "int64",
+                     "m_depth": "float64",
+                     "sci_seaowl_fdom_scaled": "float64",
+                     "sci_rbrctd_salinity_00": "float64",
+                     "sci_oxy4_oxygen": "float64",
+                     "sci_rbrctd_pressure_00": "float64",
+                     "sci_seaowl_chl_sig": "float64",
+                     "sci_rbrctd_temperature_00": "float64",
+                     "sci_oxy4_saturation": "float64",
+                     "sci_rbrctd_conductivity_00": "float64"
+                }
+        # any other sensor is read as float
+        return {name: data_types.get(name, "float64") for name in names}
 
 
     def drop_unwanted_columns(self, data:pd.DataFrame):
@@ -73,45 +113,67 @@ class SFMCGliderData():
         return data.drop(columns=columns_to_drop)
 
     def get_units(self, data:pd.DataFrame):
-        params = data.columns
-        units = data.iloc[0].values
-        units_params = dict(zip(params,units))
+        # the first file listing a parameter gives its unit
+        units_params = {}
+        for units in self.files_units:
+            for param, unit in units.items():
+                units_params.setdefault(param, unit)
+        units_params = {param: units_params[param] for param in data.columns if param in units_params}
         self.units_params = units_params
         return units_params
 
-    def drop_units_row(self, data:pd.DataFrame):
-        return data.drop(index=0)
-
     def timestamp_to_datetime(self, timestamp:pd.Series):
-        return timestamp.apply(lambda x : datetime.fromtimestamp(x))
+        # SFMC times are epoch seconds in UTC
+        return pd.to_datetime(timestamp, unit="s", utc=True)
 
     def rename_columns(self):
         pass
 
-    def merge_sci_data(self, data1:pd.DataFrame, data2:pd.DataFrame):
-        return pd.merge(data1, data2.drop(columns=["m_depth"]), on="time", how="outer")
-
+    @profiled_stage("merge")
+    def merge_sci_data(self, data:list):
+        """
+        Outer join of every file on time in one step: rows of all files are stacked and each time
+        keeps the first value found for every parameter (m_depth comes from the first file having it).
+        """
+        return (pd.concat(data, ignore_index=True, sort=False)
+                .groupby("time", sort=True)
+                .first()
+                .reset_index())
+
+    @profiled_stage("process")
     def process_data(self, data:pd.DataFrame):
         print("\nProcessing the data...")
         data = self.drop_unwanted_columns(data=data)
-        data = self.drop_units_row(data=data)
 
-        data = self.convert_data_types(data=data)
         date_time = self.timestamp_to_datetime(timestamp=data['time'])
         data.insert(0, column="date_time", value=date_time)
         data = data.set_index("date_time").sort_index(ascending=False)
 
         return data
 
-    def plot_timeseries(self, data:pd.DataFrame):
+    @profiled_stage("plot")
+    def plot_timeseries(self, data:pd.DataFrame, resolution_levels:tuple=(2_000, 10_000, 50_000)):
+        """
+        One WebGL trace per parameter holding the coarsest min/max level. The finer levels are kept in
+        the page script (self.timeseries_zoom_script) and swapped in as the user zooms, so the page
+        size is bounded by resolution_levels whatever the mission length.
+        """
         traces = []
+        traces_levels = []
         parameters = data.drop(columns="time").columns
 
-        for parameter in parameters:
-            trace = go.Scatter(x=data.index, y=data[parameter],
+        for index, parameter in enumerate(parameters):
+            series = data[parameter].dropna().sort_index()
+            time_ms = series.index.values.astype("datetime64[ms]").astype(np.int64).astype(float)
+            levels = build_resolution_levels(x=time_ms, y=series.to_numpy(dtype=float), levels=resolution_levels)
+            traces_levels.append((index, levels))
+
+            trace = go.Scattergl(x=pd.to_datetime(levels[0][0], unit="ms"), y=levels[0][1],
                                 mode='lines+markers', name=parameter)
             traces.append(trace)
 
+        self.timeseries_zoom_script = compose_zoom_script(traces_levels=traces_levels)
+
         layout = go.Layout(
             title_text="Glider Science Data",
             title_font_size=20,
@@ -126,6 +188,7 @@ class SFMCGliderData():
                         dict(label="Todo o período", step="all")
                     ])
                 ),
+                type="date",
                 title="Datahora",
                 title_font=dict(size=14),
                 showgrid=True,
@@ -164,9 +227,48 @@ class SFMCGliderData():
 
         return fig
 
+    @profiled_stage("save_html")
     def save_plot_as_html(self, plot, file_name:str):
         print(f"\nSaving plot as {file_name}")
-        plot.write_html(os.path.join("htmls/", file_name))
+        plot.write_html(os.path.join("htmls/", file_name), post_script=self.timeseries_zoom_script)
+
+    def compute_data_hash(self, data:pd.DataFrame):
+        """
+        Hash of the data and of what renders it: renderer_version, the plotly version and the zoom script.
+        """
+        hashed = hashlib.sha1(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+        hashed.update(",".join(map(str, data.columns)).encode())
+        hashed.update(f"{self.renderer_version},{plotly.__version__}".encode())
+        hashed.update(getattr(self, "timeseries_zoom_script", "").encode())
+        return hashed.hexdigest()[:16]
+
+    def load_artifact_manifest(self):
+        manifest_path = os.path.join("htmls/", self.output_artifact_manifest_file_name)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+
+    @profiled_stage("save_artifact")
+    def save_plot_artifact(self, plot, data:pd.DataFrame):
+        """
+        Standalone copy of the plot named after the hash of its data, loading plotly.js from the CDN,
+        for the flight map to open on demand. Unchanged data reuses the existing file. Previous
+        artifacts are kept, as a deployed map may still load them, until KMZParser has rebuilt the map.
+        """
+        data_hash = self.compute_data_hash(data=data)
+        file_name = f"{os.path.splitext(self.output_html_file_name)[0]}.{data_hash}.html"
+
+        if os.path.exists(os.path.join("htmls/", file_name)):
+            print(f"\nScience plot artifact {file_name} is up to date")
+        else:
+            print(f"\nSaving science plot artifact as {file_name}")
+            plot.write_html(os.path.join("htmls/", file_name), include_plotlyjs="cdn", full_html=True,
+                            post_script=self.timeseries_zoom_script)
+
+        with open(os.path.join("htmls/", self.output_artifact_manifest_file_name), "w") as file:
+            json.dump({"file_name": file_name, "data_hash": data_hash}, file, indent=2)
+        return file_name
 
     def open_timeseries_in_webbrowser(self, html_file_path):
         webbrowser.open(os.path.join("file://", html_file_path), new=2)
@@ -176,15 +278,19 @@ if __name__ == "__main__":
     print("="*30)
     print("RUNNING GLIDER SCI DATA PROCESSOR")
 
-    gd = SFMCGliderData(folder_path="data/")
+    profiler, options = create_profiler(pipeline="sfmc", options=sys.argv[1:])
+    save_html = any(option in ("-sh", "--save-html") for option in options)
+    gd = SFMCGliderData(folder_path="data/", save_html=save_html, profiler=profiler)
 
     print(f"\nSaving data as {gd.output_csv_file_name}")
     gd.sci_data.to_csv(os.path.join("data/",gd.output_csv_file_name))
 
     print("\nSUCCESSFULL PROCESSING")
 
-    if len(sys.argv) > 1:
-        if sys.argv[1] in ("-ots", "--open-timeseries"):
-            print("\nOpenning timeseries in your default webbrowser...")
-            html_file_path = os.path.join(os.getcwd(),"htmls/", gd.output_html_file_name)
-            gd.open_timeseries_in_webbrowser(html_file_path=html_file_path)
+    if profiler:
+        profiler.finish()
+
+    if any(option in ("-ots", "--open-timeseries") for option in options):
+        print("\nOpenning timeseries in your default webbrowser...")
+        html_file_path = os.path.join(os.getcwd(),"htmls/", gd.artifact_file_name)
+        gd.open_timeseries_in_webbrowser(html_file_path=html_file_path)
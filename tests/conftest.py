@@ -0,0 +1,30 @@
+import os
+import zipfile
+import pytest
+from tests.kml import compose_kml
+
+
+@pytest.fixture
+def write_kmz(tmp_path):
+    """
+    Writes a kmz in tmp_path/kmz (replacing the previous one) and returns its folder.
+    """
+    folder = tmp_path / "kmz"
+    folder.mkdir()
+
+    def write(n_placemarks:int=5, first:int=0, kml:str=None):
+        with zipfile.ZipFile(folder / "unit_000.kmz", "w", compression=zipfile.ZIP_DEFLATED) as kmz:
+            kmz.writestr("doc.kml", kml if kml is not None else compose_kml(n_placemarks=n_placemarks, first=first))
+        return str(folder)
+
+    return write
+
+
+@pytest.fixture
+def htmls(tmp_path, monkeypatch):
+    """
+    Runs the test in tmp_path, with the htmls/ folder the map and the science plot are written to.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("htmls")
+    return tmp_path / "htmls"
@@ -0,0 +1,31 @@
+def point(prefix:str, i:int, description:str):
+    return (f"<Placemark><name>{prefix}{i}</name><description><![CDATA[{description}]]></description>"
+            f"<Point><coordinates>{-43 + i * 1e-4:.5f},{-23 + i * 1e-4:.5f},0</coordinates></Point></Placemark>")
+
+
+def line(prefix:str, i:int, description:str):
+    return (f"<Placemark><name>{prefix}{i}</name><description>{description}</description><LineString>"
+            f"<coordinates>{-43 + i * 1e-4:.5f},-23.00000,0 {-42.995 + i * 1e-4:.5f},-23.00500,0</coordinates>"
+            f"</LineString></Placemark>")
+
+
+def compose_kml(n_placemarks:int, first:int=0):
+    """
+    A small SFMC-like kml with n_placemarks per folder, numbered from first.
+    """
+    def gps_time(i):
+        return f"Time of GPS Position: 2024-01-01 {i // 60 % 24:02d}:{i % 60:02d}:00"
+
+    placemarks = range(first, first + n_placemarks)
+    folders = {
+        "Surfacings": [point("s", i, gps_time(i)) for i in placemarks],
+        "Surface Movements": [point("m", i, gps_time(i)) for i in placemarks],
+        "Glider Tracks": [line("t", i, f"Range: {i * 10.5:.1f}m Time: 1h Speed: 0.{i % 9 + 1}m/s @ {i * 37 % 360}deg")
+                            for i in placemarks],
+        "Depth Averaged Current Vectors": [line("c", i, f"Speed: 0.{i % 9 + 1}m/s @ {i * 37 % 360}deg")
+                                            for i in placemarks],
+        "Planned Waypoints": [point("w", i, "Waypoint") for i in range(3)],
+    }
+    body = "".join(f"<Folder><name>{name}</name>{''.join(folder)}</Folder>" for name, folder in folders.items())
+    return ('<?xml version="1.0" encoding="UTF-8"?><kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+            f"<name>unit_000</name>{body}</Document></kml>")
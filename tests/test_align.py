@@ -0,0 +1,75 @@
+import numpy as np
+from pnboiaGliderBinary.align import interpolate_onto, align_eng_to_sci
+from pnboiaGliderBinary.fetch import ParameterBatch
+
+
+def test_interpolates_between_samples():
+    result = interpolate_onto(target_time=[15, 25], time=[10, 20, 30], values=[0, 10, 30])
+    np.testing.assert_allclose(result, [5, 20])
+
+
+def test_gap_over_max_gap_is_nan():
+    result = interpolate_onto(target_time=[15, 150, 1005], time=[10, 20, 1000, 1010], values=[0, 10, 20, 30],
+                                max_gap=600)
+    np.testing.assert_allclose(result, [5, np.nan, 25])
+
+
+def test_gap_equal_to_max_gap_is_interpolated():
+    result = interpolate_onto(target_time=[5], time=[0, 10], values=[0, 10], max_gap=10)
+    np.testing.assert_allclose(result, [5])
+
+
+def test_brackets_across_segment_boundary_are_nan():
+    # second segment starts at 20: samples at 10 and 20 belong to different segments
+    result = interpolate_onto(target_time=[5, 15, 25], time=[0, 10, 20, 30], values=[0, 10, 20, 30],
+                                boundaries=np.array([20.0]))
+    np.testing.assert_allclose(result, [5, np.nan, 25])
+
+
+def test_exact_hits_are_taken_as_they_are():
+    # even across a boundary or a gap the sample itself is known
+    result = interpolate_onto(target_time=[10, 20], time=[0, 10, 20, 1000], values=[0, 1, 2, 3],
+                                max_gap=5, boundaries=np.array([20.0]))
+    np.testing.assert_allclose(result, [1, 2])
+
+
+def test_targets_outside_the_samples_are_nan():
+    result = interpolate_onto(target_time=[-5, 0, 30, 35], time=[0, 10, 30], values=[0, 10, 30])
+    np.testing.assert_allclose(result, [np.nan, 0, 30, np.nan])
+
+
+def test_no_samples_gives_nan():
+    result = interpolate_onto(target_time=[1, 2], time=[], values=[])
+    assert np.isnan(result).all()
+
+
+def test_unsorted_times_are_sorted():
+    result = interpolate_onto(target_time=[5, 15], time=[20, 0, 10], values=[20, 0, 10])
+    np.testing.assert_allclose(result, [5, 15])
+
+
+def test_duplicate_times_keep_the_last_sample():
+    # overlapping files: the later of two samples at 10 wins
+    result = interpolate_onto(target_time=[10, 15], time=[0, 10, 20, 10], values=[0, 1, 20, 10])
+    np.testing.assert_allclose(result, [10, 15])
+
+
+def test_align_eng_to_sci_adds_eng_columns_on_sci_time():
+    batch = ParameterBatch(names=["sci_water_temp", "m_depth"],
+                            times=[np.array([5.0, 15.0, 700.0]), np.array([0.0, 10.0, 20.0, 1000.0])],
+                            values=[np.array([20.0, 21.0, 22.0]), np.array([0.0, 10.0, 20.0, 30.0])])
+    data = align_eng_to_sci(batch, science_parameters=["sci_water_temp"], engineering_parameters=["m_depth"],
+                            max_gap=600)
+
+    assert list(data.columns) == ["time", "sci_water_temp", "m_depth"]
+    np.testing.assert_allclose(data["time"], [5, 15, 700])
+    np.testing.assert_allclose(data["sci_water_temp"], [20, 21, 22])
+    np.testing.assert_allclose(data["m_depth"], [5, 15, np.nan])
+
+
+def test_align_eng_to_sci_without_sci_samples():
+    batch = ParameterBatch(names=["sci_water_temp", "m_depth"], times=[np.array([]), np.array([0.0, 10.0])],
+                            values=[np.array([]), np.array([0.0, 10.0])])
+    data = align_eng_to_sci(batch, science_parameters=["sci_water_temp"], engineering_parameters=["m_depth"])
+    assert data.empty
+    assert list(data.columns) == ["time", "sci_water_temp", "m_depth"]
@@ -0,0 +1,185 @@
+import csv
+import re
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from pnboiaGliderDataBase.db import GetData
+
+
+class CopyCursor():
+    """
+    copy_expert of a psycopg2 cursor replayed as an executemany INSERT on SQLite, optionally failing
+    on one COPY chunk.
+    """
+
+    def __init__(self, connection:"CopyConnection"):
+        self.connection = connection
+        self.cursor = connection.connection.cursor()
+
+    def execute(self, statement:str, params=()):
+        self.cursor.execute(statement, params)
+
+    def copy_expert(self, statement:str, buffer):
+        self.connection.chunks += 1
+        if self.connection.chunks == self.connection.fail_on_chunk:
+            raise RuntimeError("COPY failed")
+        table, columns = re.match(r"COPY (\S+) \((.*)\) FROM STDIN", statement).groups()
+        placeholders = ", ".join("?" * len(columns.split(",")))
+        self.cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", csv.reader(buffer))
+
+    def close(self):
+        self.cursor.close()
+
+
+class CopyConnection():
+
+    def __init__(self, connection, fail_on_chunk:int=None):
+        self.connection = connection
+        self.fail_on_chunk = fail_on_chunk
+        self.chunks = 0
+        self.closed = False
+
+    def cursor(self):
+        return CopyCursor(self)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.closed = True
+
+
+class StandInDatabase(GetData):
+    """
+    GetData on an in-memory SQLite database with data.data, over an Engine or a caller's Connection.
+    """
+
+    fail_on_chunk = None
+
+    def __init__(self, conn):
+        super().__init__(conn=conn)
+        self.raw = None
+
+    def raw_connection(self):
+        engine = self.conn if self.owns_connection() else self.conn.engine
+        self.raw = CopyConnection(engine.raw_connection().driver_connection, fail_on_chunk=self.fail_on_chunk)
+        return self.raw
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda connection, _: connection.execute("ATTACH DATABASE ':memory:' AS data"))
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE data.data (parameter_id INTEGER, value REAL, date_time TEXT, "
+                                    "mission_id INTEGER)")
+    return engine
+
+
+def rows(n_rows:int, mission_id:int=1, first_value:float=0):
+    return pd.DataFrame({"parameter_id": 1, "value": [first_value + i for i in range(n_rows)],
+                            "date_time": [f"2024-01-01 00:00:{i:02d}" for i in range(n_rows)],
+                            "mission_id": mission_id})
+
+
+def stored(engine):
+    return pd.read_sql("SELECT * FROM data.data ORDER BY mission_id, date_time", engine)
+
+
+@pytest.mark.parametrize("n_rows, chunksize, chunks", [(7, 3, 3), (6, 3, 2), (3, 3, 1), (2, 5, 1)])
+def test_copy_chunk_boundaries(engine, n_rows, chunksize, chunks):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(n_rows), chunksize=chunksize)
+
+    assert db.raw.chunks == chunks
+    assert list(stored(engine).value) == list(range(n_rows))
+
+
+def test_failing_chunk_rolls_back_every_chunk(engine):
+    db = StandInDatabase(conn=engine)
+    db.fail_on_chunk = 3
+    with pytest.raises(RuntimeError):
+        db.post(table="data", schema="data", data=rows(9), chunksize=3)
+
+    assert stored(engine).empty
+
+
+def test_overwrite_deletes_and_copies_in_one_transaction(engine):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(4))
+    db.post(table="data", schema="data", data=rows(3, mission_id=2))
+
+    db.post(table="data", schema="data", data=rows(2, first_value=10), overwrite=True, mission_id=["=", 1])
+
+    data = stored(engine)
+    assert list(data[data.mission_id == 1].value) == [10, 11]
+    assert len(data[data.mission_id == 2]) == 3
+
+
+def test_failing_copy_keeps_the_deleted_rows(engine):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(4))
+
+    db.fail_on_chunk = 2
+    with pytest.raises(RuntimeError):
+        db.post(table="data", schema="data", data=rows(4, first_value=10), chunksize=2, overwrite=True,
+                mission_id=["=", 1])
+
+    assert list(stored(engine).value) == [0, 1, 2, 3]
+
+
+def test_connections_opened_from_an_engine_are_closed(engine):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(2))
+    assert db.raw.closed
+
+
+def test_caller_connections_stay_open(engine):
+    with engine.connect() as connection:
+        db = StandInDatabase(conn=connection)
+        db.post(table="data", schema="data", data=rows(2))
+        assert not db.raw.closed
+        assert connection.exec_driver_sql("SELECT count(*) FROM data.data").scalar() == 2
+
+
+def test_raw_connection_of_a_caller_connection_is_its_own(engine):
+    with engine.connect() as connection:
+        db = GetData(conn=connection)
+        assert not db.owns_connection()
+        assert db.raw_connection() is connection.connection
+
+
+def test_insert_method_with_overwrite(engine):
+    db = GetData(conn=engine)
+    db.post(table="data", schema="data", data=rows(3), method="insert")
+    db.post(table="data", schema="data", data=rows(1, first_value=5), method="insert", overwrite=True,
+            mission_id=["=", 1])
+    assert list(stored(engine).value) == [5]
+
+
+def test_unknown_method(engine):
+    with pytest.raises(ValueError):
+        GetData(conn=engine).post(table="data", schema="data", data=rows(1), method="upsert")
+
+
+def test_delete_with_filters(engine):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(3))
+    db.post(table="data", schema="data", data=rows(2, mission_id=2))
+
+    db.delete(table="data", schema="data", mission_id=["=", 1])
+    assert list(stored(engine).mission_id) == [2, 2]
+
+
+def test_delete_with_the_former_query_argument(engine):
+    db = StandInDatabase(conn=engine)
+    db.post(table="data", schema="data", data=rows(3))
+    db.post(table="data", schema="data", data=rows(2, mission_id=2))
+
+    with pytest.warns(DeprecationWarning):
+        db.delete("data", "data", " AND mission_id = '2'")
+    assert list(stored(engine).mission_id) == [1, 1, 1]
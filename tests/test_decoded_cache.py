@@ -0,0 +1,206 @@
+import json
+import os
+import dbdreader
+import numpy as np
+import pytest
+from pnboiaGliderBinary.decoded_cache import DecodedParameterCache
+from pnboiaGliderBinary.fetch import fetch_parameters
+
+
+DATA_PATH = os.path.join(os.path.dirname(dbdreader.__file__), "data")
+PATTERNS = ["amadeus-2014-*.[st]bd", "amadeus-2014-*.[de]bd", "sebastian-2014-*.[de]bd"]
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(DATA_PATH), reason="dbdreader without its example data")
+
+
+def open_bd(pattern:str):
+    return dbdreader.MultiDBD(pattern=os.path.join(DATA_PATH, pattern), cacheDir=os.path.join(DATA_PATH, "cac"))
+
+
+def select_parameters(bd):
+    # a slice of the (thousands of) .dbd parameters, with lat/lon, converted to decimal degrees
+    eng = [parameter for parameter in ["m_lat", "m_lon"] if parameter in bd.parameterNames["eng"]]
+    return eng + bd.parameterNames["eng"][:15] + bd.parameterNames["sci"]
+
+
+def assert_same_batches(expected, result):
+    assert expected.names == result.names
+    for (_, expected_time, expected_values), (_, time, values) in zip(expected, result):
+        np.testing.assert_array_equal(expected_time, time)
+        np.testing.assert_array_equal(expected_values, values)
+
+
+class DecodeSpy():
+    """
+    Records the parameters decoded per file.
+    """
+
+    def __init__(self, cache:DecodedParameterCache):
+        self.calls = []
+        self.decode = cache.decode
+        cache.decode = self
+
+    def __call__(self, dbd, parameters:list):
+        self.calls.append((os.path.basename(dbd.filename), list(parameters)))
+        return self.decode(dbd, parameters=parameters)
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_cold_and_warm_runs_match_dbdreader(pattern, tmp_path):
+    bd = open_bd(pattern)
+    parameters = select_parameters(bd)
+    expected = fetch_parameters(bd, parameters=parameters)
+
+    cold = fetch_parameters(bd, parameters=parameters, cache=DecodedParameterCache(cache_dir=str(tmp_path)))
+    warm = fetch_parameters(bd, parameters=parameters, cache=DecodedParameterCache(cache_dir=str(tmp_path)))
+
+    assert_same_batches(expected, cold)
+    assert_same_batches(expected, warm)
+
+
+def test_time_limits_are_honoured(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    bd.set_time_limits(minTimeUTC="24 Jul 2014 18:00")
+    assert bd._ignore_cache
+    parameters = select_parameters(bd)
+
+    expected = fetch_parameters(bd, parameters=parameters)
+    result = fetch_parameters(bd, parameters=parameters, cache=DecodedParameterCache(cache_dir=str(tmp_path)))
+    assert_same_batches(expected, result)
+
+
+def test_warm_run_decodes_nothing(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    DecodedParameterCache(cache_dir=str(tmp_path)).get(bd, parameters=["m_depth", "sci_water_temp"])
+
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    spy = DecodeSpy(cache)
+    cache.get(bd, parameters=["m_depth", "sci_water_temp"])
+    assert spy.calls == []
+
+
+def test_partial_miss_decodes_only_the_new_parameters(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    cache.get(bd, parameters=["m_depth"])
+
+    spy = DecodeSpy(cache)
+    result = cache.get(bd, parameters=["m_depth", "m_pitch"])
+
+    assert spy.calls and all(parameters == ["m_pitch"] for _, parameters in spy.calls)
+    expected = bd.get("m_depth", "m_pitch")
+    for (expected_time, expected_values), (time, values) in zip(expected, result):
+        np.testing.assert_array_equal(expected_time, time)
+        np.testing.assert_array_equal(expected_values, values)
+
+
+def test_vanished_array_is_decoded_again(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    expected = cache.get(bd, parameters=["m_depth"])
+
+    # another process evicts the entry between the existence check and the read
+    load_array = cache.load_array
+    def evicting_load_array(array_path:str):
+        os.remove(array_path)
+        cache.load_array = load_array
+        return load_array(array_path)
+    cache.load_array = evicting_load_array
+
+    result = cache.get(bd, parameters=["m_depth"])
+    np.testing.assert_array_equal(expected[0][1], result[0][1])
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    cache.get(bd, parameters=["m_depth"])
+    entries = sorted(cache.entries.items(), key=lambda item: item[1]["last_used"])
+    oldest, newest = entries[0][0], entries[-1][0]
+
+    # keep only the most recently used entry
+    cache.max_size = cache.entries[newest]["size"]
+    cache.evict()
+    cache.save_entries()
+
+    assert newest in cache.entries and oldest not in cache.entries
+    assert not os.path.exists(os.path.join(str(tmp_path), oldest))
+    assert os.path.isdir(os.path.join(str(tmp_path), newest))
+    with open(cache.compose_entries_path(), "r") as file:
+        assert list(json.load(file)) == [newest]
+
+
+def test_index_sizes_match_the_files(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    cache.get(bd, parameters=["m_depth", "sci_water_temp"])
+
+    for entry_name, entry in cache.entries.items():
+        entry_path = os.path.join(str(tmp_path), entry_name)
+        assert entry["size"] == sum(array.stat().st_size for array in os.scandir(entry_path))
+
+
+def test_index_is_merged_across_processes(tmp_path):
+    eng = open_bd("amadeus-2014-*.sbd")
+    sci = open_bd("amadeus-2014-*.tbd")
+    # both caches load the (empty) index before either saves it
+    first = DecodedParameterCache(cache_dir=str(tmp_path))
+    second = DecodedParameterCache(cache_dir=str(tmp_path))
+
+    first.get(eng, parameters=["m_depth"])
+    second.get(sci, parameters=["sci_water_temp"])
+
+    entries = DecodedParameterCache(cache_dir=str(tmp_path)).entries
+    assert set(entries) == set(first.entries) | set(second.entries)
+    assert len(entries) == len(eng.dbds["eng"]) + len(sci.dbds["sci"])
+
+
+def test_entries_evicted_by_another_process_are_not_brought_back(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    DecodedParameterCache(cache_dir=str(tmp_path)).get(bd, parameters=["m_depth"])
+    stale = DecodedParameterCache(cache_dir=str(tmp_path))
+
+    evicting = DecodedParameterCache(cache_dir=str(tmp_path), max_size=0)
+    evicting.evict()
+    evicting.save_entries()
+    # the stale process saves its (unchanged) view afterwards
+    stale.save_entries()
+
+    assert DecodedParameterCache(cache_dir=str(tmp_path)).entries == {}
+
+
+def test_index_is_built_from_a_cache_without_one(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    cache.get(bd, parameters=["m_depth"])
+    os.remove(cache.compose_entries_path())
+
+    rebuilt = DecodedParameterCache(cache_dir=str(tmp_path))
+    assert {name: entry["size"] for name, entry in rebuilt.entries.items()} == \
+        {name: entry["size"] for name, entry in cache.entries.items()}
+    rebuilt.save_entries()
+    assert os.path.exists(rebuilt.compose_entries_path())
+
+
+class LegacyMultiDBD():
+    """
+    A dbdreader.MultiDBD that does not expose _ignore_cache.
+    """
+
+    def __init__(self, bd):
+        self.bd = bd
+        self.parameterNames = bd.parameterNames
+
+    def get(self, *parameters):
+        return self.bd.get(*parameters)
+
+
+def test_without_ignore_cache_falls_back_to_dbdreader(tmp_path):
+    bd = open_bd("amadeus-2014-*.[st]bd")
+    cache = DecodedParameterCache(cache_dir=str(tmp_path))
+    spy = DecodeSpy(cache)
+
+    result = cache.get(LegacyMultiDBD(bd), parameters=["m_depth"])
+
+    assert spy.calls == []
+    np.testing.assert_array_equal(result[0][1], bd.get("m_depth")[1])
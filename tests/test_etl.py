@@ -0,0 +1,187 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from pnboiaGliderBinary.etl import PNBOIAGlider
+
+
+class FakeDBD():
+    """
+    One binary file: its name, time variable and (time, values) arrays per parameter.
+    """
+
+    def __init__(self, filename:str, time_variable:str, arrays:dict):
+        self.filename = filename
+        self.timeVariable = time_variable
+        self.arrays = arrays
+
+    def get(self, parameter):
+        return self.arrays[parameter]
+
+
+class FakeMultiDBD():
+
+    def __init__(self, filenames:list):
+        self.dbds = {"eng": [], "sci": []}
+        for filename in filenames:
+            # one sample per second, from a start time written in the file
+            with open(filename, "r") as file:
+                start = float(file.read().split()[0])
+            time = start + np.arange(3, dtype=float)
+            if filename.endswith(".sbd"):
+                self.dbds["eng"].append(FakeDBD(filename, "m_present_time", {"m_present_time": (time, time),
+                                                                             "m_depth": (time, time - start)}))
+            else:
+                self.dbds["sci"].append(FakeDBD(filename, "sci_m_present_time", {"sci_m_present_time": (time, time),
+                                                                                 "sci_water_temp": (time, time - start + 20)}))
+        self.parameterNames = {"eng": ["m_depth"], "sci": ["sci_water_temp"]}
+
+    def get(self, *parameters):
+        result = []
+        for parameter in parameters:
+            file_type = "eng" if parameter in self.parameterNames["eng"] else "sci"
+            pairs = [dbd.get(parameter) for dbd in self.dbds[file_type]]
+            result.append((np.hstack([time for time, _ in pairs]), np.hstack([values for _, values in pairs])))
+        return result[0] if len(parameters) == 1 else result
+
+
+class FakeDatabase():
+
+    def __init__(self):
+        self.posted = []
+
+    def get(self, table:str, **kwargs):
+        if table == "glider.missions":
+            return pd.DataFrame({"mission_id": [1], "name": ["test"]})
+        if table == "data.parameters":
+            if kwargs["type"][1] == "ENG":
+                return pd.DataFrame({"id": [1], "name": ["m_depth"], "type": ["ENG"]})
+            return pd.DataFrame({"id": [2], "name": ["sci_water_temp"], "type": ["SCI"]})
+        if table == "data.data":
+            posted = pd.concat(self.posted) if self.posted else pd.DataFrame({"date_time": []})
+            return posted.sort_values("date_time").tail(1)
+        raise ValueError(table)
+
+    def post(self, table:str, schema:str, data:pd.DataFrame):
+        self.posted.append(data.copy())
+
+
+def write_file(folder, name:str, start:float, mtime:float=1_000_000):
+    file_path = os.path.join(folder, name)
+    with open(file_path, "w") as file:
+        file.write(f"{start} ")
+    os.utime(file_path, (mtime, mtime))
+    return file_path
+
+
+@pytest.fixture
+def glider(monkeypatch):
+    g = PNBOIAGlider(mission_id=1, conn=create_engine("sqlite://"), use_decoded_cache=False)
+    g.db = FakeDatabase()
+    g.decoded_filenames = []
+
+    def decode_binary_data(cache_dir:str, pattern:str=None, filenames:list=None):
+        g.decoded_filenames.append(sorted(filenames))
+        return FakeMultiDBD(filenames=filenames)
+
+    monkeypatch.setattr(g, "decode_binary_data", decode_binary_data)
+    return g
+
+
+def select(g, folder):
+    manifest = g.load_manifest(manifest_path=g.compose_manifest_path(binary_files_path=folder, extension=".[st]bd"))
+    return [os.path.basename(file) for file in
+            g.select_new_binary_files(binary_files_path=str(folder), extension=".[st]bd", manifest=manifest)]
+
+
+def process_all(g, folder):
+    files = sorted(os.path.join(folder, file) for file in os.listdir(folder) if file.endswith("bd"))
+    manifest_path = g.compose_manifest_path(binary_files_path=str(folder), extension=".[st]bd")
+    manifest = g.update_manifest(manifest=g.load_manifest(manifest_path=manifest_path), bd=FakeMultiDBD(files))
+    g.save_manifest(manifest=manifest, manifest_path=manifest_path)
+    return manifest
+
+
+def test_everything_is_new_without_manifest(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    assert select(glider, tmp_path) == ["seg-0.sbd", "seg-0.tbd"]
+
+
+def test_processed_files_are_skipped(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    manifest = process_all(glider, tmp_path)
+
+    assert select(glider, tmp_path) == []
+    assert manifest["last_timestamp"] == 2.0
+    assert manifest["files"]["seg-0.tbd"]["last_timestamp"] == 2.0
+
+
+def test_new_segment(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    process_all(glider, tmp_path)
+
+    write_file(tmp_path, "seg-1.sbd", 10)
+    write_file(tmp_path, "seg-1.tbd", 10)
+    assert select(glider, tmp_path) == ["seg-1.sbd", "seg-1.tbd"]
+
+
+def test_grown_file(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    process_all(glider, tmp_path)
+
+    # same mtime, larger size
+    write_file(tmp_path, "seg-0.sbd", 0.25)
+    assert select(glider, tmp_path) == ["seg-0.sbd", "seg-0.tbd"]
+
+
+def test_one_half_of_a_segment_changed(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    write_file(tmp_path, "seg-1.sbd", 10)
+    write_file(tmp_path, "seg-1.tbd", 10)
+    process_all(glider, tmp_path)
+
+    # only the science file of the second segment was rewritten: both of its files are decoded again
+    write_file(tmp_path, "seg-1.tbd", 10, mtime=2_000_000)
+    assert select(glider, tmp_path) == ["seg-1.sbd", "seg-1.tbd"]
+
+
+def test_half_of_a_segment_arrives_later(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    process_all(glider, tmp_path)
+
+    write_file(tmp_path, "seg-0.tbd", 0)
+    assert select(glider, tmp_path) == ["seg-0.sbd", "seg-0.tbd"]
+
+
+def test_incremental_run_decodes_and_posts_only_new_segments(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    assert glider.run_etl(binary_files_path=str(tmp_path), extension=".[st]bd", post=True, incremental=True) == 6
+
+    write_file(tmp_path, "seg-1.sbd", 10)
+    write_file(tmp_path, "seg-1.tbd", 10)
+    assert glider.run_etl(binary_files_path=str(tmp_path), extension=".[st]bd", post=True, incremental=True) == 6
+    assert [[os.path.basename(file) for file in files] for files in glider.decoded_filenames] == \
+        [["seg-0.sbd", "seg-0.tbd"], ["seg-1.sbd", "seg-1.tbd"]]
+
+    posted = pd.concat(glider.db.posted)
+    assert len(posted) == 12
+    assert set(posted.parameter_id) == {1, 2}
+    assert (posted.mission_id == 1).all()
+
+    # nothing new: no decoding at all
+    assert glider.run_etl(binary_files_path=str(tmp_path), extension=".[st]bd", post=True, incremental=True) == 0
+    assert len(glider.decoded_filenames) == 2
+
+
+def test_manifest_is_only_saved_after_posting(glider, tmp_path):
+    write_file(tmp_path, "seg-0.sbd", 0)
+    write_file(tmp_path, "seg-0.tbd", 0)
+    glider.run_etl(binary_files_path=str(tmp_path), extension=".[st]bd", post=False, incremental=True)
+    assert select(glider, tmp_path) == ["seg-0.sbd", "seg-0.tbd"]
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pnboiaGliderBinary.frames import pivot_narrow_dataframe
+
+
+def narrow(rows:list):
+    """
+    Narrow frame indexed by date_time from (seconds, variable, value, data_type) tuples.
+    """
+    seconds, variables, values, data_types = zip(*rows)
+    data = pd.DataFrame({"data_type": data_types, "variable": variables, "value": values},
+                        index=pd.DatetimeIndex(pd.to_datetime(seconds, unit="s"), name="date_time"))
+    return data
+
+
+def test_one_sample_per_cell():
+    data = narrow([(0, "a", 1.0, "engineering"), (0, "b", 2.0, "science"), (1, "a", 3.0, "engineering")])
+    wide = pivot_narrow_dataframe(data)
+
+    assert list(wide.columns) == ["a", "b"]
+    assert list(wide.index) == list(pd.to_datetime([0, 1], unit="s"))
+    np.testing.assert_allclose(wide.to_numpy(), [[1, 2], [3, np.nan]])
+
+
+def test_matches_pandas_pivot():
+    rng = np.random.default_rng(0)
+    rows = [(int(second), f"p{int(p)}", float(value), "science")
+            for second, p, value in zip(np.sort(rng.integers(0, 50, 300)), rng.integers(0, 8, 300), rng.normal(size=300))]
+    data = narrow(rows)
+    expected = data.reset_index().pivot_table(index="date_time", columns="variable", values="value", aggfunc="last")
+
+    wide = pivot_narrow_dataframe(data, duplicates="last")
+    pd.testing.assert_frame_equal(wide, expected, check_names=False, check_freq=False)
+
+
+def test_last_keeps_input_order_between_equal_timestamps():
+    data = narrow([(0, "a", 1.0, "science"), (0, "a", 2.0, "engineering")])
+    assert pivot_narrow_dataframe(data, duplicates="last")["a"].iloc[0] == 2.0
+
+
+def test_mean_averages_the_cell():
+    data = narrow([(0, "a", 1.0, "engineering"), (0, "a", 4.0, "science"), (1, "a", 5.0, "science")])
+    wide = pivot_narrow_dataframe(data, duplicates="mean")
+    np.testing.assert_allclose(wide["a"], [2.5, 5])
+
+
+def test_prefer_science_over_later_engineering():
+    data = narrow([(0, "m_depth", 1.0, "science"), (0, "m_depth", 2.0, "engineering"),
+                    (1, "m_depth", 3.0, "engineering"), (1, "m_depth", 4.0, "engineering")])
+    wide = pivot_narrow_dataframe(data, duplicates="prefer_science")
+    # cells without science samples fall back to the last one
+    np.testing.assert_allclose(wide["m_depth"], [1, 4])
+
+
+def test_prefer_science_needs_data_type():
+    data = narrow([(0, "a", 1.0, "science")]).drop(columns="data_type")
+    with pytest.raises(ValueError):
+        pivot_narrow_dataframe(data, duplicates="prefer_science")
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        pivot_narrow_dataframe(narrow([(0, "a", 1.0, "science")]), duplicates="first")
+
+
+def test_resample_buckets():
+    data = narrow([(0, "a", 1.0, "science"), (4, "a", 2.0, "science"), (12, "a", 3.0, "science"),
+                    (12, "b", 5.0, "science")])
+    wide = pivot_narrow_dataframe(data, duplicates="mean", resample="10s")
+
+    assert list(wide.index) == list(pd.to_datetime([0, 10], unit="s"))
+    np.testing.assert_allclose(wide.to_numpy(), [[1.5, np.nan], [3, 5]])
+
+
+def test_resample_last_on_unsorted_input_keeps_latest_sample():
+    # 00:00:09 comes before 00:00:01 in the input, but it is the latest sample of the bucket
+    data = narrow([(9, "a", 9.0, "science"), (1, "a", 1.0, "science")])
+    wide = pivot_narrow_dataframe(data, duplicates="last", resample="10s")
+    assert wide["a"].iloc[0] == 9.0
+
+
+def test_unsorted_input_gives_sorted_rows():
+    data = narrow([(2, "a", 2.0, "science"), (0, "a", 0.0, "science"), (1, "b", 1.0, "science")])
+    wide = pivot_narrow_dataframe(data)
+
+    assert wide.index.is_monotonic_increasing
+    np.testing.assert_allclose(wide["a"], [0, np.nan, 2])
+    np.testing.assert_allclose(wide["b"], [np.nan, 1, np.nan])
+
+
+def test_categorical_labels_keep_only_observed_columns():
+    data = narrow([(0, "a", 1.0, "science"), (1, "b", 2.0, "science")])
+    data["variable"] = pd.Categorical(data["variable"], categories=["a", "b", "c"])
+    wide = pivot_narrow_dataframe(data)
+    assert list(wide.columns) == ["a", "b"]
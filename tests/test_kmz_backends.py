@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+from tests.kml import compose_kml, line, point
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+from pnboiaGliderKMZ.layers import LAYERS
+
+
+def parse(folder:str, backend:str):
+    return KMZParser(folder_path=folder, backend=backend, build_map=False).layers
+
+
+def assert_same_layers(folder:str):
+    lxml_layers = parse(folder, backend="lxml")
+    soup_layers = parse(folder, backend="soup")
+
+    assert list(lxml_layers) == list(soup_layers) == list(LAYERS)
+    for folder_name in LAYERS:
+        pd.testing.assert_frame_equal(lxml_layers[folder_name], soup_layers[folder_name])
+    return lxml_layers
+
+
+def test_backends_parse_the_same_frames(write_kmz):
+    layers = assert_same_layers(write_kmz(n_placemarks=20))
+    assert len(layers["Surfacings"]) == 20
+    assert len(layers["Glider Tracks"]) == 20
+
+
+def test_backends_agree_on_kml_oddities(write_kmz):
+    kml = compose_kml(n_placemarks=3)
+    oddities = (
+        # folders outside the registry are left out
+        "<Folder><name>Unknown Layer</name>" + point("u", 0, "Time of GPS Position: 2024-01-01 00:00:00") + "</Folder>"
+        # placemarks of a nested folder belong to the registered folder too, and a missing
+        # description or a NaN speed gives missing fields
+        "<Folder><name>Depth Averaged Current Vectors</name>"
+        "<Folder><name>Segment 2</name>" + line("c", 10, "Speed: NaNm/s @ 123deg") + "</Folder>"
+        "<Placemark><name>c11</name><LineString><coordinates>\n  -43.1,-23.1,0\n  -43.2,-23.2,0\n"
+        "</coordinates></LineString></Placemark>"
+        "</Folder>"
+        # escaped text
+        "<Folder><name>Surfacings</name>" + point("s", 10, "Time of GPS Position: 2024-01-01 10:00:00 &amp; more")
+        + "</Folder>"
+    )
+    layers = assert_same_layers(write_kmz(kml=kml.replace("</Document>", oddities + "</Document>")))
+
+    currents = layers["Depth Averaged Current Vectors"]
+    assert len(currents) == 5
+    assert currents["speed"].isna().sum() == 2
+    assert currents["degree"].iloc[3] == 123
+    assert len(layers["Surfacings"]) == 4
+
+
+@pytest.mark.parametrize("backend", ["lxml", "soup"])
+def test_missing_coordinates_abort_parsing(write_kmz, backend):
+    kml = compose_kml(n_placemarks=2).replace("<Folder><name>Surfacings</name>",
+                                                "<Folder><name>Surfacings</name><Placemark><name>s</name></Placemark>")
+    with pytest.raises(ValueError):
+        parse(write_kmz(kml=kml), backend=backend)
@@ -0,0 +1,128 @@
+import json
+import pandas as pd
+import pytest
+from tests.kml import compose_kml
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+from pnboiaGliderKMZ.layers import LAYERS, GLIDER_TRACK_PATTERN
+from pnboiaGliderKMZ.store import LayerStore
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """
+    {file name: rows} written to the store by the last run.
+    """
+    rows = {}
+    write = LayerStore.write
+    def counting_write(self, data:pd.DataFrame, file_name:str, append:bool=False, start_row:int=0):
+        rows[file_name] = len(data)
+        return write(self, data=data, file_name=file_name, append=append, start_row=start_row)
+    monkeypatch.setattr(LayerStore, "write", counting_write)
+    return rows
+
+
+def update(folder:str, output_path:str, output_format:str="csv"):
+    return KMZParser(folder_path=folder, incremental=True, output_path=output_path, output_format=output_format,
+                        build_map=False).layers
+
+
+def assert_matches_a_full_parse(layers, folder:str):
+    parsed = KMZParser(folder_path=folder, build_map=False).layers
+    for folder_name in LAYERS:
+        pd.testing.assert_frame_equal(layers[folder_name].reset_index(drop=True), parsed[folder_name],
+                                        check_dtype=False)
+
+
+def manifest_path(output_path):
+    return output_path / ".pnboia_glider_kmz_manifest.json"
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_only_new_placemarks_are_appended(write_kmz, tmp_path, written, output_format):
+    output_path = tmp_path / "store"
+    output_path.mkdir()
+    update(write_kmz(n_placemarks=5), output_path=str(output_path), output_format=output_format)
+    assert written["surfacings"] == 5
+
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(output_path), output_format=output_format)
+
+    assert written["surfacings"] == written["glider_tracks"] == 3
+    # planned waypoints can change in place and are written whole
+    assert written["planned_waypoints"] == 3
+    assert_matches_a_full_parse(layers, folder)
+
+
+def test_rerun_does_not_duplicate_rows(write_kmz, tmp_path, written):
+    folder = write_kmz(n_placemarks=5)
+    update(folder, output_path=str(tmp_path))
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["surfacings"] == 0
+    assert len(layers["Surfacings"]) == 5
+    assert_matches_a_full_parse(layers, folder)
+
+
+def test_new_mission_rebuilds_the_store(write_kmz, tmp_path, written):
+    update(write_kmz(n_placemarks=5, first=100), output_path=str(tmp_path))
+
+    # more placemarks, but older than the stored ones
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["surfacings"] == 8
+    assert_matches_a_full_parse(layers, folder)
+
+
+def test_truncated_layer_is_rebuilt(write_kmz, tmp_path, written):
+    update(write_kmz(n_placemarks=5), output_path=str(tmp_path))
+    layer_path = tmp_path / "surfacings.csv"
+    layer_path.write_text("".join(layer_path.read_text().splitlines(keepends=True)[:-2]))
+
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["surfacings"] == 8
+    assert written["glider_tracks"] == 3
+    assert_matches_a_full_parse(layers, folder)
+
+
+def test_unreadable_manifest_rebuilds_the_store(write_kmz, tmp_path, written):
+    update(write_kmz(n_placemarks=5), output_path=str(tmp_path))
+    manifest_path(tmp_path).write_text('{"folders": {"Surfacings": {"placem')
+
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["surfacings"] == written["glider_tracks"] == 8
+    assert_matches_a_full_parse(layers, folder)
+
+
+def test_schema_change_rebuilds_the_layer(write_kmz, tmp_path, written, monkeypatch):
+    # a previous version stored glider tracks without their degree
+    previous = dict(LAYERS["Glider Tracks"], pattern=GLIDER_TRACK_PATTERN.replace(" @ (\\d+)", ""),
+                    fields={"range": "float", "speed": "float"})
+    with monkeypatch.context() as patch:
+        patch.setitem(LAYERS, "Glider Tracks", previous)
+        update(write_kmz(n_placemarks=5), output_path=str(tmp_path))
+    assert "degree" not in pd.read_csv(tmp_path / "glider_tracks.csv").columns
+
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["glider_tracks"] == 8
+    assert written["surfacings"] == 3
+    assert_matches_a_full_parse(layers, folder)
+    with open(manifest_path(tmp_path), "r") as file:
+        assert "degree" in json.load(file)["folders"]["Glider Tracks"]["columns"]
+
+
+def test_layer_deleted_from_the_store_is_rebuilt(write_kmz, tmp_path, written):
+    update(write_kmz(n_placemarks=5), output_path=str(tmp_path))
+    (tmp_path / "glider_tracks.csv").unlink()
+
+    folder = write_kmz(n_placemarks=8)
+    layers = update(folder, output_path=str(tmp_path))
+
+    assert written["glider_tracks"] == 8
+    assert_matches_a_full_parse(layers, folder)
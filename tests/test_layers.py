@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pnboiaGliderKMZ.layers import LAYERS, LayerHandler
+
+
+def build(folder_name:str, placemarks:list, skip:int=0):
+    handler = LayerHandler.from_registry(folder_name, skip=skip)
+    for coordinates_text, description_text in placemarks:
+        handler.add(coordinates_text, description_text)
+    return handler.to_dataframe()
+
+
+@pytest.mark.parametrize("folder_name", ["Surfacings", "Surface Movements"])
+def test_gps_time_points(folder_name):
+    data = build(folder_name, [
+        ("-43.10000,-23.10000,0", "Glider: unit_000<br>Time of GPS Position: 2024-01-01 10:00:00<br>"),
+        ("-43.20000,-23.20000", "Time of GPS Position: 2024-01-02 11:30:15"),
+    ])
+
+    assert list(data.columns) == ["folder_name", "gps_date_time", "longitude", "latitude"]
+    assert (data["folder_name"] == folder_name).all()
+    assert list(data["gps_date_time"]) == [pd.Timestamp("2024-01-01 10:00:00"), pd.Timestamp("2024-01-02 11:30:15")]
+    np.testing.assert_array_equal(data["longitude"], [-43.1, -43.2])
+    np.testing.assert_array_equal(data["latitude"], [-23.1, -23.2])
+
+
+def test_glider_tracks():
+    data = build("Glider Tracks", [
+        ("-43.1,-23.1,0 -43.2,-23.2,0", "Range: 1234.5m Time: 1h Speed: 0.35m/s @ 7deg"),
+        ("-43.2,-23.2,0 -43.3,-23.3,0", "Range: 980m<br>Time: 2h<br>Speed: 0.2m/s @ 45deg"),
+        ("-43.3,-23.3,0 -43.4,-23.4,0", "Range: NaNm Time: 1h Speed: NaNm/s @ 359deg"),
+    ])
+
+    assert list(data.columns) == ["folder_name", "range", "speed", "degree",
+                                    "start_longitude", "start_latitude", "end_longitude", "end_latitude"]
+    np.testing.assert_array_equal(data["range"], [1234.5, 980, np.nan])
+    np.testing.assert_array_equal(data["speed"], [0.35, 0.2, np.nan])
+    # multi-digit degrees are read whole
+    assert list(data["degree"]) == [7, 45, 359]
+    assert data["degree"].dtype == "Int64"
+    np.testing.assert_array_equal(data["end_longitude"], [-43.2, -43.3, -43.4])
+
+
+def test_depth_averaged_current_vectors():
+    data = build("Depth Averaged Current Vectors", [
+        ("-43.1,-23.1,0 -43.2,-23.2,0", "Speed: 0.12m/s @ 270deg"),
+        ("-43.2,-23.2,0 -43.3,-23.3,0", "Speed: .5m/s @ 5deg"),
+        ("-43.3,-23.3,0 -43.4,-23.4,0", None),
+    ])
+
+    assert list(data.columns) == ["folder_name", "speed", "degree",
+                                    "start_longitude", "start_latitude", "end_longitude", "end_latitude"]
+    np.testing.assert_array_equal(data["speed"], [0.12, 0.5, np.nan])
+    assert data["degree"].tolist()[:2] == [270, 5]
+    assert data["degree"].isna().tolist() == [False, False, True]
+
+
+def test_planned_waypoints():
+    data = build("Planned Waypoints", [("-43.1,-23.1,0", "Waypoint"), ("-43.2,-23.2,0 -43.3,-23.3,0", None)])
+
+    # one row per coordinate, no description fields
+    assert list(data.columns) == ["folder_name", "longitude", "latitude"]
+    np.testing.assert_array_equal(data["longitude"], [-43.1, -43.2, -43.3])
+
+
+def test_every_layer_is_tested():
+    assert set(LAYERS) == {"Surfacings", "Surface Movements", "Glider Tracks",
+                            "Depth Averaged Current Vectors", "Planned Waypoints"}
+
+
+def test_mixed_coordinate_tuples():
+    data = build("Planned Waypoints", [("-43.1,-23.1,0 -43.2,-23.2", None), ("-43.3,-23.3", None)])
+    np.testing.assert_array_equal(data["latitude"], [-23.1, -23.2, -23.3])
+
+
+def test_skipped_placemarks_are_left_out():
+    data = build("Surfacings", [("-43.1,-23.1,0", "Time of GPS Position: 2024-01-01 10:00:00"),
+                                ("-43.2,-23.2,0", "Time of GPS Position: 2024-01-01 11:00:00")], skip=1)
+    np.testing.assert_array_equal(data["longitude"], [-43.2])
+
+
+def test_empty_layers():
+    with pytest.raises(ValueError):
+        build("Surfacings", [])
+    # optional, or emptied by skip
+    assert build("Planned Waypoints", []).empty
+    assert list(build("Surfacings", [("-43.1,-23.1,0", "Time of GPS Position: 2024-01-01 10:00:00")], skip=1).columns) \
+        == ["folder_name", "gps_date_time", "longitude", "latitude"]
+
+
+def test_segment_with_a_single_coordinate():
+    with pytest.raises(ValueError):
+        build("Glider Tracks", [("-43.1,-23.1,0", "Range: 1m Time: 1h Speed: 0.1m/s @ 10deg")])
+
+
+def test_unknown_geometry():
+    with pytest.raises(ValueError):
+        LayerHandler(folder_name="Lines", geometry="polygon")
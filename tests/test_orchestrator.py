@@ -0,0 +1,28 @@
+from pnboiaGliderBinary.orchestrator import SUMMARY_COLUMNS, run_mission, run_missions
+
+
+def test_no_missions():
+    summaries = run_missions(missions=[], extension=".[st]bd", workers=1)
+
+    assert summaries.empty
+    assert list(summaries.columns) == SUMMARY_COLUMNS
+    assert not (summaries.status == "error").any()
+
+
+def test_failing_mission_is_reported(tmp_path):
+    mission = {"mission_id": 7, "name": "lost", "binary_files_path": str(tmp_path / "missing")}
+    summary = run_mission(mission=mission, extension=".[st]bd")
+
+    assert summary["status"] == "error"
+    assert summary["rows"] == 0
+    assert "FileNotFoundError" in summary["error"]
+
+
+def test_failing_mission_does_not_stop_the_others(tmp_path):
+    missions = [{"mission_id": mission_id, "name": f"mission {mission_id}",
+                    "binary_files_path": str(tmp_path / f"missing_{mission_id}")} for mission_id in [2, 1]]
+    summaries = run_missions(missions=missions, extension=".[st]bd", workers=2)
+
+    assert list(summaries.mission_id) == [1, 2]
+    assert (summaries.status == "error").all()
+    assert list(summaries.columns) == SUMMARY_COLUMNS
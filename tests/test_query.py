@@ -0,0 +1,112 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+from pnboiaGliderDataBase.db import GetData
+from pnboiaGliderDataBase.query import QueryBuilder, ReferenceCache
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", lambda connection, _: connection.execute("ATTACH DATABASE ':memory:' AS data"))
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE data.parameters (id INTEGER, name TEXT, type TEXT)")
+        connection.exec_driver_sql("INSERT INTO data.parameters VALUES (1, 'm_depth', 'ENG'), (2, 'sci_water_temp', 'SCI')")
+
+    engine.statements = []
+    event.listen(engine, "before_cursor_execute",
+                    lambda connection, cursor, statement, *args: engine.statements.append(statement))
+    return engine
+
+
+def database(engine, tmp_path, ttl:float=3600, max_age:float=86400):
+    db = GetData(conn=engine, use_cache=True, cache_dir=str(tmp_path))
+    db.reference_cache.ttl = ttl
+    db.reference_cache.max_age = max_age
+    return db
+
+
+def fetches(engine):
+    return [statement for statement in engine.statements if statement.startswith("SELECT * FROM data.parameters")]
+
+
+def fingerprints(engine):
+    return [statement for statement in engine.statements if "count(*)" in statement]
+
+
+def test_fresh_entry_skips_the_database(engine, tmp_path):
+    db = database(engine, tmp_path)
+    first = db.get(table="data.parameters", type=["=", "ENG"])
+    engine.statements.clear()
+
+    second = database(engine, tmp_path).get(table="data.parameters", type=["=", "ENG"])
+
+    assert engine.statements == []
+    pd.testing.assert_frame_equal(first, second)
+    assert list(second.name) == ["m_depth"]
+
+
+def test_expired_entry_is_revalidated_without_fetching(engine, tmp_path):
+    database(engine, tmp_path, ttl=0).get(table="data.parameters")
+    engine.statements.clear()
+
+    data = database(engine, tmp_path, ttl=0).get(table="data.parameters")
+
+    assert len(fingerprints(engine)) == 1
+    assert fetches(engine) == []
+    assert len(data) == 2
+
+
+def test_changed_table_is_fetched_again(engine, tmp_path):
+    database(engine, tmp_path, ttl=0).get(table="data.parameters")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("INSERT INTO data.parameters VALUES (3, 'm_lat', 'ENG')")
+    engine.statements.clear()
+
+    data = database(engine, tmp_path, ttl=0).get(table="data.parameters")
+
+    assert len(fetches(engine)) == 1
+    assert list(data.id) == [1, 2, 3]
+
+
+def test_old_entry_is_fetched_again_after_max_age(engine, tmp_path):
+    database(engine, tmp_path, ttl=0).get(table="data.parameters")
+    # in-place update: same count and largest id
+    with engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE data.parameters SET name = 'm_pressure' WHERE id = 1")
+    engine.statements.clear()
+
+    data = database(engine, tmp_path, ttl=0, max_age=0).get(table="data.parameters")
+
+    assert len(fetches(engine)) == 1
+    assert data.name.iloc[0] == "m_pressure"
+
+
+def test_statements_and_params_have_their_own_entries(engine, tmp_path):
+    db = database(engine, tmp_path)
+    eng = db.get(table="data.parameters", type=["=", "ENG"])
+    sci = db.get(table="data.parameters", type=["=", "SCI"])
+    assert list(eng.name) == ["m_depth"]
+    assert list(sci.name) == ["sci_water_temp"]
+
+
+def test_cache_is_keyed_on_the_server(tmp_path):
+    cache = ReferenceCache(cache_dir=str(tmp_path))
+    statement, params = QueryBuilder().select(table="data.parameters")
+    staging = cache.compose_server_key(create_engine("postgresql+psycopg2://etl@staging/glider"))
+    production = cache.compose_server_key(create_engine("postgresql+psycopg2://etl@production/glider"))
+
+    assert cache.compose_cache_path(statement, params, server=staging) != \
+        cache.compose_cache_path(statement, params, server=production)
+
+
+def test_other_tables_are_not_cached(engine, tmp_path):
+    db = database(engine, tmp_path)
+    db.get(table="data.parameters", query="SELECT 1")
+    assert not list(tmp_path.iterdir())
+
+
+def test_invalid_join_is_rejected():
+    with pytest.raises(ValueError):
+        QueryBuilder().select(table="data.data", join=" JOIN x ON a = b; DROP TABLE data.data")
@@ -0,0 +1,118 @@
+import os
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import DBAPIError
+from pnboiaGliderDataBase.schema import DataSchema
+
+
+# a disposable PostgreSQL database: every test works in a schema of its own and drops it
+TEST_DB_URL = os.getenv("PNBOIA_GLIDER_TEST_DB_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DB_URL, reason="PNBOIA_GLIDER_TEST_DB_URL is not set")
+
+
+@pytest.fixture
+def schema(monkeypatch):
+    engine = create_engine(TEST_DB_URL)
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    with engine.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {name}"))
+    # glider.missions is left out of the test schema: no active missions
+    monkeypatch.setattr(DataSchema, "get_active_mission_ids", lambda self, connection: [])
+    yield DataSchema(conn=engine, schema=name)
+    with engine.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA {name} CASCADE"))
+    engine.dispose()
+
+
+def execute(schema:DataSchema, statement:str):
+    with schema.conn.begin() as connection:
+        connection.execute(text(statement))
+
+
+def query(schema:DataSchema, statement:str):
+    with schema.conn.begin() as connection:
+        return connection.execute(text(statement)).all()
+
+
+def create_legacy_table(schema:DataSchema):
+    # a plain data.data with a serial key and rows of two missions over three months
+    execute(schema, f"CREATE TABLE {schema.parent} (id serial PRIMARY KEY, mission_id integer NOT NULL, "
+                    f"parameter_id integer NOT NULL, date_time timestamp NOT NULL, value double precision)")
+    execute(schema, f"INSERT INTO {schema.parent} (mission_id, parameter_id, date_time, value) VALUES "
+                    f"(1, 10, '2024-01-10', 1.0), (1, 10, '2024-02-10', 2.0), (2, 11, '2024-02-20', 3.0)")
+
+
+def relations(schema:DataSchema):
+    return {name for name, in query(schema, f"SELECT relname FROM pg_class c JOIN pg_namespace n "
+                                                f"ON n.oid = c.relnamespace WHERE nspname = '{schema.schema}'")}
+
+
+def test_migrate_partitions_the_legacy_rows(schema):
+    create_legacy_table(schema)
+    schema.migrate()
+
+    assert {"data_mission_1_2024_01", "data_mission_1_2024_02", "data_mission_2_2024_02", "data_legacy"} \
+        <= relations(schema)
+    assert query(schema, f"SELECT id, value FROM {schema.parent} ORDER BY id") == [(1, 1.0), (2, 2.0), (3, 3.0)]
+    assert query(schema, f"SELECT count(*) FROM {schema.parent}_default") == [(0,)]
+
+
+def test_new_rows_carry_on_after_the_legacy_ids(schema):
+    create_legacy_table(schema)
+    schema.migrate()
+
+    execute(schema, f"INSERT INTO {schema.parent} (mission_id, parameter_id, date_time, value) "
+                    f"VALUES (1, 10, '2024-02-11', 4.0)")
+    assert query(schema, f"SELECT id FROM {schema.parent} WHERE value = 4.0") == [(4,)]
+    # the legacy table keeps its own sequence
+    assert query(schema, f"SELECT pg_get_serial_sequence('{schema.parent}', 'id'), "
+                            f"pg_get_serial_sequence('{schema.parent}_legacy', 'id')") == \
+        [(f"{schema.schema}.data_id_seq", f"{schema.schema}.data_legacy_id_seq")]
+
+
+def test_legacy_table_drops_without_cascade(schema):
+    create_legacy_table(schema)
+    schema.migrate()
+
+    execute(schema, f"DROP TABLE {schema.parent}_legacy")
+    execute(schema, f"INSERT INTO {schema.parent} (mission_id, parameter_id, date_time, value) "
+                    f"VALUES (2, 11, '2024-02-21', 5.0)")
+    assert query(schema, f"SELECT id FROM {schema.parent} WHERE value = 5.0") == [(4,)]
+
+
+def test_migrate_drop_legacy(schema):
+    create_legacy_table(schema)
+    schema.migrate(drop_legacy=True)
+
+    assert "data_legacy" not in relations(schema)
+    assert "data_legacy_id_seq" not in relations(schema)
+    assert query(schema, f"SELECT count(*) FROM {schema.parent}") == [(3,)]
+
+
+def test_migrate_without_legacy_table(schema):
+    schema.migrate()
+
+    assert {"data", "data_default"} <= relations(schema)
+    assert query(schema, f"SELECT count(*) FROM {schema.parent}") == [(0,)]
+
+
+def test_migrate_twice(schema):
+    create_legacy_table(schema)
+    schema.migrate()
+    schema.migrate()
+
+    assert query(schema, f"SELECT count(*) FROM {schema.parent}") == [(3,)]
+
+
+def test_failed_migration_keeps_the_legacy_table(schema, monkeypatch):
+    create_legacy_table(schema)
+    def failing_create_indexes(self, connection):
+        raise DBAPIError("CREATE INDEX", {}, Exception("failed"))
+    monkeypatch.setattr(DataSchema, "create_indexes", failing_create_indexes)
+
+    with pytest.raises(DBAPIError):
+        schema.migrate()
+    assert "data_legacy" not in relations(schema)
+    assert query(schema, f"SELECT count(*) FROM {schema.parent}") == [(3,)]
@@ -0,0 +1,95 @@
+import json
+import os
+import pandas as pd
+import plotly.graph_objs as go
+from pnboiaGliderKMZ.flight_kmz_processor import KMZParser
+from pnboiaGliderSFMCASCII.sci_data_processer import SFMCGliderData
+
+
+def create_sfmc_data():
+    gd = SFMCGliderData.__new__(SFMCGliderData)
+    gd.output_html_file_name = "glider_sci_data_timeseries.html"
+    gd.output_artifact_manifest_file_name = "glider_sci_data_timeseries.json"
+    gd.timeseries_zoom_script = ""
+    gd.profiler = None
+    return gd
+
+
+def save_science_plot(gd:SFMCGliderData, value:float):
+    data = pd.DataFrame({"sci_water_temp": [value, value + 1]})
+    return gd.save_plot_artifact(plot=go.Figure(go.Scatter(y=data["sci_water_temp"])), data=data)
+
+
+def science_plots(htmls):
+    return sorted(file_name for file_name in os.listdir(htmls)
+                    if file_name.startswith("glider_sci_data_timeseries.") and file_name.endswith(".html"))
+
+
+def map_science_plot(htmls):
+    with open(htmls / ".flight_map_manifest.json", "r") as file:
+        return json.load(file)["science_plot"]
+
+
+def test_artifact_is_named_after_the_data(htmls):
+    gd = create_sfmc_data()
+    first = save_science_plot(gd, value=20)
+    assert save_science_plot(gd, value=20) == first
+    assert save_science_plot(gd, value=21) != first
+
+
+def test_manifest_points_to_the_current_artifact(htmls):
+    gd = create_sfmc_data()
+    save_science_plot(gd, value=20)
+    current = save_science_plot(gd, value=21)
+
+    with open(htmls / "glider_sci_data_timeseries.json", "r") as file:
+        manifest = json.load(file)
+    assert manifest["file_name"] == current
+    assert current.endswith(f".{manifest['data_hash']}.html")
+
+
+def test_previous_artifact_is_kept_until_the_map_is_rebuilt(htmls, write_kmz):
+    gd = create_sfmc_data()
+    folder = write_kmz()
+    previous = save_science_plot(gd, value=20)
+    KMZParser(folder_path=folder)
+    assert map_science_plot(htmls) == previous
+
+    # the deployed map still loads the previous artifact
+    current = save_science_plot(gd, value=21)
+    assert science_plots(htmls) == sorted([previous, current])
+
+    KMZParser(folder_path=folder)
+    assert map_science_plot(htmls) == current
+    assert science_plots(htmls) == [current]
+
+
+def test_up_to_date_map_deletes_stale_artifacts(htmls, write_kmz):
+    gd = create_sfmc_data()
+    folder = write_kmz()
+    current = save_science_plot(gd, value=20)
+    KMZParser(folder_path=folder)
+    stale = "glider_sci_data_timeseries.0000000000000000.html"
+    (htmls / stale).write_text("<div>science plot</div>")
+
+    KMZParser(folder_path=folder)
+    assert science_plots(htmls) == [current]
+
+
+def test_map_without_science_plot(htmls, write_kmz):
+    KMZParser(folder_path=write_kmz())
+    assert (htmls / "flight_map.html").exists()
+    assert map_science_plot(htmls) == ""
+
+
+def test_inline_html_is_not_written_by_default(htmls, tmp_path):
+    data_path = tmp_path / "data"
+    data_path.mkdir()
+    (data_path / "unit_000.txt").write_text("time sci_water_temp \nsec degc \n"
+                                            "1704067200 20.5 \n1704067260 20.6 \n")
+
+    gd = SFMCGliderData(folder_path=str(data_path), use_cache=False)
+    assert science_plots(htmls) == [gd.artifact_file_name]
+
+    SFMCGliderData(folder_path=str(data_path), use_cache=False, save_html=True)
+    assert (htmls / "glider_sci_data_timeseries.html").exists()